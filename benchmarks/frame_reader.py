@@ -0,0 +1,108 @@
+"""
+Frame reader benchmark
+
+Compares the CPU time per transaction of `vazio.connection.Connection`
+(buffered FrameReader) with a pyserial style readline (one select + one
+read syscall per byte) against a VarianDual controller simulated in
+another process behind a pseudo terminal. The controller answers with the
+simulator state machine (`vazio.simulator.engine.variandual`), so replies
+have the sizes and contents of a real acquisition (pressure, current,
+voltage and HV state of both channels).
+
+    $ python benchmarks/frame_reader.py [transactions]
+"""
+
+import os
+import pty
+import sys
+import time
+import tty
+import select
+import itertools
+import multiprocessing
+
+from vazio.connection import Connection, FrameReader
+from vazio.protocol.multigauge import Channel, Codec
+from vazio.simulator.engine.variandual import create_state, handle
+from vazio.variandual import TABLE
+
+
+QUERIES = TABLE.queries(Codec)
+REQUESTS = [
+    QUERIES[name, channel]
+    for channel in (Channel.HighVoltage1, Channel.HighVoltage2)
+    for name in ("pressure", "current", "voltage", "high_voltage")
+]
+
+
+class FD:
+    def __init__(self, fd):
+        self.fd = fd
+
+    def fileno(self):
+        return self.fd
+
+    def write(self, data):
+        os.write(self.fd, data)
+
+
+def controller(master):
+    state = create_state()
+    reader = FrameReader(FD(master))
+    try:
+        while True:
+            os.write(master, handle(state, reader.read_frame(10)))
+    except (OSError, TimeoutError):
+        pass
+
+
+class ByteReadline:
+    """pyserial readline: read(1) until the terminator"""
+
+    def __init__(self, fd, timeout=1.0):
+        self.fd = fd
+        self.timeout = timeout
+
+    def write_readline(self, data):
+        os.write(self.fd, data)
+        line = bytearray()
+        while not line.endswith(b"\r"):
+            if not select.select((self.fd,), (), (), self.timeout)[0]:
+                raise TimeoutError()
+            line += os.read(self.fd, 1)
+        return bytes(line)
+
+
+def run(conn, n):
+    cpu, wall = time.process_time(), time.perf_counter()
+    for request in itertools.islice(itertools.cycle(REQUESTS), n):
+        reply = conn.write_readline(request)
+        assert reply[1:4] == request[1:4], reply
+        Codec.data(reply)
+    return time.process_time() - cpu, time.perf_counter() - wall
+
+
+def main(n=20000):
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    process = multiprocessing.Process(target=controller, args=(master,))
+    process.start()
+    try:
+        for name, conn in (
+            ("byte readline", ByteReadline(slave)),
+            ("frame reader", Connection(FD(slave))),
+        ):
+            cpu, wall = run(conn, n)
+            print(
+                "{:<14} {:8.1f} us CPU/transaction {:8.1f} us/transaction".format(
+                    name, 1e6 * cpu / n, 1e6 * wall / n
+                )
+            )
+    finally:
+        os.close(slave)
+        process.join()
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
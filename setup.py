@@ -25,6 +25,7 @@ requirements = []
 
 extras_requirements = {
     "simulator": ["sinstruments>=1.3"],
+    "numpy": ["numpy"],
 }
 
 
@@ -47,12 +48,12 @@ setup(
         'Intended Audience :: Developers',
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
     ],
     entry_points={
+        'console_scripts': [
+            'vazio = vazio.cli:main',
+        ],
         'sinstruments.device': [
             'MKS937 = vazio.simulator.mks:MKS937 [simulator]',
             'Agilent4UHV = vazio.simulator.agilent:Agilent4UHV [simulator]',
@@ -72,7 +73,7 @@ setup(
     test_suite='tests',
     tests_require=test_requirements,
     extras_require=extras_requirements,
-    python_requires='>=3.5',
+    python_requires='>=3.8',
     url='https://gitlab.com/tiagocoutinho/vacuum',
     version="1.2.1",
     zip_safe=True,
@@ -0,0 +1,59 @@
+"""
+Fakes shared by the tests
+
+    from conftest import Clock, Controller
+"""
+
+from vazio.variandual import HighVoltage, InterlockStatus
+
+
+class Clock:
+    """Clock advanced by hand (now) or by sleep"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, duration):
+        self.now += duration
+
+
+class HV:
+    """
+    Controller channel (channel: its wire code). Quantities are plain
+    attributes (class defaults overridden by the keyword arguments);
+    reading one of the `failing` quantities raises IOError
+    """
+
+    pressure = 1e-8
+    current = 1e-6
+    voltage = 7000
+    high_voltage = HighVoltage.On
+    failing = ()
+
+    def __init__(self, channel, ctrl=None, **values):
+        self.channel = channel
+        self.ctrl = ctrl
+        vars(self).update(values)
+
+    def __getattribute__(self, name):
+        if name in object.__getattribute__(self, "failing"):
+            raise IOError("timeout")
+        return object.__getattribute__(self, name)
+
+
+class Controller:
+    """
+    Controller with two channels (hv1 and hv2) of type `channel_type`, built
+    with the same keyword arguments
+    """
+
+    unit = "mbar"
+    interlock_status = InterlockStatus(0)
+    channel_type = HV
+
+    def __init__(self, **values):
+        self.hv1 = self.channel_type("1", self, **values)
+        self.hv2 = self.channel_type("2", self, **values)
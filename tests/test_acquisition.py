@@ -0,0 +1,22 @@
+from conftest import Controller
+from vazio.acquisition import Acquisition, split_path
+
+
+def test_split_path():
+    assert split_path("hv1.pressure") == ("hv1", "pressure")
+    assert split_path("unit") == ("", "unit")
+
+
+def test_poll():
+    ctrl = Controller(failing=("current",))
+    acq = Acquisition({"d1": ctrl}, ("hv1.pressure", "unit", "hv1.current"))
+    batches = []
+    acq.subscribe(batches.append)
+    readings = acq.poll()
+    assert batches == [readings]
+    assert acq.get("d1", "hv1.pressure").value == 1e-8
+    assert acq.get("d1", "unit").value == "mbar"
+    current = acq.get("d1", "hv1.current")
+    assert not current.valid
+    assert isinstance(current.error, IOError)
+    assert current.value is None
@@ -0,0 +1,231 @@
+import asyncio
+
+import pytest
+
+from vazio.aio import AsyncVarianDual, open_connection
+from vazio.controller import WriteErrors
+from vazio.protocol.multigauge import ACK, Codec, SerialConfigOnly
+from vazio.protocol.table import ReplyMismatch
+from vazio.simulator.engine import variandual as engine
+from vazio.variandual import FixedStep, HighVoltage, SerialProperty, Unit
+
+
+class Server:
+    """Minimal MultiGauge TCP server on localhost"""
+
+    def __init__(self):
+        self.state = {b"130": "0", b"230": "0", b"107": "5000", b"102": "1.2E-08",
+                      b"081": "00000100"}
+        self.requests = 0
+
+    async def handle(self, reader, writer):
+        while True:
+            try:
+                line = await reader.readuntil(b"\r")
+            except asyncio.IncompleteReadError:
+                break
+            self.requests += 1
+            key, data = Codec.split(line)
+            if data is None:
+                reply = Codec.reply(key, self.state[key])
+            else:
+                self.state[key] = data
+                reply = (ACK + "\r").encode()
+            writer.write(reply)
+        writer.close()
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *args):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class Simulator:
+    """VarianDual simulator (not in ACK mode) served on localhost"""
+
+    def __init__(self):
+        self.state = engine.create_state()
+        # delay (s) of the next reply
+        self.late = 0
+
+    async def handle(self, reader, writer):
+        while True:
+            try:
+                line = await reader.readuntil(b"\r")
+            except asyncio.IncompleteReadError:
+                break
+            if self.late:
+                await asyncio.sleep(self.late)
+                self.late = 0
+            reply = engine.handle(self.state, line)
+            if reply is not None:
+                writer.write(reply)
+        writer.close()
+
+    def get(self, command, channel=engine.Channel.NoChannel):
+        return self.state[command][channel]
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = "tcp://127.0.0.1:{}".format(port)
+        return self
+
+    async def __aexit__(self, *args):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_async_read_write():
+    async def main():
+        async with Server() as server:
+            conn = await open_connection("tcp://127.0.0.1:{}".format(server.port))
+            ctrl = AsyncVarianDual(conn)
+            assert await ctrl.hv1.voltage == 5000
+            assert await ctrl.hv1.pressure == 1.2e-8
+            assert await ctrl.hv1.high_voltage == HighVoltage.Off
+            await ctrl.on()
+            assert await ctrl.hv2.high_voltage == HighVoltage.On
+            conn.close()
+
+    run(main())
+
+
+def test_async_concurrent_devices():
+    async def main():
+        async with Server() as s1, Server() as s2:
+            ctrls = []
+            for server in (s1, s2):
+                url = "tcp://127.0.0.1:{}".format(server.port)
+                ctrls.append(AsyncVarianDual(await open_connection(url)))
+            values = await asyncio.gather(
+                *(ctrl.hv1.voltage for ctrl in ctrls for _ in range(10))
+            )
+            assert values == 20 * [5000]
+            assert s1.requests == s2.requests == 10
+            for ctrl in ctrls:
+                ctrl.conn.close()
+
+    run(main())
+
+
+def test_async_timeout():
+    async def main():
+        async def silent(reader, writer):
+            await reader.read()
+
+        server = await asyncio.start_server(silent, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        conn = await open_connection("tcp://127.0.0.1:{}".format(port), timeout=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await AsyncVarianDual(conn).hv1.voltage
+        conn.close()
+        server.close()
+
+    run(main())
+
+
+def test_async_assignment_raises():
+    async def main():
+        async with Server() as server:
+            conn = await open_connection("tcp://127.0.0.1:{}".format(server.port))
+            ctrl = AsyncVarianDual(conn)
+            with pytest.raises(TypeError):
+                ctrl.unit = Unit.mbar
+            with pytest.raises(TypeError):
+                ctrl.hv1.fixed_step = FixedStep.Step
+            with pytest.raises(TypeError):
+                with ctrl.pipeline():
+                    pass
+            assert server.requests == 0
+            conn.close()
+
+    run(main())
+
+
+def test_async_enable_ack_and_configure():
+    async def main():
+        async with Simulator() as sim:
+            conn = await open_connection(sim.url, timeout=0.2)
+            ctrl = AsyncVarianDual(conn, ack=False)
+            # not in ACK mode: writes are not answered
+            with pytest.raises(asyncio.TimeoutError):
+                await ctrl.set("unit", Unit.pascal)
+            await conn.flush()
+            assert SerialProperty.AckNack in await ctrl.enable_ack()
+            await ctrl.configure(unit=Unit.mbar, **{"hv1.fixed_step": FixedStep.Step})
+            assert await ctrl.unit == Unit.mbar
+            assert await ctrl.hv1.fixed_step == FixedStep.Step
+            assert ctrl.config == {"unit": Unit.mbar, "hv1.fixed_step": FixedStep.Step}
+            await ctrl.set("unit", Unit.torr)
+            await ctrl.restore()
+            assert await ctrl.unit == Unit.mbar
+            conn.close()
+
+    run(main())
+
+
+def test_async_pipeline_errors():
+    async def main():
+        async with Simulator() as sim:
+            conn = await open_connection(sim.url, timeout=0.2)
+            ctrl = AsyncVarianDual(conn)
+            prop = await ctrl.enable_ack()
+            # serial property is only writable in serial configuration mode
+            with pytest.raises(WriteErrors) as error:
+                await ctrl.set_many([("unit", Unit.pascal), ("serial_property", prop)])
+            (path, _, exc), = error.value.errors
+            assert path == "serial_property"
+            assert isinstance(exc, SerialConfigOnly)
+            assert await ctrl.unit == Unit.pascal
+            conn.close()
+
+    run(main())
+
+
+def test_async_enables_ack_on_first_write():
+    async def main():
+        async with Simulator() as sim:
+            conn = await open_connection(sim.url, timeout=0.2)
+            ctrl = AsyncVarianDual(conn)
+            await ctrl.set("unit", Unit.pascal)
+            assert await ctrl.unit == Unit.pascal
+            await ctrl.set_many({"unit": Unit.mbar})
+            assert await ctrl.unit == Unit.mbar
+            conn.close()
+
+    run(main())
+
+
+def test_async_late_reply():
+    async def main():
+        async with Simulator() as sim:
+            for channel in (engine.Channel.HighVoltage1, engine.Channel.HighVoltage2):
+                sim.state[engine.Command.Voltage][channel] = "5000"
+                sim.state[engine.Command.Pressure][channel] = "1.0E-08"
+            ctrl = AsyncVarianDual(await open_connection(sim.url, timeout=0.2))
+            sim.late = 0.3
+            with pytest.raises(asyncio.TimeoutError):
+                await ctrl.hv1.voltage
+            # arrived before the next request: discarded
+            await asyncio.sleep(0.2)
+            assert await ctrl.hv1.pressure == 1e-8
+            sim.late = 0.3
+            with pytest.raises(asyncio.TimeoutError):
+                await ctrl.hv1.voltage
+            # arrives while waiting for the pressure: rejected
+            with pytest.raises(ReplyMismatch):
+                await ctrl.hv1.pressure
+            assert await ctrl.hv1.pressure == 1e-8
+            assert await ctrl.hv2.voltage == 5000
+            ctrl.conn.close()
+
+    run(main())
@@ -0,0 +1,90 @@
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from conftest import Controller  # noqa: E402
+from vazio.acquisition import Acquisition, Reading  # noqa: E402
+from vazio.alarm import AlarmEngine, SetPoint, HighVoltageOff, ControllerError  # noqa
+from vazio.variandual import HighVoltage  # noqa: E402
+
+
+VALUES = dict(
+    pressure=1e-8, set_point1=1e-6, high_voltage=HighVoltage.On, error_status=0
+)
+
+
+def readings(name, channel, **values):
+    return [
+        Reading(name, "{}.{}".format(channel, k), v, 0) for k, v in values.items()
+    ]
+
+
+@pytest.fixture
+def engine():
+    ctrls = {"d1": Controller(**VALUES), "d2": Controller(**VALUES)}
+    acq = Acquisition(ctrls, ())
+    rules = [SetPoint("set_point1", 0.5), HighVoltageOff(), ControllerError()]
+    engine = AlarmEngine(acq, rules)
+    for name in ctrls:
+        for ch in ("hv1", "hv2"):
+            acq.publish(readings(name, ch, **VALUES))
+    return engine
+
+
+def test_paths(engine):
+    assert "hv1.pressure" in engine.paths
+    assert "hv2.error_status" in engine.paths
+
+
+def test_set_point_hysteresis(engine):
+    acq = engine.acquisition
+    events = []
+    engine.subscribe(events.append)
+    ch = acq.controllers["d2"].hv1
+    ch.pressure = 2e-6
+    acq.publish(readings("d2", "hv1", pressure=2e-6))
+    assert [(e.rule, e.controller, e.channel, e.active) for e in events] == [
+        ("set_point1", "d2", "hv1", True)
+    ]
+    assert engine.alarms() == [("set_point1", "d2", "hv1")]
+    # inside hysteresis band: still active
+    acq.publish(readings("d2", "hv1", pressure=8e-7))
+    assert len(events) == 1
+    acq.publish(readings("d2", "hv1", pressure=4e-7))
+    assert events[-1].active is False
+    assert engine.alarms() == []
+
+
+def test_alarm_survives_failed_read(engine):
+    acq = engine.acquisition
+    events = []
+    engine.subscribe(events.append)
+    acq.controllers["d2"].hv1.pressure = 2e-6
+    acq.publish(readings("d2", "hv1", pressure=2e-6))
+    failed = Reading("d2", "hv1.pressure", None, 0, TimeoutError("no reply"))
+    acq.publish([failed])
+    assert [e.active for e in events] == [True]
+    assert engine.alarms() == [("set_point1", "d2", "hv1")]
+
+
+def test_unconfirmed_alarm(engine):
+    acq = engine.acquisition
+    events = []
+    engine.subscribe(events.append)
+    # cache says off but hardware says on: no alarm, no retry until it clears
+    acq.publish(readings("d1", "hv2", high_voltage=HighVoltage.Off))
+    acq.publish(readings("d1", "hv2", high_voltage=HighVoltage.Off))
+    assert events == []
+    acq.controllers["d1"].hv2.high_voltage = HighVoltage.OffHVShortCircuit
+    acq.publish(readings("d1", "hv2", high_voltage=HighVoltage.On))
+    acq.publish(readings("d1", "hv2", high_voltage=HighVoltage.OffHVShortCircuit))
+    assert events[0].rule == "HighVoltageOff"
+    assert "OffHVShortCircuit" in events[0].message
+
+
+def test_controller_error(engine):
+    acq = engine.acquisition
+    acq.controllers["d1"].hv1.error_status = 10
+    events = engine.update(readings("d1", "hv1", error_status=10))
+    assert len(events) == 1
+    assert "Short Circuit" in events[0].message
@@ -0,0 +1,86 @@
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from vazio.acquisition import Reading  # noqa: E402
+from vazio.analysis import (  # noqa: E402
+    SeriesSet, analyze, block_slopes, intervals, pump_down, rate_of_rise, RISING,
+)
+from vazio.history import History  # noqa: E402
+
+
+def pressure(n=20000, tau=600.0, rise=1e-9, noise=0.001, seed=0):
+    """Pump-down from 1e-3 at t=1000 and a rate of rise at t=10000"""
+    i = numpy.arange(n)
+    p = 1e-8 + numpy.where(i >= 1000, 1e-3 * numpy.exp(-(i - 1000) / tau), 0)
+    valve = (i >= 10000) & (i < 10600)
+    p[valve] += rise * (i[valve] - 10000)
+    p *= 1 + numpy.random.default_rng(seed).normal(0, noise, n)
+    return 1.7e9 + i.astype(float), p
+
+
+@pytest.fixture
+def data():
+    return SeriesSet.from_series(
+        {
+            ("d{}".format(c), "hv1.pressure"): pressure(rise=1e-9 * (c + 1), seed=c)
+            for c in range(5)
+        }
+    )
+
+
+def test_block_slopes():
+    t = numpy.arange(20.0)
+    starts, slopes = block_slopes(t, 2 * t, numpy.array([0, 10, 20]), 5)
+    assert list(starts) == [0, 5, 10, 15]
+    assert slopes[0] == slopes[2] == 2
+    assert numpy.isnan(slopes[1])  # across series
+
+
+def test_rate_of_rise(data):
+    fits = rate_of_rise(data)
+    assert list(fits.series) == [0, 1, 2, 3, 4]
+    assert numpy.allclose(fits.slope, 1e-9 * numpy.arange(1, 6), rtol=0.01)
+    assert numpy.all(fits.r2 > 0.99)
+    assert numpy.all(fits.t0 - 1.7e9 >= 9980)
+    assert numpy.all(fits.t1 - 1.7e9 == 10599)
+
+
+def test_pump_down(data):
+    fits, tau = pump_down(data)
+    first = numpy.searchsorted(fits.series, numpy.arange(5))
+    assert numpy.all(fits.t0[first] - 1.7e9 == 1000)
+    assert numpy.allclose(tau[first], 600, rtol=0.1)
+
+
+def test_analyze(data):
+    result = analyze(data, volume={("d0", "hv1.pressure"): 20})
+    assert result.leaks["d0", "hv1.pressure"] == pytest.approx(20e-9, rel=0.01)
+    assert result.leaks["d4", "hv1.pressure"] == pytest.approx(5e-9, rel=0.01)
+    assert len(result.rise.series) == 5
+
+
+def test_short_intervals_are_ignored(data):
+    found = intervals(data, RISING, min_duration=1000)
+    assert len(found.series) == 0
+
+
+def test_from_history():
+    history = History()
+    t, p = pressure(3000)
+    history.update(
+        [Reading("d1", "hv1.pressure", v, ti) for ti, v in zip(t, p)]
+        + [Reading("d1", "hv1.current", 1.0, ti) for ti in t]
+    )
+    data = SeriesSet.from_history(history)
+    assert data.keys == [("d1", "hv1.pressure")]
+    assert list(data.offsets) == [0, 3000]
+    fits, tau = pump_down(data)
+    assert tau[0] == pytest.approx(600, rel=0.1)
+
+
+def test_empty():
+    data = SeriesSet.from_series({})
+    result = analyze(data)
+    assert result.leaks == {}
+    assert len(result.tau) == 0
@@ -0,0 +1,120 @@
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from vazio.acquisition import Reading  # noqa: E402
+from vazio.archive import Archive, ArchiveWriter, decode, encode  # noqa: E402
+
+
+def series(n, seed=0):
+    rng = numpy.random.default_rng(seed)
+    # millisecond resolution (the archive default)
+    t = numpy.round(1.7e9 + numpy.arange(n) + rng.normal(0, 0.002, n), 3)
+    pressure = 1e-8 * (2 + numpy.sin(numpy.arange(n) / 500))
+    voltage = numpy.where(numpy.arange(n) % 1000 < 500, 7000.0, 5000.0)
+    return t, pressure, voltage
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        [1.0],
+        [1.0, 1.0, 1.0],
+        [numpy.nan, numpy.inf, -0.0, 0.0, -numpy.inf, 1e-300, 5e-324],
+        numpy.random.default_rng(1).normal(size=1000),
+    ],
+)
+def test_segment_round_trip(values):
+    values = numpy.array(values, dtype=float)
+    n = len(values)
+    ticks = numpy.cumsum(numpy.random.default_rng(2).integers(-5000, 5000, n))
+    ticks[::7] = ticks[::7] + 2 ** 40
+    t, v = decode(encode(ticks, values), n, ticks[0])
+    assert numpy.array_equal(t, ticks)
+    assert numpy.array_equal(v.view("u8"), values.view("u8"))
+
+
+def test_archive(tmp_path):
+    path = tmp_path / "vacuum.vza"
+    t, pressure, voltage = series(10000)
+    with ArchiveWriter(path, segment_size=1024) as writer:
+        writer.extend("d1", "hv1.pressure", t, pressure)
+        for ti, vi in zip(t[:2500], voltage[:2500]):
+            writer.append("d1", "hv1.voltage", ti, vi)
+    assert writer.ratio > 2
+
+    with Archive(path) as archive:
+        assert archive.keys == [("d1", "hv1.pressure"), ("d1", "hv1.voltage")]
+        assert archive.samples == 12500
+        assert archive.ratio == pytest.approx(writer.ratio)
+        rt, rv = archive.read("d1", "hv1.pressure")
+        assert numpy.array_equal(rv, pressure)
+        assert numpy.allclose(rt, t, rtol=0, atol=1e-6)
+        samples, _, ratio = archive.stats()["d1", "hv1.voltage"]
+        assert samples == 2500
+        assert ratio > 8
+        assert numpy.array_equal(archive.read("d1", "hv1.voltage")[1], voltage[:2500])
+        assert len(archive.read("d1", "nope")[0]) == 0
+
+
+def test_range_query_touches_only_its_segments(tmp_path):
+    path = tmp_path / "vacuum.vza"
+    t, pressure, _ = series(10000)
+    with ArchiveWriter(path, segment_size=1000) as writer:
+        writer.extend("d1", "hv1.pressure", t, pressure)
+    start, stop = t[2500], t[3200]
+    with Archive(path) as archive:
+        assert len(archive.index) == 10
+        segments = archive.segments("d1", "hv1.pressure", start, stop)
+        assert [s.offset for s in segments] == [s.offset for s in archive.index[2:4]]
+        parts = list(archive.iter("d1", "hv1.pressure", start, stop))
+        assert len(parts) == 2
+        rt, rv = archive.read("d1", "hv1.pressure", start, stop)
+    assert len(rt) == 701
+    assert numpy.allclose(rt, t[2500:3201], rtol=0, atol=1e-6)
+    assert numpy.array_equal(rv, pressure[2500:3201])
+
+
+def test_update_and_recover(tmp_path):
+    path = tmp_path / "vacuum.vza"
+    writer = ArchiveWriter(path, segment_size=10, quantities=["pressure"])
+    for i in range(25):
+        writer.update(
+            [
+                Reading("d1", "hv1.pressure", 1e-8 * i, 100.0 + i, None),
+                Reading("d1", "hv1.voltage", 7000, 100.0 + i, None),
+                Reading("d1", "hv2.pressure", None, 100.0 + i, TimeoutError()),
+            ]
+        )
+    # killed before close: the two complete segments are recovered
+    writer._file.flush()
+    with pytest.raises(ValueError):
+        Archive(path)
+    with Archive(path, resolution=1e-3) as archive:
+        assert archive.samples == 20
+        assert archive.keys == [("d1", "hv1.pressure")]
+        t, v = archive.read("d1", "hv1.pressure")
+        assert numpy.allclose(t, 100.0 + numpy.arange(20))
+        assert numpy.array_equal(v, 1e-8 * numpy.arange(20))
+    writer.close()
+    with Archive(path) as archive:
+        assert archive.keys == [("d1", "hv1.pressure")]
+        assert archive.samples == 25
+
+
+def test_recover_empty(tmp_path):
+    path = tmp_path / "empty.vza"
+    writer = ArchiveWriter(path)
+    writer.append("d1", "hv1.pressure", 100.0, 1e-8)
+    writer._file.flush()
+    with Archive(path, resolution=1e-3) as archive:
+        assert archive.keys == [("d1", "hv1.pressure")]
+        assert archive.samples == 0
+    writer.close()
+
+
+def test_not_an_archive(tmp_path):
+    path = tmp_path / "other"
+    path.write_bytes(b"hello")
+    with pytest.raises(ValueError):
+        Archive(path)
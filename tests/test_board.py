@@ -0,0 +1,98 @@
+import math
+import threading
+import multiprocessing
+
+import pytest
+
+from conftest import Controller
+from vazio.acquisition import Acquisition
+from vazio.board import Board, BoardReader, VALID, INVALID, UNSET
+from vazio.variandual import HighVoltage
+
+
+def controller():
+    return Controller(high_voltage=HighVoltage.OffHVProtect, failing=("current",))
+
+
+@pytest.fixture
+def board():
+    acq = Acquisition(
+        {"d1": controller(), "d2": controller()},
+        ("hv1.pressure", "hv1.high_voltage", "hv1.current"),
+        clock=lambda: 123.0,
+    )
+    board = Board.create(None, acq)
+    yield acq, board
+    board.close()
+
+
+def test_publish(board):
+    acq, board = board
+    reader = BoardReader(board.name)
+    assert reader.keys == board.keys
+    value, timestamp, quality = reader.read("d1", "hv1.pressure")
+    assert math.isnan(value) and quality == UNSET
+    acq.poll()
+    assert reader.read("d1", "hv1.pressure") == (1e-8, 123.0, VALID)
+    assert reader.read("d2", "hv1.high_voltage") == (-6.0, 123.0, VALID)
+    current = reader.read("d2", "hv1.current")
+    assert current.quality == INVALID
+    assert len(reader.read_all()) == 6
+    reader.close()
+
+
+def test_not_a_board():
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(create=True, size=64)
+    try:
+        with pytest.raises(ValueError):
+            BoardReader(shm.name)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_consistent_reads():
+    board = Board([("d1", "hv1.pressure")])
+    reader = BoardReader(board.name)
+    stop = threading.Event()
+
+    def write():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            board.write("d1", "hv1.pressure", float(i), float(i), i % 2)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    try:
+        for _ in range(20000):
+            value, timestamp, quality = reader.read("d1", "hv1.pressure")
+            assert value == timestamp
+            assert math.isnan(value) or quality == int(value) % 2
+    finally:
+        stop.set()
+        thread.join()
+        reader.close()
+        board.close()
+
+
+def _read(name, queue):
+    reader = BoardReader(name)
+    queue.put(tuple(reader.read("d1", "hv1.pressure")))
+    reader.close()
+
+
+def test_other_process(board):
+    acq, board = board
+    acq.poll()
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_read, args=(board.name, queue))
+    process.start()
+    assert queue.get(timeout=30) == (1e-8, 123.0, VALID)
+    process.join()
+    assert process.exitcode == 0
+    # the reader process must not destroy the block
+    assert BoardReader(board.name).read("d1", "hv1.pressure").value == 1e-8
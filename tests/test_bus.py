@@ -0,0 +1,56 @@
+import pytest
+
+from conftest import Clock
+from vazio.protocol.agilent import TABLE, Codec
+from vazio.simulator.bus import Bus
+
+def unit(addr):
+    codec = Codec(addr)
+
+    def handler(msg):
+        if codec.address_of(msg) != addr:
+            return None
+        return codec.reply(b"812", " 5.3E-07")
+
+    return handler
+
+
+def test_bus_addressing():
+    clock = Clock()
+    bus = Bus(Codec.address_of, clock=clock, sleep=clock.sleep, realtime=True)
+    for addr in range(4):
+        bus.add(addr, unit(addr))
+
+    query = TABLE.queries(Codec(2))["pressure", 1]
+    reply = bus.handle(query)
+    assert Codec.address_of(reply) == 2
+    assert Codec.data(reply) == " 5.3E-07"
+
+    # nobody at address 7: request is lost
+    assert bus.handle(TABLE.queries(Codec(7))["pressure", 1]) is None
+    assert bus.stats()["lost"] == 1
+    assert bus.transactions == 2
+
+
+def test_bus_timing():
+    clock = Clock()
+    bus = Bus(
+        Codec.address_of, baudrate=9600, turnaround=0.002,
+        clock=clock, sleep=clock.sleep, realtime=True,
+    )
+    bus.add(0, unit(0))
+    query = TABLE.queries(Codec(0))["pressure", 1]
+    reply = bus.handle(query)
+    expected = (len(query) + len(reply)) * 10 / 9600 + 0.002
+    assert bus.busy == pytest.approx(expected)
+    assert clock.now == pytest.approx(expected)
+    assert bus.occupancy == pytest.approx(1)
+    clock.now *= 2
+    assert bus.occupancy == pytest.approx(0.5)
+
+
+def test_bus_capacity():
+    bus = Bus(Codec.address_of, baudrate=9600, turnaround=0.002)
+    # 3 quantities x 4 channels per unit at 1Hz
+    assert bus.capacity(10, 19, 12, 1) == 2
+    assert bus.capacity(10, 19, 1, 1) == 31
@@ -0,0 +1,147 @@
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from conftest import Clock, Controller  # noqa: E402
+from vazio.acquisition import Acquisition  # noqa: E402
+from vazio.capture import BurstCapture, Event  # noqa: E402
+from vazio.loopback import variandual  # noqa: E402
+from vazio.protocol.multigauge import Channel, Command  # noqa: E402
+from vazio.refresh import RefreshPolicy  # noqa: E402
+from vazio.simulator.engine.variandual import create_state  # noqa: E402
+from vazio.simulator.virtual import Scheduler, VirtualClock  # noqa: E402
+from vazio.variandual import HighVoltage, InterlockStatus, VarianDual  # noqa: E402
+
+
+def setup(**kwargs):
+    clock = Clock()
+    ctrl = Controller(pressure=1e-9)
+    capture = BurstCapture(
+        ctrl, clock=clock, pre=1.0, post=0.5, rate=10, budget=None, **kwargs
+    )
+    events = []
+    capture.subscribe(events.append)
+    return clock, ctrl, capture, events
+
+
+def poll(capture, clock, n, dt=0.1):
+    for _ in range(n):
+        capture.acquisition.poll()
+        clock.now += dt
+
+
+def test_hv_fault_trigger():
+    clock, ctrl, capture, events = setup()
+    poll(capture, clock, 30)
+    # ring only keeps the pre trigger window
+    assert len(capture.ring) in (10, 11)
+    assert not events
+    ctrl.hv1.pressure = 1e-5
+    ctrl.hv1.high_voltage = HighVoltage.OffHVShortCircuit
+    poll(capture, clock, 1)
+    assert capture.triggered
+    assert capture.acquisition.period == 0
+    clock.now += 0.01
+    n = 0
+    while capture.triggered:
+        poll(capture, clock, 1, dt=0.01)
+        n += 1
+    assert n in (40, 41)
+    assert capture.acquisition.period == pytest.approx(0.1)
+    (event,) = events
+    assert "hv1.high_voltage" in event.reason
+    assert event.time == pytest.approx(3.0)
+    assert event.columns[0] == "time"
+    assert len(event.pre) in (9, 10)
+    post = event.post
+    assert len(post) == n + 1
+    col = event.columns.index("hv1.pressure")
+    assert post[0, col] == 1e-5
+    assert (event.pre[:, col] == 1e-9).all()
+    # still in fault: no new trigger
+    poll(capture, clock, 20)
+    assert len(events) == 1
+
+
+def test_manual_off_does_not_trigger():
+    clock, ctrl, capture, events = setup()
+    poll(capture, clock, 3)
+    ctrl.hv2.high_voltage = HighVoltage.Off
+    poll(capture, clock, 3)
+    assert not capture.triggered
+
+
+def test_interlock_trigger(tmp_path):
+    clock, ctrl, capture, events = setup(channels=("hv2",))
+    poll(capture, clock, 3)
+    ctrl.interlock_status = InterlockStatus.HV2Cable
+    poll(capture, clock, 10)
+    (event,) = events
+    assert event.reason == "interlock_status 0 -> 128"
+    assert event.columns == (
+        "time", "hv2.pressure", "hv2.current", "hv2.high_voltage", "interlock_status"
+    )
+    filename = str(tmp_path / "event.npz")
+    event.save(filename)
+    loaded = Event.load(filename)
+    assert loaded.reason == event.reason
+    assert loaded.columns == event.columns
+    assert numpy.array_equal(loaded.data, event.data)
+
+
+def test_line_budget_keeps_other_acquisition_rate():
+    clock = VirtualClock()
+    state = create_state()
+    conn = variandual(
+        state, ack=True, baudrate=9600, turnaround=0.002, realtime=True,
+        clock=clock.monotonic, sleep=clock.sleep,
+    )
+    ctrl = VarianDual(conn)
+    policy = RefreshPolicy(baudrate=9600, turnaround=0.002)
+    capture = BurstCapture(
+        ctrl, pre=2.5, post=4.0, rate=10, budget=0.5, policy=policy,
+        clock=clock.time,
+    )
+    # 7 queries do not fit 10 times per second in a 9600 baud line share
+    assert capture.period > capture.min_period > 0.1
+    main = Acquisition(
+        {"d": ctrl}, ["hv1.pressure", "hv2.pressure"], 1.0, clock=clock.time
+    )
+    polls = []
+    main.subscribe(lambda readings: polls.append(readings[0].timestamp))
+    scheduler = Scheduler(clock)
+    scheduler.add(main)
+    captured = []
+
+    def poll_capture():
+        # same schedule as Acquisition.run
+        start = clock.monotonic()
+        capture.acquisition.poll()
+        busy = clock.monotonic() - start
+        captured.append(busy)
+        wait = max(capture.acquisition.period - busy, 0)
+        scheduler.at(clock.time() + wait, poll_capture)
+
+    def fault():
+        state[Command.HighVoltage][Channel.HighVoltage1] = "-5"
+
+    scheduler.at(clock.time(), poll_capture)
+    scheduler.at(clock.time() + 3, fault)
+    start = clock.time()
+    scheduler.run(10)
+    (event,) = capture.events
+    assert "hv1.high_voltage" in event.reason
+    # faster polling after the trigger
+    pre, post = (numpy.diff(rows[:, 0]) for rows in (event.pre, event.post))
+    assert post.max() < pre.min()
+    assert post.mean() == pytest.approx(capture.min_period, rel=0.1)
+    # the capture used at most its share of the line, even after the trigger
+    assert sum(captured) / 10 <= 0.5 + 0.05
+    # the main acquisition kept its 1 Hz rate
+    assert len(polls) == 11
+    assert max(numpy.diff([start] + polls)) < 1.0 + 0.2
+
+
+def test_idle_budget_below_budget():
+    with pytest.raises(ValueError):
+        BurstCapture(Controller(), budget=0.2, idle_budget=0.2)
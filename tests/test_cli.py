@@ -0,0 +1,111 @@
+import io
+import time
+import math
+
+import pytest
+
+from conftest import Controller
+from vazio.acquisition import Reading
+from vazio.cli import (
+    parse_spec, BinaryFormat, CSVFormat, Writer, Monitor, read_binary, table
+)
+from vazio.variandual import HighVoltage
+
+
+def test_parse_spec():
+    assert parse_spec("variandual:/dev/ttyS0") == (
+        "variandual", "variandual", None, "/dev/ttyS0"
+    )
+    assert parse_spec("pump=agilent/2:tcp://moxa:4002") == (
+        "pump", "agilent", 2, "tcp://moxa:4002"
+    )
+    assert parse_spec("mks:socket://a=b:1")[0] == "mks"
+    with pytest.raises(ValueError):
+        parse_spec("unknown:/dev/ttyS0")
+    with pytest.raises(ValueError):
+        parse_spec("mks")
+
+
+READINGS = [
+    Reading("d1", "hv1.pressure", 1e-8, 10.0),
+    Reading("d1", "hv1.high_voltage", HighVoltage.Off, 10.5),
+    Reading("d2", "hv1.current", None, 11.0, IOError("timeout")),
+]
+
+QUANTITIES = {
+    "d1": ("hv1.pressure", "hv1.high_voltage"),
+    "d2": ("hv1.current",),
+}
+
+
+def test_binary_roundtrip():
+    fmt = BinaryFormat(QUANTITIES, QUANTITIES)
+    stream = io.BytesIO(fmt.header() + fmt.encode(READINGS))
+    header, records = read_binary(stream)
+    assert header["controllers"] == ["d1", "d2"]
+    records = list(records)
+    assert records[0] == (10.0, "d1", "hv1.pressure", 1e-8)
+    assert records[1] == (10.5, "d1", "hv1.high_voltage", 0.0)
+    assert records[2][:3] == (11.0, "d2", "hv1.current")
+    assert math.isnan(records[2][3])
+
+
+def test_csv():
+    fmt = CSVFormat(QUANTITIES, QUANTITIES)
+    lines = (fmt.header() + fmt.encode(READINGS)).decode().splitlines()
+    assert lines[1] == "10.000000,d1,hv1.pressure,1e-08,"
+    assert lines[2] == "10.500000,d1,hv1.high_voltage,Off,"
+    assert lines[3].startswith("11.000000,d2,hv1.current,,")
+
+
+def test_format_checks_quantities():
+    with pytest.raises(ValueError, match="d3"):
+        CSVFormat(["d1", "d3"], QUANTITIES)
+    with pytest.raises(ValueError, match="d2"):
+        BinaryFormat(QUANTITIES, {"d1": QUANTITIES["d1"], "d2": ()})
+
+
+class SlowOutput(io.BytesIO):
+    def write(self, data):
+        time.sleep(0.01)
+        return super().write(data)
+
+
+def test_writer_never_blocks():
+    fmt = BinaryFormat(QUANTITIES, QUANTITIES)
+    output = SlowOutput()
+    writer = Writer(fmt, output, maxsize=2)
+    writer.start()
+    start = time.monotonic()
+    for _ in range(100):
+        writer.put(READINGS)
+    assert time.monotonic() - start < 0.1
+    writer.stop()
+    assert writer.dropped > 0
+    output.seek(0)
+    records = list(read_binary(output)[1])
+    assert len(records) + writer.dropped == 300
+
+
+def test_monitor():
+    quantities = {"d1": ("hv1.pressure", "hv1.current")}
+    monitor = Monitor({"d1": Controller(failing=("current",))}, quantities)
+    output = io.BytesIO()
+    writer = Writer(CSVFormat(quantities, quantities), output)
+    monitor.subscribe(writer.put)
+    writer.start()
+    monitor.start()
+    time.sleep(0.05)
+    monitor.stop()
+    writer.stop()
+    counter = monitor.counters["d1"]
+    assert counter.cycles > 0
+    assert counter.samples == 2 * counter.cycles
+    assert counter.errors == counter.cycles
+    rate, cycles = monitor.rates()["d1"]
+    assert rate == pytest.approx(2 * cycles)
+    assert "samples/s" in monitor.report()
+    assert "1e-08" in table(monitor)
+    assert "<OSError>" in table(monitor)
+    lines = output.getvalue().decode().splitlines()
+    assert len(lines) - 1 + writer.dropped == counter.samples
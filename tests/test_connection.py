@@ -0,0 +1,338 @@
+import os
+import pty
+import tty
+import time
+import functools
+import threading
+
+import pytest
+
+from vazio.connection import (
+    Connection, Disconnected, FrameReader, Supervisor
+)
+from vazio.protocol.multigauge import Channel, Command
+from vazio.protocol.table import ReplyMismatch
+from vazio.simulator.engine import variandual as engine
+from vazio.variandual import VarianDual
+
+
+class Stream:
+    """pyserial like stream without file descriptor"""
+
+    def __init__(self, replies):
+        self.replies = bytearray(replies)
+        self.written = []
+        self.timeout = None
+        self.reads = 0
+
+    def write(self, data):
+        self.written.append(data)
+
+    @property
+    def in_waiting(self):
+        return len(self.replies)
+
+    def read(self, size):
+        self.reads += 1
+        data = bytes(self.replies[:size])
+        del self.replies[:size]
+        return data
+
+    def reset_input_buffer(self):
+        self.replies.clear()
+
+
+def test_connection():
+    conn = Connection(Stream(b">1302100\r"), timeout=0.01)
+    assert conn.write_readline(b"#1302?\r") == b">1302100\r"
+    with pytest.raises(TimeoutError):
+        conn.write_readline(b"#1302?\r")
+
+
+def test_connection_tail():
+    conn = Connection(
+        Stream(b"\x02\x80\x06\x0385\x02"), eol=b"\x03", tail=2, timeout=0.01
+    )
+    assert conn.write_readline(b"") == b"\x02\x80\x06\x0385"
+    with pytest.raises(TimeoutError):
+        conn.write_readline(b"")
+
+
+def test_connection_pipeline():
+    stream = Stream(b">1302100\r>2302200\r\x06\r")
+    conn = Connection(stream, timeout=0.01)
+    replies = conn.pipeline([b"#1302?\r", b"#2302?\r", b"#01010\r"])
+    assert replies == [b">1302100\r", b">2302200\r", b"\x06\r"]
+    # all replies were available: a single read
+    assert stream.reads == 1
+    assert stream.written == [b"#1302?\r#2302?\r#01010\r"]
+
+
+class Device(Stream):
+    """
+    Stream answered by the simulated VarianDual. While muted the replies
+    are held: they arrive late, with the next write (or deliver)
+    """
+
+    def __init__(self, state):
+        super().__init__(b"")
+        self.handle = functools.partial(engine.handle, state)
+        self.held = bytearray()
+        self.mute = False
+
+    def deliver(self):
+        self.replies += self.held
+        self.held.clear()
+
+    def write(self, data):
+        super().write(data)
+        self.deliver()
+        for request in data.split(b"\r")[:-1]:
+            reply = self.handle(request + b"\r")
+            (self.held if self.mute else self.replies).extend(reply)
+
+
+def device():
+    state = engine.create_state()
+    for channel, voltage in ((Channel.HighVoltage1, "5000"),
+                             (Channel.HighVoltage2, "7000")):
+        state[Command.Voltage][channel] = voltage
+        state[Command.Pressure][channel] = "1.0E-08"
+    return Device(state)
+
+
+def test_late_reply_is_discarded():
+    stream = device()
+    conn = Connection(stream, timeout=0.01)
+    stream.mute = True
+    with pytest.raises(TimeoutError):
+        conn.write_readline(b"#107?\r")
+    stream.mute = False
+    stream.deliver()
+    # the late voltage reply is not taken as the pressure reply
+    assert conn.write_readline(b"#102?\r") == b">1021.0E-08\r"
+    assert conn.write_readline(b"#107?\r") == b">1075000\r"
+
+
+def test_pipeline_timeout_discards_remaining_replies():
+    stream = device()
+    conn = Connection(stream, timeout=0.01)
+    stream.mute = True
+    with pytest.raises(TimeoutError):
+        conn.pipeline([b"#107?\r", b"#207?\r"])
+    stream.mute = False
+    stream.deliver()
+    assert conn.pipeline([b"#102?\r", b"#207?\r"]) == [
+        b">1021.0E-08\r", b">2077000\r"
+    ]
+
+
+def test_controller_rejects_reply_to_another_request():
+    stream = device()
+    ctrl = VarianDual(Connection(stream, timeout=0.01), ack=False)
+    stream.mute = True
+    with pytest.raises(TimeoutError):
+        ctrl.hv1.voltage
+    stream.mute = False
+    # the voltage reply arrives while reading the pressure
+    with pytest.raises(ReplyMismatch):
+        ctrl.hv1.pressure
+    # back in step
+    assert ctrl.hv1.pressure == 1e-8
+    assert ctrl.hv1.voltage == 5000
+
+
+class FD:
+    def __init__(self, fd):
+        self.fd = fd
+
+    def fileno(self):
+        return self.fd
+
+    def write(self, data):
+        os.write(self.fd, data)
+
+
+class Pipe:
+    def __init__(self):
+        self.r, self.w = os.pipe()
+
+    def fileno(self):
+        return self.r
+
+    def close(self):
+        os.close(self.r)
+        os.close(self.w)
+
+
+def test_frame_reader_fd():
+    pipe = Pipe()
+    reader = FrameReader(pipe, b"\x03", tail=2, size=8)
+    os.write(pipe.w, b"\x02\x80\x06\x0385\x02\x80")
+    assert reader.read_frame(0.1) == b"\x02\x80\x06\x0385"
+    # leftover kept; eol split across reads; buffer grows for long frames
+    assert len(reader) == 2
+
+    def send():
+        time.sleep(0.01)
+        os.write(pipe.w, b"\x81\x82\x83\x84\x85")
+        time.sleep(0.01)
+        os.write(pipe.w, b"\x03A")
+        time.sleep(0.01)
+        os.write(pipe.w, b"B")
+
+    thread = threading.Thread(target=send)
+    thread.start()
+    assert reader.read_frame(1) == b"\x02\x80\x81\x82\x83\x84\x85\x03AB"
+    thread.join()
+    assert len(reader) == 0
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        reader.read_frame(0.02)
+    assert time.monotonic() - start < 0.5
+    pipe.close()
+
+
+def test_frame_reader_discard():
+    pipe = Pipe()
+    reader = FrameReader(pipe, size=8)
+    os.write(pipe.w, b">1\r>2")
+    assert reader.read_frame(0.1) == b">1\r"
+    os.write(pipe.w, b"\r>3\r" * 10)
+    reader.discard()
+    assert len(reader) == 0
+    with pytest.raises(TimeoutError):
+        reader.read_frame(0.01)
+    pipe.close()
+
+
+def test_frame_reader_eof():
+    pipe = Pipe()
+    reader = FrameReader(pipe)
+    os.close(pipe.w)
+    with pytest.raises(ConnectionError):
+        reader.read_frame(0.1)
+    os.close(pipe.r)
+
+
+def test_connection_pty():
+    """replies of a simulated controller through a pseudo terminal"""
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+
+    def controller():
+        reader = FrameReader(FD(master))
+        try:
+            while True:
+                request = reader.read_frame(1)
+                os.write(master, b">" + request[1:-2] + b"1.0E-08\r")
+        except (OSError, TimeoutError):
+            pass
+
+    thread = threading.Thread(target=controller, daemon=True)
+    thread.start()
+
+    conn = Connection(FD(slave), timeout=1)
+    for _ in range(100):
+        assert conn.write_readline(b"#1302?\r") == b">13021.0E-08\r"
+    os.close(slave)
+    thread.join()
+    os.close(master)
+
+
+class Line:
+    """Fake connection that can be broken"""
+
+    def __init__(self):
+        self.error = None
+        self.closed = False
+        self.requests = []
+
+    def write_readline(self, data):
+        self.requests.append(data)
+        if self.error is not None:
+            raise self.error
+        return data
+
+    def close(self):
+        self.closed = True
+
+
+class Factory:
+    def __init__(self, fail=0):
+        self.fail = fail
+        self.lines = []
+
+    def __call__(self):
+        if self.fail:
+            self.fail -= 1
+            raise OSError("no such device")
+        self.lines.append(Line())
+        return self.lines[-1]
+
+
+def test_supervisor_fail_fast_and_reconnect():
+    delays = []
+    factory = Factory(fail=3)
+    sup = Supervisor(factory, sleep=lambda delay: delays.append(delay), seed=1)
+    with pytest.raises(Disconnected):
+        sup.write_readline(b"a")
+    sup.start()
+    assert sup.wait_connected(1)
+    assert sup.attempts == 4
+    assert len(delays) == 3
+    assert sup.write_readline(b"a") == b"a"
+    # broken line: dropped immediately, next call fails fast
+    factory.lines[0].error = OSError("device disappeared")
+    with pytest.raises(OSError):
+        sup.write_readline(b"a")
+    assert factory.lines[0].closed
+    sup.wait_connected(1)
+    assert sup.write_readline(b"b") == b"b"
+    assert len(factory.lines) == 2
+    assert sup.reconnections == 2
+    sup.close()
+
+
+def test_supervisor_timeouts():
+    factory = Factory()
+    sup = Supervisor(factory, max_timeouts=2)
+    sup.start()
+    sup.wait_connected(1)
+    line = factory.lines[0]
+    line.error = TimeoutError()
+    with pytest.raises(TimeoutError):
+        sup.write_readline(b"a")
+    assert sup.connected
+    line.error = None
+    sup.write_readline(b"a")
+    line.error = TimeoutError()
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            sup.write_readline(b"a")
+    assert line.closed
+    sup.close()
+
+
+def test_supervisor_restore():
+    factory = Factory()
+    restored = []
+
+    def on_connect():
+        restored.append(threading.current_thread())
+        assert sup.write_readline(b"unit") == b"unit"
+
+    sup = Supervisor(factory, on_connect=on_connect)
+    sup.start()
+    sup.wait_connected(1)
+    assert restored == [sup._thread]
+    assert factory.lines[0].requests == [b"unit"]
+    sup.close()
+
+
+def test_supervisor_backoff():
+    sup = Supervisor(Factory(), backoff=(0.1, 1.0), jitter=0.5, seed=0)
+    for attempt in range(8):
+        delay = sup.delay(attempt)
+        nominal = min(1.0, 0.1 * 2 ** attempt)
+        assert nominal / 2 <= delay <= nominal
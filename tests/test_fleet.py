@@ -0,0 +1,80 @@
+import time
+import threading
+
+from vazio.fleet import Fleet
+from vazio.loopback import variandual
+from vazio.variandual import VarianDual
+
+
+QUANTITIES = ("hv1.voltage", "hv1.current", "hv1.pressure", "unit")
+
+
+def controllers(count, turnaround=0.01):
+    return {
+        "d{}".format(i): VarianDual(variandual(turnaround=turnaround, realtime=True))
+        for i in range(count)
+    }
+
+
+class Hung:
+    """Connection that blocks until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def write_readline(self, data):
+        self.release.wait()
+        raise TimeoutError("no reply")
+
+
+def test_sweep_time_is_one_controller():
+    ctrls = controllers(20)
+    fleet = Fleet(ctrls, workers=20)
+    start = time.monotonic()
+    fleet.query(QUANTITIES, names=["d0"])
+    single = time.monotonic() - start
+    start = time.monotonic()
+    results = fleet.query(QUANTITIES)
+    sweep = time.monotonic() - start
+    assert list(results) == list(ctrls)
+    assert all(result.ok for result in results.values())
+    assert set(results["d3"].values) == set(QUANTITIES)
+    # 20 controllers in about the time of one (sequentially: 20 times)
+    assert sweep < 4 * single
+    fleet.close()
+
+
+def test_as_completed_and_timeout():
+    ctrls = controllers(3, turnaround=0)
+    hung = Hung()
+    ctrls["stuck"] = VarianDual(hung)
+    fleet = Fleet(ctrls, workers=4, timeout=0.2)
+    start = time.monotonic()
+    results = list(fleet.as_completed(QUANTITIES))
+    assert time.monotonic() - start < 1
+    assert [r.controller for r in results][-1] == "stuck"
+    stuck = results[-1]
+    assert not stuck.ok
+    assert set(stuck.errors) == set(QUANTITIES)
+    assert all(isinstance(e, TimeoutError) for e in stuck.errors.values())
+    assert all(r.ok for r in results[:-1])
+    # still busy with the abandoned sweep
+    result = fleet.query(["unit"], timeout=0.1, names=["stuck"])["stuck"]
+    assert "busy" in str(result.errors["unit"])
+    hung.release.set()
+    fleet.close()
+
+
+def test_table():
+    ctrls = controllers(2, turnaround=0)
+    ctrls["broken"] = VarianDual(Hung())
+    ctrls["broken"].conn.release.set()
+    fleet = Fleet(ctrls)
+    table = fleet.table(["hv1.pressure", "unit"])
+    assert table.controllers == ("d0", "d1", "broken")
+    assert isinstance(table.rows[0][0], float)
+    assert isinstance(table.rows[2][1], TimeoutError)
+    text = str(table).splitlines()
+    assert len(text) == 4
+    assert text[3].split() == ["broken", "<TimeoutError>", "<TimeoutError>"]
+    fleet.close()
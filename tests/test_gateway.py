@@ -0,0 +1,240 @@
+import io
+import json
+import time
+import asyncio
+import threading
+
+import pytest
+
+from conftest import Controller
+from vazio.acquisition import Acquisition
+from vazio.cli import read_binary
+from vazio.gateway import (
+    BINARY,
+    PING,
+    Gateway,
+    WebSocket,
+    accept_key,
+    encode_frame,
+    read_frame,
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def acquisition():
+    acq = Acquisition({"d1": Controller()}, ["hv1.pressure", "hv1.voltage"])
+    acq.poll()
+    return acq
+
+
+def test_accept_key():
+    # RFC 6455 section 1.3 example
+    assert accept_key("dGhlIHNhbXBsZSBub25jZQ==") == "s3pPLMBiTxaQ9kYGzzhZRbK+xOo="
+
+
+def test_frames():
+    async def main():
+        for size in (5, 300, 70000):
+            payload = bytes(range(256)) * (size // 256) + b"x" * (size % 256)
+            for mask in (None, b"\x0a\x0b\x0c\x0d"):
+                reader = asyncio.StreamReader()
+                reader.feed_data(encode_frame(BINARY, payload, mask))
+                assert await read_frame(reader) == (BINARY, payload)
+
+    run(main())
+
+
+def test_json_deltas():
+    async def main():
+        acq = acquisition()
+        gateway = await Gateway(acq, port=0, rate=100).start()
+        ws = await WebSocket.connect(gateway.url)
+        snapshot = json.loads(await ws.recv())
+        assert snapshot["d1"]["hv1.pressure"][0] == 1e-8
+        assert snapshot["d1"]["hv1.voltage"][0] == 7000
+        acq.controllers["d1"].hv1.pressure = 2e-8
+        acq.poll()
+        delta = json.loads(await ws.recv())
+        # only the quantity which changed
+        assert list(delta["d1"]) == ["hv1.pressure"]
+        assert delta["d1"]["hv1.pressure"][0] == 2e-8
+        assert gateway.stats()["clients"] == 1
+        await ws.close()
+        await asyncio.sleep(0.05)
+        assert gateway.stats()["clients"] == 0
+        await gateway.stop()
+
+    run(main())
+
+
+def test_binary():
+    async def main():
+        acq = acquisition()
+        gateway = await Gateway(acq, port=0).start()
+        ws = await WebSocket.connect(gateway.url + "?format=binary")
+        header = await ws.recv()
+        records = await ws.recv()
+        header, decoded = read_binary(io.BytesIO(header + records))
+        assert header["controllers"] == ["d1"]
+        values = {path: value for _, _, path, value in decoded}
+        assert values == {"hv1.pressure": 1e-8, "hv1.voltage": 7000}
+        await ws.close()
+        await gateway.stop()
+
+    run(main())
+
+
+def test_bad_requests():
+    async def main():
+        gateway = await Gateway(acquisition(), port=0).start()
+        with pytest.raises(ConnectionError):
+            await WebSocket.connect(gateway.url + "?format=xml")
+        for rate in ("0", "-1", "nan", "inf", "fast"):
+            with pytest.raises(ConnectionError, match="400"):
+                await WebSocket.connect(gateway.url + "?rate=" + rate)
+        reader, writer = await asyncio.open_connection("127.0.0.1", gateway.port)
+        writer.write(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        assert (await reader.readline()).startswith(b"HTTP/1.1 426")
+        writer.close()
+        await gateway.stop()
+
+    run(main())
+
+
+def test_ping():
+    async def main():
+        gateway = await Gateway(acquisition(), port=0).start()
+        ws = await WebSocket.connect(gateway.url)
+        await ws.recv()
+        ws.send(PING, b"hello")
+        assert await read_frame(ws.reader) == (0xA, b"hello")
+        await ws.close()
+        await gateway.stop()
+
+    run(main())
+
+
+def test_frame_too_large():
+    async def main():
+        gateway = await Gateway(acquisition(), port=0, max_frame=1024).start()
+        ws = await WebSocket.connect(gateway.url)
+        await ws.recv()
+        ws.send(PING, b"x" * 1025)
+        with pytest.raises(ConnectionError, match="closed"):
+            await ws.recv()
+        await asyncio.sleep(0.05)
+        assert gateway.stats()["clients"] == 0
+        await gateway.stop()
+
+    run(main())
+
+
+def test_stop_awaits_handlers():
+    async def main():
+        gateway = await Gateway(acquisition(), port=0).start()
+        clients = [await WebSocket.connect(gateway.url) for _ in range(3)]
+        # a connection which never completes the handshake
+        reader, writer = await asyncio.open_connection("127.0.0.1", gateway.port)
+        writer.write(b"GET / HTTP/1.1\r\n")
+        await asyncio.sleep(0.05)
+        assert len(gateway._handlers) == 4
+        await gateway.stop()
+        assert not gateway._handlers
+        for ws in clients:
+            with pytest.raises((ConnectionError, asyncio.IncompleteReadError)):
+                while True:
+                    await ws.recv()
+        writer.close()
+
+    run(main())
+
+
+def test_rate_limit_coalesces():
+    async def main():
+        acq = acquisition()
+        gateway = await Gateway(acq, port=0, rate=100).start()
+        ws = await WebSocket.connect(gateway.url + "?rate=5")
+        await ws.recv()
+        hv = acq.controllers["d1"].hv1
+        start = time.monotonic()
+        for i in range(20):
+            hv.pressure = (i + 1) * 1e-7
+            acq.poll()
+            await asyncio.sleep(0.005)
+        # at most 5 messages per second, the pending values are merged
+        messages = [json.loads(await ws.recv())]
+        while messages[-1]["d1"]["hv1.pressure"][0] != 2e-6:
+            messages.append(json.loads(await ws.recv()))
+        assert len(messages) <= 2
+        assert time.monotonic() - start >= 0.18
+        await ws.close()
+        await gateway.stop()
+
+    run(main())
+
+
+def test_slow_consumer_dropped():
+    async def main():
+        acq = Acquisition(
+            {"d{}".format(i): Controller() for i in range(200)},
+            ["hv1.pressure", "hv1.voltage"],
+        )
+        gateway = await Gateway(
+            acq, port=0, rate=1000, max_buffer=1 << 16, send_timeout=0.2
+        ).start()
+        fast = await WebSocket.connect(gateway.url)
+        slow = await WebSocket.connect(gateway.url)  # never reads
+        received = 0
+        stop = threading.Event()
+
+        def acquire():
+            # acquisition thread: never held back by the clients
+            i = 0
+            while not stop.is_set():
+                i += 1
+                for ctrl in acq.controllers.values():
+                    ctrl.hv1.pressure = i * 1e-9
+                acq.poll()
+                time.sleep(0.001)
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        try:
+            deadline = time.monotonic() + 10
+            while gateway.dropped == 0 and time.monotonic() < deadline:
+                await fast.recv()
+                received += 1
+        finally:
+            stop.set()
+            thread.join()
+        assert gateway.dropped == 1
+        assert gateway.stats()["clients"] == 1
+        assert received > 1
+        with pytest.raises((ConnectionError, asyncio.IncompleteReadError)):
+            while True:
+                await asyncio.wait_for(slow.recv(), 5)
+        await fast.close()
+        await gateway.stop()
+
+    run(main())
+
+
+def test_update_does_not_block():
+    async def main():
+        acq = acquisition()
+        gateway = await Gateway(acq, port=0).start()
+        clients = [await WebSocket.connect(gateway.url) for _ in range(20)]
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        # the event loop is busy in this thread: the listener only schedules
+        await loop.run_in_executor(None, lambda: [acq.poll() for _ in range(100)])
+        assert time.perf_counter() - start < 2
+        for ws in clients:
+            assert "d1" in json.loads(await ws.recv())
+            await ws.close()
+        await gateway.stop()
+
+    run(main())
@@ -0,0 +1,73 @@
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from vazio.acquisition import Reading  # noqa: E402
+from vazio.history import History, Series, lttb  # noqa: E402
+
+
+@pytest.fixture
+def series():
+    n = 200000
+    t = numpy.arange(n) * 0.5
+    v = 1e-8 * (2 + numpy.sin(t / 500))
+    v[123457] = 1e-4  # spike must survive downsampling
+    v[54321] = 1e-12
+    series = Series(factor=8)
+    series.extend(t, v)
+    return series
+
+
+@pytest.mark.parametrize("method", ["minmax", "lttb"])
+def test_export_keeps_extremes(series, method):
+    t, v = series.export(0, series.t[-1], 500, method=method, log=True)
+    assert len(t) <= 1000
+    assert numpy.all(numpy.diff(t) >= 0)
+    assert v.max() == 1e-4
+    assert v.min() == 1e-12
+
+
+def test_export_range(series):
+    start, stop = 10000.0, 60000.0
+    t, v = series.export(start, stop, 300)
+    assert len(t) == 600
+    assert t[0] >= start and t[-1] <= stop
+    assert 1e-12 in v
+    mask = (series.t >= start) & (series.t <= stop)
+    assert v.min() == series.v[mask].min()
+
+
+def test_export_small_range_returns_raw(series):
+    t, v = series.export(100, 110, 100)
+    assert numpy.array_equal(t, numpy.arange(100, 110.5, 0.5))
+
+
+def test_levels_are_incremental():
+    series = Series(factor=4)
+    series.extend(numpy.arange(10), numpy.arange(10))
+    assert len(series.level(1)) == 2
+    series.extend(numpy.arange(10, 16), numpy.arange(10, 16))
+    level = series.level(1)
+    assert len(level) == 4
+    assert list(level[:, 2]) == [0, 4, 8, 12]
+    assert list(level[:, 4]) == [3, 7, 11, 15]
+
+
+def test_lttb_endpoints():
+    t = numpy.arange(100.0)
+    v = numpy.sin(t)
+    st, sv = lttb(t, v, 10)
+    assert len(st) == 10
+    assert st[0] == 0 and st[-1] == 99
+
+
+def test_history_listener():
+    history = History()
+    history.update([
+        Reading("d1", "hv1.pressure", 1e-8, 1.0),
+        Reading("d1", "gauge1.pressure", 2e-8, 1.0),
+        Reading("d1", "hv1.high_voltage", "1", 1.0),
+    ])
+    t, v = history.export("d1", "gauge1.pressure", 0, 2, 100)
+    assert list(v) == [2e-8]
+    assert ("d1", "hv1.high_voltage") not in history.series
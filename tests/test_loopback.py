@@ -0,0 +1,108 @@
+import pytest
+
+from vazio import loopback
+from vazio.agilent import Agilent4UHV
+from vazio.mks import MKS937
+from vazio.protocol import agilent
+from vazio.protocol.multigauge import SerialConfigOnly
+from vazio.protocol.table import ProtocolError
+from vazio.variandual import VarianDual, HighVoltage, Unit, SerialProperty
+
+
+def test_variandual():
+    conn = loopback.variandual()
+    ctrl = VarianDual(conn, ack=False)
+    assert 5e-9 <= ctrl.hv1.pressure <= 9e-3
+    assert ctrl.hv2.high_voltage == HighVoltage.On
+    assert ctrl.ctrl_firmware_version == "VPo 1 0 24/04/98"
+    # writes are not answered until ACK mode is enabled
+    with pytest.raises(TimeoutError):
+        ctrl.unit = Unit.mbar
+    assert ctrl.enable_ack() == SerialProperty.AckNack
+    ctrl.unit = Unit.pascal
+    assert ctrl.unit == Unit.pascal
+    with pytest.raises(SerialConfigOnly):
+        ctrl.serial_property = SerialProperty.AckNack
+    ctrl.set_many({"hv1.high_voltage": HighVoltage.On, "unit": Unit.mbar})
+    assert ctrl.hv1.high_voltage == HighVoltage.On
+    assert ctrl.unit == Unit.mbar
+
+
+def test_variandual_enables_ack_on_first_write():
+    conn = loopback.variandual()
+    ctrl = VarianDual(conn)
+    ctrl.unit = Unit.pascal
+    assert ctrl.unit == Unit.pascal
+    assert SerialProperty.AckNack in ctrl.serial_property
+
+
+def test_variandual_independent_state():
+    ctrl1 = VarianDual(loopback.variandual(ack=True))
+    ctrl2 = VarianDual(loopback.variandual(ack=True))
+    ctrl1.unit = Unit.pascal
+    assert ctrl2.unit == Unit.torr
+
+
+def test_agilent():
+    ctrl = Agilent4UHV(loopback.agilent())
+    assert ctrl.model == "4UHV"
+    assert 5000 <= ctrl.hv2.voltage <= 6800
+    ctrl.hv1.set_point = 1e-7
+    assert ctrl.hv1.set_point == 1e-7
+    with pytest.raises(AttributeError):
+        ctrl.hv1.voltage = 1
+
+
+def test_agilent_write_errors(monkeypatch):
+    conn = loopback.agilent()
+    codec = agilent.Codec()
+    param = agilent.TABLE["voltage_target", 1]
+    monkeypatch.setattr(param, "range", (3000, 7000))
+    key = agilent.TABLE.keys["voltage_target", 1]
+    with pytest.raises(ProtocolError) as error:
+        codec.data(conn.write_readline(codec.write(key, "009000")))
+    assert error.value.code == agilent.OUT_OF_RANGE
+    with pytest.raises(ProtocolError) as error:
+        codec.data(conn.write_readline(codec.write(key, "5kV   ")))
+    assert error.value.code == agilent.DATA_TYPE_ERROR
+    assert codec.data(conn.write_readline(codec.write(key, "005000"))) == ""
+
+
+def test_agilent_address():
+    ctrl = Agilent4UHV(loopback.agilent(address=3), address=3)
+    assert ctrl.model == "4UHV"
+    # not addressed: no answer
+    other = Agilent4UHV(ctrl.conn, address=4)
+    with pytest.raises(TimeoutError):
+        other.model
+
+
+def test_mks():
+    ctrl = MKS937(loopback.mks())
+    assert ctrl.unit == "mbar"
+    assert 5e-9 <= ctrl.gauge1.pressure <= 9e-7
+    ctrl.gauge3.relay_set_point = 2e-6
+    assert ctrl.gauge3.relay_set_point == 2e-6
+    assert ctrl.gauge1.enable_cc() == "OK"
+    with pytest.raises(ProtocolError):
+        ctrl.gauge2.enable_cc()
+
+
+def test_line_timing():
+    conn = loopback.variandual(baudrate=9600, turnaround=0.002)
+    ctrl = VarianDual(conn)
+    for _ in range(10):
+        ctrl.hv1.voltage
+    stats = conn.bus.stats()
+    assert stats["transactions"] == 10
+    # "#107?\r" + ">107nnnnn\r": 16 chars at 9600 baud + turnaround
+    assert stats["busy"] == pytest.approx(10 * (16 * 10 / 9600 + 0.002))
+
+
+def test_realtime():
+    sleeps = []
+    conn = loopback.variandual(
+        baudrate=9600, turnaround=0.001, realtime=True, sleep=sleeps.append
+    )
+    VarianDual(conn).hv1.voltage
+    assert sleeps == [pytest.approx(16 * 10 / 9600 + 0.001)]
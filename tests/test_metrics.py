@@ -0,0 +1,143 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+import conftest
+from vazio import loopback
+from vazio.acquisition import Acquisition
+from vazio.metrics import Instrumented, Metrics, serve
+from vazio.variandual import (
+    FixedStep,
+    HighVoltage,
+    InterlockStatus,
+    Remote,
+    Unit,
+    VarianDual,
+)
+
+
+class Conn:
+    fail = False
+
+    def write_readline(self, data):
+        if self.fail:
+            raise IOError("timeout")
+        return data
+
+
+class HV(conftest.HV):
+    """Pressure read through the controller connection"""
+
+    high_voltage = HighVoltage.Off
+    failing = ("current",)
+
+    @property
+    def pressure(self):
+        return float(self.ctrl.conn.write_readline(b"1.5e-8"))
+
+
+class Controller(conftest.Controller):
+    interlock_status = InterlockStatus.FrontPanel
+    channel_type = HV
+
+    def __init__(self):
+        self.conn = Instrumented(Conn())
+        super().__init__()
+
+
+def test_instrumented():
+    conn = Instrumented(Conn(), buckets=(1, 2), clock=iter([0, 1.5, 2, 5]).__next__)
+    assert conn.write_readline(b"a") == b"a"
+    conn.conn.fail = True
+    with pytest.raises(IOError):
+        conn.write_readline(b"a")
+    assert conn.total == 2
+    assert conn.errors == 1
+    assert conn.counts == [0, 1, 1]
+    assert conn.latency == 4.5
+    assert conn.fail
+
+
+def test_instrumented_pipeline_and_write():
+    line = loopback.variandual(ack=True)
+    conn = Instrumented(line, buckets=(1, 2), clock=iter([0, 3, 10, 10.5]).__next__)
+    ctrl = VarianDual(conn, ack=False)  # the loopback is in ACK mode already
+    with ctrl.pipeline() as pipeline:
+        pipeline.set("unit", Unit.mbar)
+        pipeline.set("hv1.fixed_step", FixedStep.Step)
+        pipeline.set("remote", Remote.Serial)
+    # one burst of 3 requests (3 s): 1 s each
+    assert conn.total == 3
+    assert conn.latency == 3
+    assert conn.counts == [3, 0, 0]
+    conn.write(b"#0003?\r")
+    conn.flush()
+    assert conn.total == 4
+    assert conn.counts == [4, 0, 0]
+
+
+class ReadlineOnly:
+    """Connection with write_readline only (no pipeline nor write)"""
+
+    def __init__(self, conn):
+        self.write_readline = conn.write_readline
+
+
+def test_instrumented_readline_only():
+    conn = Instrumented(ReadlineOnly(loopback.variandual(ack=True)))
+    assert not hasattr(conn, "pipeline") and not hasattr(conn, "write")
+    ctrl = VarianDual(conn, ack=False)
+    # writes done one by one
+    ctrl.set_many([("unit", Unit.mbar), ("remote", Remote.Serial)])
+    assert ctrl.unit == Unit.mbar
+    assert conn.total == 3
+    assert conn.errors == 0
+
+
+def acquisition():
+    paths = ("hv1.pressure", "hv1.high_voltage", "interlock_status", "hv1.current")
+    ctrls = {"d{}".format(i): Controller() for i in range(3)}
+    return Acquisition(ctrls, paths)
+
+
+def test_render():
+    acq = acquisition()
+    metrics = Metrics(acq)
+    acq.poll()
+    text = metrics.render()
+    assert 'vazio_pressure{controller="d0",channel="hv1"} 1.5e-08' in text
+    assert 'vazio_high_voltage{controller="d2",channel="hv1"} 0.0' in text
+    assert 'vazio_interlock_status{controller="d1"} 2.0' in text
+    # failed read: NaN and error counter
+    assert 'vazio_current{controller="d1",channel="hv1"} NaN' in text
+    assert 'vazio_read_errors_total{controller="d1",path="hv1.current"} 1' in text
+    assert text.count("# TYPE vazio_pressure gauge") == 1
+    assert 'vazio_transactions_total{controller="d0"} 1' in text
+    assert (
+        'vazio_transaction_latency_seconds_bucket{controller="d0",le="+Inf"} 1'
+        in text
+    )
+    assert 'vazio_transaction_latency_seconds_count{controller="d0"} 1' in text
+
+
+def test_render_does_not_read_hardware():
+    acq = acquisition()
+    metrics = Metrics(acq)
+    acq.poll()
+    metrics.render()
+    assert all(ctrl.conn.total == 1 for ctrl in acq.controllers.values())
+
+
+def test_http():
+    acq = acquisition()
+    acq.poll()
+    server = serve(Metrics(acq), port=0)
+    try:
+        with urllib.request.urlopen(server.url) as reply:
+            assert reply.headers["Content-Type"].startswith("text/plain")
+            assert b"vazio_pressure" in reply.read()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(server.url.replace("/metrics", "/other"))
+    finally:
+        server.stop()
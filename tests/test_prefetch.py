@@ -0,0 +1,187 @@
+import threading
+import concurrent.futures
+
+from conftest import Clock
+from vazio.loopback import variandual
+from vazio.prefetch import Prefetcher
+from vazio.protocol.multigauge import Channel
+from vazio.variandual import VarianDual
+
+
+class Line:
+    """
+    Loopback recording every burst. While hold is set, reads wait for
+    release (entered is set when one is waiting)
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.bursts = []
+        self.hold = False
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def _wait(self):
+        if self.hold:
+            self.entered.set()
+            assert self.release.wait(5)
+
+    def write_readline(self, data):
+        if data.endswith(b"?\r"):
+            self._wait()
+        self.bursts.append(1)
+        return self.conn.write_readline(data)
+
+    def pipeline(self, requests):
+        self._wait()
+        self.bursts.append(len(requests))
+        return self.conn.pipeline(requests)
+
+    def write(self, data):
+        self.conn.write(data)
+
+    def flush(self):
+        self.conn.flush()
+
+
+def burst(ctrl, clock, gap=1.0):
+    clock.now += gap
+    values = []
+    for name in ("voltage", "current", "pressure"):
+        clock.now += 0.002
+        values.append(getattr(ctrl.hv1, name))
+    return values
+
+
+def setup(**kwargs):
+    clock = Clock()
+    # the loopback starts in ACK mode: writes are single transactions
+    line = Line(variandual(ack=True))
+    ctrl = VarianDual(line, ack=False)
+    prefetcher = Prefetcher(ctrl, clock=clock, **kwargs)
+    return ctrl, line, clock, prefetcher
+
+
+def test_learns_group_and_prefetches():
+    ctrl, line, clock, prefetcher = setup(support=3)
+    for _ in range(3):
+        burst(ctrl, clock)
+    assert line.bursts == [1] * 9
+    del line.bursts[:]
+    for _ in range(10):
+        voltage, current, pressure = burst(ctrl, clock)
+        assert isinstance(voltage, int) and isinstance(pressure, float)
+    # one pipelined burst of 3 queries per access group
+    assert line.bursts == [3] * 10
+    stats = prefetcher.stats()
+    assert stats["reads"] == 39
+    assert stats["hits"] == stats["prefetched"] == 20
+    assert stats["wasted"] == 0
+    assert prefetcher.hit_rate == 20 / 39
+    assert set(prefetcher.group(("voltage", Channel.HighVoltage1))) == {
+        ("current", Channel.HighVoltage1),
+        ("pressure", Channel.HighVoltage1),
+    }
+
+
+def test_expired_values_are_wasted():
+    ctrl, line, clock, prefetcher = setup(ttl=0.1)
+    for _ in range(4):
+        burst(ctrl, clock)
+    clock.now += 1
+    ctrl.hv1.voltage
+    clock.now += 0.2
+    ctrl.hv1.current
+    assert line.bursts[-2:] == [3, 1]
+    # the 4th burst was already prefetched (and fully used)
+    assert prefetcher.wasted == 2
+    assert prefetcher.waste_rate == 2 / 4
+
+
+def test_write_clears_buffer():
+    ctrl, line, clock, prefetcher = setup()
+    for _ in range(4):
+        burst(ctrl, clock)
+    clock.now += 1
+    ctrl.hv1.voltage
+    assert len(prefetcher.buffer) == 2
+    ctrl.hv1.voltage_max = 6000
+    assert not prefetcher.buffer
+    assert prefetcher.wasted == 2
+    ctrl.hv1.current
+    assert line.bursts[-1] == 1
+
+
+def test_unrelated_reads_are_not_grouped():
+    ctrl, line, clock, prefetcher = setup()
+    for i in range(10):
+        clock.now += 1
+        ctrl.hv1.voltage
+        clock.now += 0.001
+        if i % 2:
+            ctrl.hv2.voltage
+    assert prefetcher.group(("voltage", Channel.HighVoltage1)) == []
+    assert set(line.bursts) == {1}
+    prefetcher.detach()
+    assert ctrl.prefetcher is None
+
+
+def test_bursts_are_tracked_per_thread():
+    ctrl, line, clock, prefetcher = setup()
+    # two clients reading their own groups, interleaved in time
+    clients = [concurrent.futures.ThreadPoolExecutor(1) for _ in range(2)]
+    for _ in range(5):
+        clock.now += 1
+        for name in ("voltage", "current", "pressure"):
+            for client, hv in zip(clients, (ctrl.hv1, ctrl.hv2)):
+                clock.now += 0.002
+                client.submit(getattr, hv, name).result()
+    for client in clients:
+        client.shutdown()
+    for channel in (Channel.HighVoltage1, Channel.HighVoltage2):
+        assert set(prefetcher.group(("voltage", channel))) == {
+            ("current", channel),
+            ("pressure", channel),
+        }
+
+
+def test_line_access_does_not_block_other_threads():
+    ctrl, line, clock, prefetcher = setup()
+    for _ in range(4):
+        burst(ctrl, clock)
+    clock.now += 1
+    ctrl.hv1.voltage
+    hits = prefetcher.hits
+    # a read waiting for the line...
+    line.hold = True
+    with concurrent.futures.ThreadPoolExecutor(1) as client:
+        reading = client.submit(getattr, ctrl.hv2, "voltage")
+        try:
+            assert line.entered.wait(5)
+            # ...does not hold back the reads served from the buffer
+            clock.now += 0.002
+            ctrl.hv1.current
+            assert prefetcher.hits == hits + 1
+        finally:
+            line.release.set()
+        reading.result()
+
+
+def test_write_during_prefetch_discards_values():
+    ctrl, line, clock, prefetcher = setup()
+    for _ in range(4):
+        burst(ctrl, clock)
+    clock.now += 1
+    line.hold = True
+    with concurrent.futures.ThreadPoolExecutor(1) as client:
+        reading = client.submit(getattr, ctrl.hv1, "voltage")
+        try:
+            assert line.entered.wait(5)
+            ctrl.hv1.voltage_max = 6000
+        finally:
+            line.release.set()
+        reading.result()
+    assert line.bursts[-1] == 3
+    # fetched before the write: not kept
+    assert not prefetcher.buffer
+    assert prefetcher.prefetched == 4 and prefetcher.wasted == 2
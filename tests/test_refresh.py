@@ -0,0 +1,109 @@
+import pytest
+
+from conftest import Clock
+from vazio.loopback import variandual
+from vazio.protocol.multigauge import Channel, Command
+from vazio.refresh import AdaptiveAcquisition, RefreshPolicy
+from vazio.simulator.engine.variandual import create_state
+from vazio.variandual import VarianDual
+
+
+QUANTITIES = (
+    "hv1.high_voltage", "hv1.pressure", "hv1.current",
+    "hv2.high_voltage", "hv2.pressure", "hv2.current",
+)
+
+
+@pytest.fixture
+def state():
+    state = create_state()
+    for channel in (Channel.HighVoltage1, Channel.HighVoltage2):
+        state[Command.Pressure][channel] = "1.0E-08"
+        state[Command.Current][channel] = "2.0E-03"
+    state[Command.HighVoltage][Channel.HighVoltage1] = "0"
+    state[Command.HighVoltage][Channel.HighVoltage2] = "1"
+    return state
+
+
+def acquisition(state, baudrate=None, **kwargs):
+    clock = Clock(1000.0)
+    ctrl = VarianDual(variandual(state, baudrate=baudrate, turnaround=0.002))
+    policy = RefreshPolicy(baudrate=baudrate or 9600, **kwargs)
+    return AdaptiveAcquisition({"d": ctrl}, QUANTITIES, policy, clock), clock
+
+
+def run(acq, clock, duration, step=0.01):
+    reads = {}
+    end = clock.now + duration
+    while clock.now < end:
+        for reading in acq.poll():
+            reads[reading.path] = reads.get(reading.path, 0) + 1
+        clock.now += step
+    return reads
+
+
+def test_off_and_flat_channels_slow_down(state):
+    acq, clock = acquisition(state, flat_time=60, base_rate=1, min_rate=0.1)
+    assert len(acq.poll()) == 6
+    rates = acq.rates()
+    assert rates["d", "hv1.pressure"] == 0.1  # off
+    assert rates["d", "hv1.high_voltage"] == 1
+    assert rates["d", "hv2.pressure"] == 1
+    reads = run(acq, clock, 59)
+    assert reads["hv2.pressure"] == pytest.approx(59, abs=1)
+    assert reads["hv1.pressure"] == pytest.approx(6, abs=1)
+    run(acq, clock, 2)
+    # flat for more than flat_time
+    assert acq.rates()["d", "hv2.pressure"] == 0.1
+    assert acq.rates()["d", "hv2.high_voltage"] == 1
+
+
+def test_moving_value_speeds_up(state):
+    acq, clock = acquisition(state, hold=10, max_rate=5)
+    run(acq, clock, 2)
+    state[Command.Pressure][Channel.HighVoltage2] = "5.0E-08"
+    run(acq, clock, 1.1)
+    assert acq.rates()["d", "hv2.pressure"] == 5
+    assert acq.rates()["d", "hv2.current"] == 1
+    reads = run(acq, clock, 5)
+    assert reads["hv2.pressure"] == pytest.approx(25, abs=1)
+    run(acq, clock, 6)
+    assert acq.rates()["d", "hv2.pressure"] == 1
+
+
+def test_hv_state_change_speeds_up_channel(state):
+    acq, clock = acquisition(state, max_rate=5)
+    run(acq, clock, 2)
+    state[Command.HighVoltage][Channel.HighVoltage1] = "1"
+    run(acq, clock, 1.1)
+    rates = acq.rates()
+    assert {rates["d", path] for path in QUANTITIES[:3]} == {5}
+    assert {rates["d", path] for path in QUANTITIES[3:]} == {1}
+
+
+def test_line_budget(state):
+    acq, clock = acquisition(state, baudrate=9600, max_rate=20, utilization=0.5)
+    run(acq, clock, 2)
+    assert acq.load < 0.2
+    state[Command.Pressure][Channel.HighVoltage2] = "5.0E-08"
+    state[Command.HighVoltage][Channel.HighVoltage1] = "1"
+    run(acq, clock, 1.1)
+    assert acq.load == pytest.approx(0.5)
+    rates = acq.rates()
+    assert 0.05 <= rates["d", "hv2.current"] < 1
+    assert rates["d", "hv2.pressure"] > 10 * rates["d", "hv2.current"]
+    bus = acq.controllers["d"].conn.bus
+    busy = bus.busy
+    run(acq, clock, 5, step=0.001)
+    # simulated line time used in 5 s (reply sizes are overestimated)
+    assert 0.4 < (bus.busy - busy) / 5 <= 0.5
+
+
+def test_allocate_floors_over_budget():
+    policy = RefreshPolicy(min_rate=1, utilization=0.5)
+    requested = {"a": 1, "b": 5, "c": 0.5}
+    costs = {"a": 0.2, "b": 0.2, "c": 0.4}
+    rates = policy.allocate(requested, costs)
+    # floors (1, 1, 0.5) need 0.6 of the line: all scaled by 0.5 / 0.6
+    assert rates == pytest.approx({"a": 5 / 6, "b": 5 / 6, "c": 5 / 12})
+    assert sum(rates[key] * costs[key] for key in rates) == pytest.approx(0.5)
@@ -0,0 +1,87 @@
+import math
+import random
+import threading
+import statistics
+
+import pytest
+
+from vazio.acquisition import Reading
+from vazio.rolling import Window, RollingStatistics
+
+
+def test_window_matches_batch():
+    random.seed(1)
+    window = Window(10)
+    samples = []
+    for i in range(500):
+        t, v = i * 0.1, random.uniform(0, 1) + i * 0.01
+        window.add(t, v)
+        samples.append((t, v))
+        samples = [(ts, vs) for ts, vs in samples if ts > t - 10]
+        if i % 37:
+            continue
+        values = [vs for _, vs in samples]
+        stats = window.stats()
+        assert stats.count == len(values)
+        assert stats.min == min(values)
+        assert stats.max == max(values)
+        assert stats.mean == pytest.approx(statistics.mean(values))
+        if len(values) > 1:
+            assert stats.std == pytest.approx(statistics.stdev(values))
+    assert window.stats().rate == pytest.approx(0.1, rel=0.2)
+
+
+def test_window_rate_after_rebase():
+    window = Window(1)
+    for i in range(10000):
+        window.add(1e6 + i * 0.01, 2.0 * i * 0.01)
+    assert window.stats().rate == pytest.approx(2.0)
+    assert window.stats().count in (99, 100)
+
+
+def test_window_capacity():
+    window = Window(100, capacity=10)
+    for i in range(50):
+        window.add(i, i)
+    assert window.stats().count == 10
+    assert window.stats().min == 40
+
+
+def test_rolling_statistics():
+    stats = RollingStatistics(windows=(1, 60))
+    assert math.isnan(stats.stats("d1", "hv1.pressure", 1).mean)
+    for i in range(120):
+        stats.update([
+            Reading("d1", "hv1.pressure", 1e-8 * (i + 1), i),
+            Reading("d1", "hv1.voltage", 5000, i),
+        ])
+    assert stats.stats("d1", "hv1.pressure", 1).count == 1
+    assert stats.stats("d1", "hv1.pressure", 60).count == 60
+    assert stats.stats("d1", "hv1.pressure", 60).max == pytest.approx(1.2e-6)
+    assert ("d1", "hv1.voltage") not in stats.signals
+
+
+def test_rolling_statistics_threads():
+    stats = RollingStatistics(windows=(1,), capacity=50)
+    done = threading.Event()
+    errors = []
+
+    def read():
+        while not done.is_set():
+            try:
+                result = stats.stats("d1", "hv1.pressure", 1)
+                assert result.count == 0 or result.min <= result.mean <= result.max
+            except Exception as error:
+                errors.append(error)
+                break
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    for i in range(20000):
+        stats.update([Reading("d1", "hv1.pressure", float(i % 7), i * 1e-3)])
+    done.set()
+    for thread in readers:
+        thread.join()
+    assert not errors
+    assert stats.stats("d1", "hv1.pressure", 1).count == 50
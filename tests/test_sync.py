@@ -0,0 +1,151 @@
+import threading
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+import conftest  # noqa: E402
+from vazio.simulator.virtual import EPOCH, VirtualClock  # noqa: E402
+from vazio.sync import SyncAcquisition  # noqa: E402
+from vazio.variandual import HighVoltage  # noqa: E402
+
+
+class Line:
+    """
+    Lines read in lockstep: a transaction only completes when `parties`
+    transactions are in progress, and then takes latency of virtual time
+    (the same for all). Counts the lines being read in parallel
+    """
+
+    def __init__(self, parties, latency):
+        self.latency = latency
+        self.now = 0.0
+        self.lock = threading.Lock()
+        self.active = self.max_active = 0
+        self.barrier = threading.Barrier(parties, self._tick, timeout=5)
+
+    def _tick(self):
+        self.now += self.latency
+
+    def clock(self):
+        return self.now
+
+    def transaction(self):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            self.barrier.wait()
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class HV(conftest.HV):
+    """Pressure and high voltage read through the controller line"""
+
+    failing = ("current",)
+
+    @property
+    def pressure(self):
+        self.ctrl.line.transaction()
+        return self.ctrl.pressure
+
+    @property
+    def high_voltage(self):
+        self.ctrl.line.transaction()
+        return HighVoltage.On
+
+
+class Controller(conftest.Controller):
+    channel_type = HV
+
+    def __init__(self, line, pressure):
+        self.line = line
+        self.pressure = pressure
+        super().__init__()
+
+
+class VirtualLine:
+    """Single line: every transaction takes latency of virtual time"""
+
+    def __init__(self, clock, latency):
+        self.clock = clock
+        self.latency = latency
+
+    def transaction(self):
+        self.clock.sleep(self.latency)
+
+
+def test_frame():
+    # the 30 lines only complete a transaction when all are in progress
+    line = Line(30, 0.01)
+    ctrls = {"d{}".format(i): Controller(line, i * 1e-9) for i in range(30)}
+    acq = SyncAcquisition(
+        ctrls, ("hv1.pressure", "hv1.high_voltage", "hv1.current"), workers=30,
+        clock=line.clock,
+    )
+    frames = []
+    acq.subscribe(frames.append)
+    frame = acq.poll()
+    assert frames == [frame]
+    assert frame.values.shape == (30, 3)
+    assert numpy.allclose(frame.column("hv1.pressure"), numpy.arange(30) * 1e-9)
+    assert (frame.column("hv1.high_voltage") == 1).all()
+    assert not frame.valid[:, 2].any() and frame.valid[:, :2].all()
+    assert numpy.isnan(frame.column("hv1.current")).all()
+    assert (frame.sent[:, 0] == 0).all()
+    assert numpy.allclose(frame.latency[:, :2], 0.01)
+    assert (frame.latency[:, 2] == 0).all()
+    assert (frame.sent[:, 1] == frame.received[:, 0]).all()
+    # all lines read in parallel: samples are aligned
+    assert line.max_active == 30
+    assert frame.max_skew == 0
+    assert frame.skew.shape == (3,)
+    acq.close()
+
+
+def test_worker_budget():
+    # the 12 reads only complete in groups of 4 lines
+    line = Line(4, 0.005)
+    ctrls = {"d{}".format(i): Controller(line, 1e-9) for i in range(12)}
+    acq = SyncAcquisition(ctrls, ("hv1.pressure",), workers=4, clock=line.clock)
+    frame = acq.poll()
+    assert line.max_active == 4
+    assert frame.valid.all()
+    assert sorted(frame.received[:, 0]) == pytest.approx(
+        [0.005] * 4 + [0.01] * 4 + [0.015] * 4
+    )
+    acq.close()
+
+
+def run(period, latency, cycles):
+    """Times of the first cycles of a run in virtual time"""
+    clock = VirtualClock()
+    ctrls = {"d1": Controller(VirtualLine(clock, latency), 1e-9)}
+    acq = SyncAcquisition(
+        ctrls, ("hv1.pressure",), period=period, clock=clock.time,
+        sleep=clock.sleep,
+    )
+    times = []
+
+    def listener(frame):
+        times.append(frame.time - EPOCH)
+        if len(times) == cycles:
+            acq.stop()
+
+    acq.subscribe(listener)
+    acq.run()
+    acq.close()
+    assert acq.cycle == cycles
+    assert acq.latest.cycle == cycles - 1
+    return times
+
+
+def test_run():
+    assert run(0.01, 0.001, 10) == pytest.approx([i * 0.01 for i in range(10)])
+
+
+def test_run_overrun_skips_cycles():
+    # a cycle takes 2.5 periods: the next one starts at the following period
+    assert run(0.01, 0.025, 5) == pytest.approx([i * 0.03 for i in range(5)])
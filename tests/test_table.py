@@ -0,0 +1,100 @@
+import pytest
+
+from vazio.controller import Value
+from vazio.protocol import agilent, mks
+from vazio.protocol.table import Param, RW, ProtocolError, ReplyMismatch
+from vazio.protocol.multigauge import Channel, Command, Codec
+from vazio.variandual import TABLE, HV, Gauge, VarianDual, HighVoltage
+
+
+def test_param_codec():
+    param = Param("vmax", Command.VoltageMax, (Channel.HighVoltage1,), int,
+                  (3000, 7000, 100), RW)
+    assert param.decode("5000") == 5000
+    assert param.to_wire(5000) == "5000"
+    with pytest.raises(ValueError):
+        param.to_wire(7100)
+    with pytest.raises(ValueError):
+        param.to_wire(5050)
+
+    ro = Param("v", Command.Voltage, (Channel.HighVoltage1,), int)
+    with pytest.raises(AttributeError):
+        ro.to_wire(10)
+
+
+def test_multigauge_table():
+    assert TABLE.queries()["pressure", Channel.HighVoltage1] == b"#102?\r"
+    assert TABLE.queries()["remote", Channel.NoChannel] == b"#010?\r"
+    assert TABLE.request("high_voltage", Channel.HighVoltage2, HighVoltage.On) == (
+        b"#2301\r"
+    )
+    param, channel = TABLE.dispatch[b"402"]
+    assert param.name == "pressure"
+    assert channel == Channel.Gauge2
+    # each (channel, command) pair is described only once
+    assert len(TABLE.dispatch) == len(TABLE.entries)
+
+
+def test_generated_descriptors():
+    assert isinstance(HV.__dict__["voltage"], Value)
+    assert "high_voltage" in HV.__dict__
+    assert "high_voltage" not in Gauge.__dict__
+    assert "pressure" in Gauge.__dict__
+    assert "remote" in VarianDual.__dict__
+    assert "voltage" not in VarianDual.__dict__
+
+
+def test_multigauge_errors():
+    assert Codec.data(b">1300\r") == "0"
+    with pytest.raises(ProtocolError) as error:
+        Codec.data(b">300!3\r")
+    assert error.value.code == "3"
+
+
+def test_multigauge_reply_mismatch():
+    query = b"#102?\r"
+    assert Codec.data(b">1021.0E-08\r", query) == "1.0E-08"
+    with pytest.raises(ProtocolError):
+        Codec.data(b">100!3\r", query)
+    for reply in (b">1075000\r", b">2021.0E-08\r", b"\x06\r", b">200!3\r"):
+        with pytest.raises(ReplyMismatch):
+            Codec.data(reply, query)
+    write = b"#2301\r"
+    assert Codec.data(b"\x06\r", write) == ""
+    with pytest.raises(ReplyMismatch):
+        Codec.data(b">1021.0E-08\r", write)
+
+
+def test_agilent_codec():
+    codec = agilent.Codec(2)
+    query = agilent.TABLE.queries(codec)["pressure", 3]
+    addr, wnd, cmd, data = agilent.decode_message(query)
+    assert (addr, wnd, cmd, data) == (2, agilent.Window.P3, agilent.Command.READ, b"")
+    assert codec.split(query) == (b"832", None)
+    write = agilent.TABLE.request("high_voltage", 1, True, codec)
+    assert codec.split(write) == (b"011", "1")
+    reply = codec.reply(b"832", " 5.3E-07")
+    assert agilent.TABLE["pressure", 3].decode(codec.data(reply)) == 5.3e-7
+    assert codec.data(codec.error(None, agilent.ACK)) == ""
+    with pytest.raises(ProtocolError):
+        codec.data(codec.error(None, agilent.NACK))
+    # replies checked against their request
+    assert codec.data(reply, query) == " 5.3E-07"
+    assert codec.data(codec.error(None, agilent.ACK), write) == ""
+    other = agilent.TABLE.queries(codec)["pressure", 1]
+    ack = codec.error(None, agilent.ACK)
+    for request, answer in ((other, reply), (write, reply), (query, ack)):
+        with pytest.raises(ReplyMismatch):
+            codec.data(answer, request)
+    with pytest.raises(ReplyMismatch):
+        codec.data(reply, agilent.Codec(1).query(b"832"))
+
+
+def test_mks_codec():
+    codec = mks.Codec()
+    assert mks.TABLE.queries(codec)["pressure", 2] == b"P2\r"
+    assert mks.TABLE.request("relay_set_point", 1, 1e-5, codec) == b"RLY1=1.0E-05\r"
+    assert codec.split(b"RLY1=1.0E-05\r") == (b"RLY1", "1.0E-05")
+    assert mks.Codec(5).query(b"P1") == b"$\x05P1\r"
+    with pytest.raises(ProtocolError):
+        codec.data(b"PROTECT!\r")
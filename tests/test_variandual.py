@@ -1,6 +1,9 @@
 import pytest
 
-from vazio.protocol.multigauge import HEADER_REQ, ACK, Command, Channel, encode_reply
+from vazio.controller import WriteErrors
+from vazio.loopback import variandual
+from vazio.protocol.multigauge import Command, Channel, ChannelOn, SerialConfigOnly
+from vazio.simulator.engine.variandual import create_state
 from vazio.variandual import (
     VarianDual,
     Remote,
@@ -8,107 +11,55 @@ from vazio.variandual import (
     Unit,
     FixedStep,
     InterlockStatus,
+    SerialProperty,
 )
 
 
-class Connection:
-
-    remote = "0"
-    ctrl_firmware_version = "VPo 1 0 24/04/98"
-    dsp_firmware_version = "VPd 1 0 24/04/98"
-    serial_config = "0"
-    interlock_status = "\x00"
-    hv1 = "0"
-    hv2 = "1"
-    unit = "0"
-    hv1_voltage = "14"
-    hv2_voltage = "15"
-
-    hv1_fixed_step = "0"
-    hv2_fixed_step = "1"
-
-    def write_readline(self, data):
-        assert type(data) == bytes
-        data = data.decode()
-        assert data[0] == HEADER_REQ
-        assert data[-1] == "\r"
-        channel, cmd = Channel(data[1]), Command(data[2:4])
-        if data[-2] == "?":
-            if cmd == Command.Remote:
-                assert channel == Channel.NoChannel
-                data = self.remote
-            elif cmd == Command.Unit:
-                assert channel == Channel.NoChannel
-                data = self.unit
-            elif cmd == Command.MicroControllerFirmwareVersion:
-                assert channel == Channel.NoChannel
-                data = self.ctrl_firmware_version
-            elif cmd == Command.DSPFirmwareVersion:
-                assert channel == Channel.NoChannel
-                data = self.dsp_firmware_version
-            elif cmd == Command.SerialConfig:
-                assert channel == Channel.NoChannel
-                data = self.serial_config
-            elif cmd == Command.InterlockStatus:
-                assert channel == Channel.NoChannel
-                data = self.interlock_status
-
-            elif cmd == Command.Voltage:
-                if channel == Channel.HighVoltage1:
-                    data = self.hv1_voltage
-                elif channel == Channel.HighVoltage2:
-                    data = self.hv2_voltage
-            elif cmd == Command.HighVoltage:
-                if channel == Channel.HighVoltage1:
-                    data = self.hv1
-                elif channel == Channel.HighVoltage2:
-                    data = self.hv2
-            elif cmd == Command.FixedStep:
-                if channel == Channel.HighVoltage1:
-                    data = self.hv1_fixed_step
-                elif channel == Channel.HighVoltage2:
-                    data = self.hv2_fixed_step
-            return encode_reply(channel, cmd, data)
-        else:
-            if cmd == Command.Remote:
-                assert channel == Channel.NoChannel
-                self.remote = data[-2]
-            elif cmd == Command.Unit:
-                assert channel == Channel.NoChannel
-                self.unit = data[-2]
-            elif cmd == Command.SerialConfig:
-                assert channel == Channel.NoChannel
-                self.serial_config = data[-2]
-
-            elif cmd == Command.HighVoltage:
-                if channel == Channel.HighVoltage1:
-                    self.hv1 = data[-2]
-                elif channel == Channel.HighVoltage2:
-                    self.hv2 = data[-2]
-            return (ACK + "\r").encode()
-
-
-def test_variandual():
-    conn = Connection()
+NO_CHANNEL = Channel.NoChannel
+HV1, HV2 = Channel.HighVoltage1, Channel.HighVoltage2
 
-    ctrl = VarianDual(conn)
+
+@pytest.fixture
+def state():
+    state = create_state()
+    state[Command.Voltage][HV1] = "14"
+    state[Command.Voltage][HV2] = "15"
+    return state
+
+
+def connection(state, **kwargs):
+    """Simulated line which records the size of every pipeline burst"""
+    conn = variandual(state, **kwargs)
+    conn.bursts = []
+    pipeline = conn.pipeline
+
+    def burst(requests):
+        conn.bursts.append(len(requests))
+        return pipeline(requests)
+
+    conn.pipeline = burst
+    return conn
+
+
+def test_variandual(state):
+    ctrl = VarianDual(connection(state))
 
     assert ctrl.remote == Remote.Local
 
     ctrl.remote = Remote.Remote
 
     assert ctrl.remote == Remote.Remote
-    assert conn.remote == "1"
+    assert state[Command.Remote][NO_CHANNEL] == "1"
 
-    assert ctrl.ctrl_firmware_version == conn.ctrl_firmware_version
-    assert ctrl.dsp_firmware_version == conn.dsp_firmware_version
+    assert ctrl.ctrl_firmware_version == "VPo 1 0 24/04/98"
+    assert ctrl.dsp_firmware_version == "VPd 1 0 24/04/98"
 
     assert ctrl.hv1.high_voltage == HighVoltage.Off
     assert ctrl.hv2.high_voltage == HighVoltage.On
 
     ctrl.hv1.high_voltage = HighVoltage.On
     assert ctrl.hv1.high_voltage == HighVoltage.On
-    assert conn.hv1 == "1"
+    assert state[Command.HighVoltage][HV1] == "1"
 
     assert ctrl.hv1.voltage == 14
     assert ctrl.hv2.voltage == 15
@@ -122,7 +73,7 @@ def test_variandual():
     assert ctrl.unit == Unit.torr
     ctrl.unit = Unit.mbar
     assert ctrl.unit == Unit.mbar
-    assert conn.unit == "1"
+    assert state[Command.Unit][NO_CHANNEL] == "1"
 
     assert ctrl.hv1.fixed_step == FixedStep.Fixed
     assert ctrl.hv2.fixed_step == FixedStep.Step
@@ -130,8 +81,98 @@ def test_variandual():
     assert ctrl.serial_config is False
     ctrl.serial_config = True
     assert ctrl.serial_config is True
-    assert conn.serial_config == "1"
+    assert state[Command.SerialConfig][NO_CHANNEL] == "1"
 
     assert not ctrl.interlock_status
-    conn.interlock_status = chr(128)
+    state[Command.InterlockStatus][NO_CHANNEL] = chr(128)
     assert ctrl.interlock_status == InterlockStatus.HV2Cable
+
+
+def test_on(state):
+    ctrl = VarianDual(connection(state))
+    ctrl.on(timeout=1)
+    assert state[Command.HighVoltage][HV1] == state[Command.HighVoltage][HV2] == "1"
+    assert ctrl.hv1.high_voltage == HighVoltage.On
+
+
+def test_on_timeout(state):
+    conn = connection(state)
+    write_readline = conn.write_readline
+
+    def interlocked(request):
+        # the controller acknowledges but the HV stays off
+        reply = write_readline(request)
+        state[Command.HighVoltage][HV1] = "-3"
+        return reply
+
+    conn.write_readline = interlocked
+    ctrl = VarianDual(conn)
+    with pytest.raises(TimeoutError, match="hv1"):
+        ctrl.on(timeout=0.05, period=0.01)
+
+
+def test_configure_restore(state):
+    ctrl = VarianDual(connection(state))
+    ctrl.configure(unit=Unit.mbar)
+    assert state[Command.Unit][NO_CHANNEL] == "1"
+    state[Command.Unit][NO_CHANNEL] = "0"
+    ctrl.restore()
+    assert state[Command.Unit][NO_CHANNEL] == "1"
+
+
+def test_enable_ack(state):
+    ctrl = VarianDual(connection(state), ack=False)
+    # not in ACK mode: writes are not answered
+    with pytest.raises(TimeoutError):
+        ctrl.unit = Unit.mbar
+    prop = ctrl.enable_ack()
+    assert prop == SerialProperty.AckNack
+    assert state[Command.SerialProperty][NO_CHANNEL] == "00000100"
+    assert state[Command.SerialConfig][NO_CHANNEL] == "0"
+    ctrl.unit = Unit.pascal
+    assert state[Command.Unit][NO_CHANNEL] == "2"
+    # already enabled: nothing is written
+    state[Command.SerialConfig][NO_CHANNEL] = "1"
+    assert ctrl.enable_ack() == SerialProperty.AckNack
+    assert state[Command.SerialConfig][NO_CHANNEL] == "1"
+
+
+def test_serial_property_needs_serial_config(state):
+    ctrl = VarianDual(connection(state, ack=True))
+    with pytest.raises(SerialConfigOnly):
+        ctrl.serial_property = SerialProperty.AckNack
+
+
+def test_pipeline(state):
+    conn = connection(state, ack=True)
+    ctrl = VarianDual(conn)
+    with ctrl.pipeline() as pipeline:
+        unit = pipeline.set("unit", Unit.pascal)
+        step = pipeline.set("hv1.fixed_step", FixedStep.Step)
+    assert conn.bursts == [2]
+    assert unit.result() is None and step.result() is None
+    assert state[Command.Unit][NO_CHANNEL] == "2"
+    assert state[Command.FixedStep][HV1] == "1"
+    # hv2 is on: the fixed step write (only) fails
+    with pytest.raises(WriteErrors) as error:
+        ctrl.set_many(
+            [("remote", Remote.Remote), ("hv2.fixed_step", FixedStep.Fixed),
+             ("unit", Unit.mbar)]
+        )
+    (path, value, exc), = error.value.errors
+    assert (path, value) == ("hv2.fixed_step", FixedStep.Fixed)
+    assert isinstance(exc, ChannelOn)
+    assert exc.code == "8"
+    assert state[Command.Remote][NO_CHANNEL] == "1"
+    assert state[Command.Unit][NO_CHANNEL] == "1"
+    assert conn.bursts == [2, 3]
+
+
+def test_pipeline_validates_before_sending(state):
+    conn = connection(state)
+    ctrl = VarianDual(conn)
+    with pytest.raises(AttributeError):
+        with ctrl.pipeline() as pipeline:
+            pipeline.set("unit", Unit.mbar)
+            pipeline.set("hv1.voltage", 5000)
+    assert conn.bursts == []
@@ -0,0 +1,86 @@
+import pytest
+
+from vazio.acquisition import Acquisition
+from vazio.loopback import variandual
+from vazio.protocol.multigauge import Channel, Command
+from vazio.refresh import AdaptiveAcquisition, RefreshPolicy
+from vazio.simulator.engine.variandual import create_state
+from vazio.simulator.virtual import Scheduler, VacuumModel, VirtualClock
+from vazio.variandual import VarianDual
+
+
+QUANTITIES = ("hv1.pressure", "hv1.current", "hv1.voltage", "hv2.pressure")
+
+
+def simulation(seed=1, hv1="1"):
+    clock = VirtualClock()
+    state = VacuumModel(clock, seed=seed).install(create_state())
+    state[Command.HighVoltage][Channel.HighVoltage1] = hv1
+    conn = variandual(
+        state, baudrate=9600, realtime=True, clock=clock.monotonic, sleep=clock.sleep
+    )
+    return clock, VarianDual(conn)
+
+
+def soak(duration, seed=1, period=1.0):
+    clock, ctrl = simulation(seed)
+    acquisition = Acquisition({"d": ctrl}, QUANTITIES, period, clock=clock.time)
+    readings = []
+    acquisition.subscribe(readings.extend)
+    scheduler = Scheduler(clock)
+    scheduler.add(acquisition)
+    return scheduler.run(duration), readings, clock, ctrl
+
+
+def test_hours_in_seconds():
+    stats, readings, clock, ctrl = soak(4 * 3600)
+    assert stats.simulated == pytest.approx(4 * 3600, abs=1)
+    assert stats.events == 4 * 3600 + 1
+    assert stats.speedup > 100
+    assert len(readings) == 4 * len(QUANTITIES) * 3600 + len(QUANTITIES)
+    assert all(r.valid for r in readings)
+    pressures = [r.value for r in readings if r.path == "hv1.pressure"]
+    # pump-down
+    assert pressures[0] > 5e-6
+    assert pressures[-1] < pressures[0] / 30
+    # the line time is spent in virtual time
+    first = readings[: len(QUANTITIES)]
+    assert 0.01 < first[1].timestamp - first[0].timestamp < 0.03
+    assert ctrl.conn.bus.occupancy == pytest.approx(len(QUANTITIES) * 0.0175, rel=0.2)
+
+
+def test_deterministic():
+    _, one, _, _ = soak(600, seed=3)
+    _, two, _, _ = soak(600, seed=3)
+    _, other, _, _ = soak(600, seed=4)
+    assert one == two
+    assert [r.value for r in one] != [r.value for r in other]
+
+
+def test_off_channel():
+    clock, ctrl = simulation(hv1="0")
+    assert ctrl.hv1.current == 0
+    assert ctrl.hv1.voltage == 0
+    assert ctrl.hv2.voltage > 3000
+
+
+def test_memory_growth():
+    clock, ctrl = simulation()
+    acquisition = Acquisition({"d": ctrl}, QUANTITIES, 1.0, clock=clock.time)
+    scheduler = Scheduler(clock)
+    scheduler.add(acquisition)
+    scheduler.run(60)
+    stats = scheduler.run(1800, memory=True)
+    # latest values only: no growth with the run length
+    assert stats.memory < 100000
+
+
+def test_adaptive_acquisition():
+    clock, ctrl = simulation()
+    policy = RefreshPolicy(flat_time=600, tolerance=0.5, max_rate=5, min_rate=0.1)
+    acquisition = AdaptiveAcquisition({"d": ctrl}, QUANTITIES, policy, clock.time)
+    scheduler = Scheduler(clock)
+    scheduler.add(acquisition)
+    scheduler.run(4 * 3600)
+    assert acquisition.rates()["d", "hv1.voltage"] == 0.1
+    assert ctrl.conn.bus.transactions < 4 * 3600 * len(QUANTITIES) / 2
@@ -0,0 +1,116 @@
+"""
+Acquisition
+
+Periodically reads a set of quantities from one or more controllers and
+keeps the latest reading of each one in memory. Consumers either look at
+`Acquisition.latest` or subscribe to receive every batch of new readings.
+
+Quantities are given as attribute paths relative to the controller
+(ex: "hv1.pressure", "interlock_status").
+"""
+
+import time
+import logging
+import operator
+import threading
+import collections
+
+
+class Reading(
+    collections.namedtuple("Reading", "controller path value timestamp error")
+):
+    """A single acquired value. error is the exception of a failed read"""
+
+    __slots__ = ()
+
+    def __new__(cls, controller, path, value, timestamp, error=None):
+        return super().__new__(cls, controller, path, value, timestamp, error)
+
+    @property
+    def valid(self):
+        return self.error is None
+
+
+def split_path(path):
+    """'hv1.pressure' -> ('hv1', 'pressure'); 'unit' -> ('', 'unit')"""
+    channel, _, quantity = path.rpartition(".")
+    return channel, quantity
+
+
+class Acquisition:
+    """
+    controllers: {name: controller}
+    quantities: sequence of attribute paths read on every controller
+    period: time (s) between polls when running in the background
+    """
+
+    def __init__(self, controllers, quantities, period=1.0, clock=time.time):
+        self.controllers = dict(controllers)
+        self.quantities = tuple(quantities)
+        self.period = period
+        self.clock = clock
+        self.latest = {}
+        self.listeners = []
+        self._getters = {path: operator.attrgetter(path) for path in self.quantities}
+        self._thread = None
+        self._stop = threading.Event()
+        self._log = logging.getLogger(type(self).__name__)
+
+    def subscribe(self, callback):
+        """callback(readings) is called with every new batch of readings"""
+        self.listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        self.listeners.remove(callback)
+
+    def get(self, controller, path):
+        return self.latest.get((controller, path))
+
+    def read(self, controller, path):
+        ctrl = self.controllers[controller]
+        try:
+            value = self._getters[path](ctrl)
+            error = None
+        except Exception as err:
+            previous = self.latest.get((controller, path))
+            value = None if previous is None else previous.value
+            error = err
+        return Reading(controller, path, value, self.clock(), error)
+
+    def publish(self, readings):
+        """Stores readings as the latest values and notifies listeners"""
+        latest = self.latest
+        for reading in readings:
+            latest[reading.controller, reading.path] = reading
+        for listener in self.listeners:
+            try:
+                listener(readings)
+            except Exception:
+                self._log.exception("error in acquisition listener %r", listener)
+
+    def poll(self):
+        """Reads every quantity of every controller once"""
+        readings = [
+            self.read(controller, path)
+            for controller in self.controllers
+            for path in self.quantities
+        ]
+        self.publish(readings)
+        return readings
+
+    def run(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            self.poll()
+            self._stop.wait(max(0, self.period - (time.monotonic() - start)))
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
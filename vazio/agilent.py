@@ -0,0 +1,29 @@
+from vazio.controller import BaseChannel, Controller
+from vazio.protocol.agilent import TABLE, CONTROLLER, CHANNELS, Codec
+
+
+class HV(BaseChannel):
+
+    table = TABLE
+    channels = CHANNELS
+
+
+class Agilent4UHV(Controller):
+    """
+    Agilent 4UHV ion pump controller
+
+    conn: any object with write_readline (replies end with ETX+CRC)
+    address: RS485 device number (0 for RS232)
+    """
+
+    table = TABLE
+    channel = CONTROLLER
+
+    hv1 = HV(1)
+    hv2 = HV(2)
+    hv3 = HV(3)
+    hv4 = HV(4)
+
+    def __init__(self, conn, address=0):
+        self.codec = Codec(address)
+        super().__init__(conn)
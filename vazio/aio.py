@@ -0,0 +1,279 @@
+"""
+asyncio support
+
+Non-blocking connections and controllers. The descriptors of an asyncio
+controller return awaitables:
+
+    conn = await open_connection("tcp://moxa:4001")
+    ctrl = AsyncVarianDual(conn)
+    pressure = await ctrl.hv1.pressure
+    await ctrl.hv1.set("high_voltage", HighVoltage.On)
+    await ctrl.configure(unit=Unit.mbar)
+
+Attribute assignment (``ctrl.unit = ...``) cannot be awaited and raises
+TypeError: use set(), set_many() or an ``async with ctrl.pipeline()``.
+
+Serial lines (``serial:///dev/ttyS0``) need pyserial-asyncio.
+"""
+
+import asyncio
+import urllib.parse
+
+from .controller import Controller, Pipeline
+from .protocol.table import ReplyMismatch
+from .variandual import VarianDual, HighVoltage, SerialProperty
+
+
+class AsyncConnection:
+    """
+    Request/reply connection on top of an asyncio (reader, writer) pair.
+    Transactions are serialized; each one must complete within timeout (s).
+    After a timeout the replies still to come belong to the failed request:
+    the pending input is discarded before the next request
+    """
+
+    def __init__(self, reader, writer, eol=b"\r", timeout=1.0):
+        self.reader = reader
+        self.writer = writer
+        self.eol = eol
+        self.timeout = timeout
+        self._stale = False
+        self._lock = asyncio.Lock()
+
+    async def _discard(self, quiet):
+        while True:
+            try:
+                data = await asyncio.wait_for(self.reader.read(4096), quiet)
+            except asyncio.TimeoutError:
+                break
+            if not data:
+                break
+        self._stale = False
+
+    async def _send(self, data):
+        if self._stale:
+            await self._discard(0.01)
+        self.writer.write(data)
+        await self.writer.drain()
+
+    async def _wait(self, coro, timeout):
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            self._stale = True
+            raise
+
+    async def _transaction(self, data):
+        await self._send(data)
+        return await self.reader.readuntil(self.eol)
+
+    async def write_readline(self, data):
+        async with self._lock:
+            return await self._wait(self._transaction(data), self.timeout)
+
+    async def _burst(self, requests):
+        await self._send(b"".join(requests))
+        return [await self.reader.readuntil(self.eol) for _ in requests]
+
+    async def pipeline(self, requests):
+        """
+        Sends all requests back to back and then reads one reply per
+        request (replies come in the same order)
+        """
+        async with self._lock:
+            timeout = self.timeout * len(requests)
+            return await self._wait(self._burst(requests), timeout)
+
+    async def write(self, data):
+        """Sends data without waiting for a reply"""
+        async with self._lock:
+            await self._wait(self._send(data), self.timeout)
+
+    async def flush(self, quiet=0.01):
+        """Discards any pending input (until nothing arrives for quiet s)"""
+        async with self._lock:
+            await self._discard(quiet)
+
+    def close(self):
+        self.writer.close()
+
+
+async def open_connection(url, eol=b"\r", timeout=1.0, **kwargs):
+    """
+    Opens an AsyncConnection. url: tcp://host:port or serial://<port>
+    (a plain device path is considered a serial port)
+    """
+    if "://" not in url:
+        url = "serial://" + url
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme == "tcp":
+        reader, writer = await asyncio.open_connection(
+            parsed.hostname, parsed.port, **kwargs
+        )
+    elif parsed.scheme == "serial":
+        import serial_asyncio
+
+        reader, writer = await serial_asyncio.open_serial_connection(
+            url=parsed.netloc + parsed.path, **kwargs
+        )
+    else:
+        raise ValueError("unsupported url {!r}".format(url))
+    return AsyncConnection(reader, writer, eol=eol, timeout=timeout)
+
+
+class AsyncPipeline(Pipeline):
+    """`vazio.controller.Pipeline` of an asyncio controller (async with)"""
+
+    async def flush(self):
+        """Sends pending writes and matches replies. Returns their futures"""
+        pending = self._take()
+        if not pending:
+            return []
+        try:
+            replies = await self._send([request for request, _ in pending])
+        except Exception as error:
+            return self._resolve(pending, error=error)
+        futures = self._resolve(pending, replies)
+        if self._mismatch(futures):
+            await self.ctrl._resync()
+        return futures
+
+    async def _send(self, requests):
+        await self.ctrl._prepare_write()
+        conn = self.ctrl.conn
+        pipeline = getattr(conn, "pipeline", None)
+        if pipeline is None:
+            return [await conn.write_readline(request) for request in requests]
+        return await pipeline(requests)
+
+    def __enter__(self):
+        raise TypeError("use 'async with' on an asyncio controller pipeline")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        if exc_type is not None:
+            # nothing is sent if the block fails
+            self.pending = []
+            return
+        self._check(await self.flush())
+
+
+class AsyncController(Controller):
+    """Controller whose reads and writes are coroutines"""
+
+    asynchronous = True
+
+    def pipeline(self):
+        return AsyncPipeline(self)
+
+    async def set_many(self, values):
+        """
+        Writes several values in a single burst.
+        values: sequence of (path, value) or dict {path: value}
+        """
+        if isinstance(values, dict):
+            values = values.items()
+        async with self.pipeline() as pipeline:
+            for path, value in values:
+                pipeline.set(path, value)
+
+    async def configure(self, **config):
+        """Writes controller parameters and remembers them (see restore)"""
+        self.config.update(config)
+        await self.set_many(config)
+
+    async def restore(self):
+        """Writes the remembered configuration again (ex: after a reconnection)"""
+        await self.set_many(self.config)
+
+    async def _data(self, reply, request):
+        try:
+            return self.codec.data(reply, request)
+        except ReplyMismatch:
+            await self._resync()
+            raise
+
+    async def _resync(self):
+        flush = getattr(self.conn, "flush", None)
+        if flush is not None:
+            await flush()
+
+    async def _read(self, name, channel):
+        request = self._queries[name, channel]
+        reply = await self.conn.write_readline(request)
+        return self.table[name, channel].decode(await self._data(reply, request))
+
+    async def _prepare_write(self):
+        """Called before every write (ex: to set the reply mode up)"""
+
+    async def _write(self, name, channel, value):
+        request = self.table.request(name, channel, value, self.codec)
+        await self._prepare_write()
+        await self._data(await self.conn.write_readline(request), request)
+
+    async def _execute(self, name, channel):
+        request = self._queries[name, channel]
+        return await self._data(await self.conn.write_readline(request), request)
+
+
+class AsyncVarianDual(AsyncController, VarianDual):
+    """VarianDual controller with asyncio I/O"""
+
+    async def enable_ack(self, settle=0.05):
+        """
+        Switches the controller to ACK reply mode (see
+        `vazio.variandual.VarianDual.enable_ack`). Returns the serial property
+        """
+        # cleared first: the writes below go through _prepare_write too
+        self.ack_pending = False
+        prop = await self.serial_property
+        if SerialProperty.AckNack in prop:
+            return prop
+        # serial property can only be written in serial configuration mode
+        request = self.table.request
+        await self.conn.write(request("serial_config", self.channel, True, self.codec))
+        prop |= SerialProperty.AckNack
+        await self.conn.write(
+            request("serial_property", self.channel, prop, self.codec)
+        )
+        await asyncio.sleep(settle)
+        await self.conn.flush()
+        await self.set("serial_config", False)
+        return await self.serial_property
+
+    async def _prepare_write(self):
+        if self.ack_pending:
+            try:
+                await self.enable_ack()
+            except BaseException:
+                self.ack_pending = True
+                raise
+
+    async def restore(self):
+        """Enables ACK reply mode and writes the remembered configuration"""
+        await self.enable_ack()
+        await super().restore()
+
+    async def on(self, names=("hv1", "hv2"), timeout=10.0, period=0.1):
+        """
+        Switches on the high voltage of the given channels (attribute names)
+        and waits until all of them report it is on
+        """
+        for name in names:
+            await getattr(self, name).set("high_voltage", HighVoltage.On)
+
+        async def wait_on():
+            pending = list(names)
+            while pending:
+                states = [await getattr(self, name).high_voltage for name in pending]
+                pending = [
+                    name
+                    for name, state in zip(pending, states)
+                    if int(state.value) <= 0
+                ]
+                if pending:
+                    await asyncio.sleep(period)
+
+        await asyncio.wait_for(wait_on(), timeout)
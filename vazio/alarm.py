@@ -0,0 +1,238 @@
+"""
+Local alarm evaluation
+
+The alarm engine keeps, for every monitored (controller, channel) row, the
+latest acquired values in a NumPy matrix (one column per quantity) fed by
+an `vazio.acquisition.Acquisition`. Rules are evaluated on whole columns at
+once, so the cost of an evaluation does not depend on serial polling.
+
+Only when a rule fires (or clears) for a row is the hardware asked to
+confirm it (see `Rule.confirm`). Confirmed transitions are sent to the
+engine listeners as `Alarm` events.
+
+Requires numpy.
+"""
+
+import enum
+import logging
+import collections
+
+import numpy
+
+from .acquisition import split_path
+from .variandual import HighVoltage, error_message
+
+
+Alarm = collections.namedtuple("Alarm", "rule controller channel active message")
+
+
+def _number(value):
+    if isinstance(value, enum.Enum):
+        value = value.value
+    return float(value)
+
+
+class Rule:
+    """
+    Base rule. Subclasses declare the `quantities` they need and implement
+    `evaluate(engine, active)` returning a boolean array (one per row)
+    """
+
+    quantities = ()
+
+    def __init__(self, name=None):
+        self.name = type(self).__name__ if name is None else name
+
+    def evaluate(self, engine, active):
+        raise NotImplementedError
+
+    def confirm(self, channel):
+        """Confirm the rule on the hardware channel object (default: trust cache)"""
+        return True
+
+    def message(self, engine, row):
+        return self.name
+
+
+class SetPoint(Rule):
+    """
+    Pressure above a set point. Once active, the alarm only clears when the
+    pressure goes below set_point * (1 - hysteresis)
+    """
+
+    def __init__(self, set_point="set_point1", hysteresis=0.1, name=None):
+        super().__init__(set_point if name is None else name)
+        self.set_point = set_point
+        self.hysteresis = hysteresis
+        self.quantities = ("pressure", set_point)
+
+    def evaluate(self, engine, active):
+        pressure = engine.column("pressure")
+        limit = engine.column(self.set_point)
+        limit = numpy.where(active, limit * (1 - self.hysteresis), limit)
+        return pressure > limit
+
+    def confirm(self, channel):
+        return channel.pressure > getattr(channel, self.set_point)
+
+    def message(self, engine, row):
+        return "pressure {:.2E} above {} {:.2E}".format(
+            engine.values[row, engine.columns["pressure"]],
+            self.set_point,
+            engine.values[row, engine.columns[self.set_point]],
+        )
+
+
+class HighVoltageOff(Rule):
+    """
+    HV is off on a channel where it is expected to be on
+
+    expected: collection of (controller, channel) which should be on
+              (None means all rows)
+    """
+
+    quantities = ("high_voltage",)
+
+    def __init__(self, expected=None, name=None):
+        super().__init__(name)
+        self.expected = expected
+
+    def evaluate(self, engine, active):
+        state = engine.column("high_voltage")
+        off = state <= 0
+        if self.expected is not None:
+            off &= engine.mask(self.expected)
+        return off
+
+    def confirm(self, channel):
+        return int(channel.high_voltage.value) <= 0
+
+    def message(self, engine, row):
+        state = engine.values[row, engine.columns["high_voltage"]]
+        return "high voltage is {}".format(HighVoltage(str(int(state))).name)
+
+
+class ControllerError(Rule):
+    """Channel reports a non zero error_status"""
+
+    quantities = ("error_status",)
+
+    def evaluate(self, engine, active):
+        return engine.column("error_status") > 0
+
+    def confirm(self, channel):
+        return channel.error_status > 0
+
+    def message(self, engine, row):
+        code = engine.values[row, engine.columns["error_status"]]
+        return error_message(engine.channel(row).channel, int(code))
+
+
+class AlarmEngine:
+    """
+    acquisition: `vazio.acquisition.Acquisition` providing the readings
+    rules: sequence of `Rule`
+    channels: channel attribute names monitored on every controller
+    """
+
+    def __init__(self, acquisition, rules, channels=("hv1", "hv2")):
+        self.acquisition = acquisition
+        self.rules = tuple(rules)
+        self.rows = [
+            (controller, channel)
+            for controller in acquisition.controllers
+            for channel in channels
+        ]
+        self.row_index = {row: i for i, row in enumerate(self.rows)}
+        names = []
+        for rule in self.rules:
+            names.extend(q for q in rule.quantities if q not in names)
+        self.columns = {name: i for i, name in enumerate(names)}
+        self.values = numpy.full((len(self.rows), len(names)), numpy.nan)
+        self.active = numpy.zeros((len(self.rules), len(self.rows)), dtype=bool)
+        # fired in cache but not confirmed by hardware: wait until it clears
+        self.suppressed = numpy.zeros_like(self.active)
+        self.listeners = []
+        self._log = logging.getLogger(type(self).__name__)
+        acquisition.subscribe(self.update)
+
+    @property
+    def paths(self):
+        """Attribute paths the acquisition must read for this engine"""
+        channels = sorted({channel for _, channel in self.rows})
+        return ["{}.{}".format(ch, q) for ch in channels for q in self.columns]
+
+    def subscribe(self, callback):
+        """callback(alarm) is called for every confirmed alarm transition"""
+        self.listeners.append(callback)
+
+    def channel(self, row):
+        """Hardware channel object of a row"""
+        controller, channel = self.rows[row]
+        return getattr(self.acquisition.controllers[controller], channel)
+
+    def column(self, name):
+        return self.values[:, self.columns[name]]
+
+    def mask(self, rows):
+        mask = numpy.zeros(len(self.rows), dtype=bool)
+        mask[[self.row_index[row] for row in rows if row in self.row_index]] = True
+        return mask
+
+    def update(self, readings):
+        """Acquisition listener: stores readings and evaluates the rules"""
+        values, row_index, columns = self.values, self.row_index, self.columns
+        for reading in readings:
+            # a failed read keeps the last good value: a timeout must not
+            # clear (or raise) an alarm
+            if not reading.valid:
+                continue
+            channel, quantity = split_path(reading.path)
+            row = row_index.get((reading.controller, channel))
+            col = columns.get(quantity)
+            if row is None or col is None:
+                continue
+            values[row, col] = _number(reading.value)
+        return self.evaluate()
+
+    def evaluate(self):
+        """Evaluates all rules; returns the list of confirmed transitions"""
+        alarms = []
+        with numpy.errstate(invalid="ignore"):
+            for i, rule in enumerate(self.rules):
+                active, suppressed = self.active[i], self.suppressed[i]
+                result = rule.evaluate(self, active)
+                suppressed &= result
+                for row in numpy.flatnonzero((result != active) & ~suppressed):
+                    alarm = self._transition(i, rule, row, bool(result[row]))
+                    if alarm is not None:
+                        alarms.append(alarm)
+        for alarm in alarms:
+            for listener in self.listeners:
+                listener(alarm)
+        return alarms
+
+    def _transition(self, index, rule, row, active):
+        controller, channel = self.rows[row]
+        if active:
+            try:
+                confirmed = rule.confirm(self.channel(row))
+            except Exception:
+                self._log.exception(
+                    "could not confirm %s on %s", rule.name, self.rows[row]
+                )
+                confirmed = False
+            if not confirmed:
+                self.suppressed[index, row] = True
+                return None
+        self.active[index, row] = active
+        message = rule.message(self, row) if active else None
+        return Alarm(rule.name, controller, channel, active, message)
+
+    def alarms(self):
+        """Currently active alarms as a list of (rule, controller, channel)"""
+        return [
+            (rule.name,) + self.rows[row]
+            for i, rule in enumerate(self.rules)
+            for row in numpy.flatnonzero(self.active[i])
+        ]
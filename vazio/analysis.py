@@ -0,0 +1,223 @@
+"""
+Leak rate and pump-down analysis
+
+Works on the pressure history of many channels at once: all the series
+are concatenated in a `SeriesSet` (flat time and pressure arrays plus the
+offset of every series) so that every step is a handful of NumPy
+operations over all of them, whatever the number of channels.
+
+* `intervals` finds the rising (valve closed, rate of rise) or falling
+  (pump-down) intervals from the slope of ln(p) over a sliding window
+* `fit` does a least squares line fit of every interval at once (normal
+  equations accumulated per interval with `numpy.bincount`)
+* `rate_of_rise` fits p(t) on the rising intervals: the slope dp/dt
+  times the channel volume is the leak rate
+* `pump_down` fits ln(p(t)) on the falling intervals: the time constant
+  is -1/slope
+* `analyze` does all of the above
+
+    data = SeriesSet.from_history(history)
+    result = analyze(data, volume={("dual1", "hv1.pressure"): 20})
+    result.leaks  # {(controller, path): leak rate}
+
+Requires numpy.
+"""
+
+import collections
+
+import numpy
+
+from .acquisition import split_path
+
+
+RISING, FALLING = 1, -1
+
+
+class SeriesSet(collections.namedtuple("SeriesSet", "keys offsets t p")):
+    """
+    Concatenated pressure series
+
+    keys: (controller, path) of every series
+    offsets: start of every series in t and p (plus the total size)
+    t, p: time and pressure of all the samples (time ordered per series)
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_series(cls, series):
+        """series: {(controller, path): (t, p)}"""
+        keys = list(series)
+        sizes = [len(series[key][0]) for key in keys]
+        offsets = numpy.zeros(len(keys) + 1, dtype=numpy.int64)
+        numpy.cumsum(sizes, out=offsets[1:])
+        t = numpy.empty(offsets[-1])
+        p = numpy.empty(offsets[-1])
+        for key, start, stop in zip(keys, offsets, offsets[1:]):
+            t[start:stop], p[start:stop] = series[key]
+        return cls(keys, offsets, t, p)
+
+    @classmethod
+    def from_history(cls, history, quantity="pressure"):
+        """Pressure series of a `vazio.history.History`"""
+        return cls.from_series(
+            {
+                key: (series.t, series.v)
+                for key, series in history.series.items()
+                if split_path(key[1])[1] == quantity
+            }
+        )
+
+
+Intervals = collections.namedtuple("Intervals", "series start stop")
+
+Fit = collections.namedtuple(
+    "Fit", "series start stop t0 t1 count slope intercept r2"
+)
+
+
+def blocks(offsets, size):
+    """Start of the blocks of `size` samples of every series"""
+    return numpy.concatenate(
+        [numpy.arange(start, stop, size) for start, stop in zip(offsets, offsets[1:])]
+        or [numpy.empty(0, dtype=numpy.int64)]
+    )
+
+
+def block_slopes(t, y, offsets, size, log=False):
+    """
+    Slopes of y(t) (ln(y)(t) if log) between the means of consecutive
+    blocks of `size` samples (one pass over the data, the logarithm is
+    taken on the block means). Returns (starts, slopes): slope k
+    is between the blocks starting at starts[k] and starts[k + 1] (NaN
+    when they belong to different series)
+    """
+    starts = blocks(offsets, size)
+    if not len(starts):
+        return starts, numpy.empty(0)
+    counts = numpy.diff(numpy.r_[starts, len(t)])
+    tm = numpy.add.reduceat(t, starts) / counts
+    ym = numpy.add.reduceat(y, starts) / counts
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        if log:
+            ym = numpy.log(ym)
+        slopes = numpy.diff(ym) / numpy.diff(tm)
+    # first block of every series (but the first one)
+    first = numpy.searchsorted(starts, offsets[1:-1])
+    slopes[first[first > 0] - 1] = numpy.nan
+    return starts, slopes
+
+
+def intervals(data, direction=RISING, window=10, min_rate=1e-4, min_duration=60.0,
+              slopes=None):
+    """
+    Rising (direction=RISING) or falling (FALLING) intervals: runs of
+    windows of `window` samples where ln(p) changes faster than min_rate
+    (1/s) in that direction, lasting at least min_duration (s).
+    slopes: block slopes of ln(p) if already computed (see `block_slopes`)
+    """
+    t, offsets = data.t, data.offsets
+    if slopes is None:
+        slopes = block_slopes(t, data.p, offsets, window // 2, log=True)
+    starts, slopes = slopes
+    with numpy.errstate(invalid="ignore"):
+        mask = slopes > min_rate if direction > 0 else slopes < -min_rate
+    edges = numpy.flatnonzero(mask[1:] != mask[:-1]) + 1
+    if len(mask) and mask[0]:
+        edges = numpy.r_[0, edges]
+    if len(mask) and mask[-1]:
+        edges = numpy.r_[edges, len(mask)]
+    # pairs k0..k1 cover the blocks k0..k1 + 1
+    ends = numpy.r_[starts[1:], len(t)]
+    start, stop = starts[edges[::2]], ends[edges[1::2]] - 1
+    keep = t[stop] - t[start] >= min_duration
+    start, stop = start[keep], stop[keep]
+    series = numpy.searchsorted(offsets, start, side="right") - 1
+    return Intervals(series, start, stop)
+
+
+def fit(data, found, log=False):
+    """Least squares line fit of p(t) (ln(p(t)) if log) on every interval"""
+    t, y = data.t, data.p
+    lengths = found.stop - found.start + 1
+    count = len(lengths)
+    ids = numpy.repeat(numpy.arange(count), lengths)
+    index = numpy.arange(lengths.sum()) - numpy.repeat(
+        numpy.cumsum(lengths) - lengths - found.start, lengths
+    )
+    x = t[index] - t[found.start][ids]
+    y = y[index]
+    if log:
+        y = numpy.log(y)
+    n = lengths.astype(float)
+    sx = numpy.bincount(ids, x, count)
+    sy = numpy.bincount(ids, y, count)
+    sxx = numpy.bincount(ids, x * x, count) - sx * sx / n
+    sxy = numpy.bincount(ids, x * y, count) - sx * sy / n
+    syy = numpy.bincount(ids, y * y, count) - sy * sy / n
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        slope = sxy / sxx
+        intercept = (sy - slope * sx) / n
+        r2 = sxy * sxy / (sxx * syy)
+    return Fit(
+        found.series,
+        found.start,
+        found.stop,
+        t[found.start],
+        t[found.stop],
+        lengths,
+        slope,
+        intercept,
+        r2,
+    )
+
+
+def rate_of_rise(data, window=10, min_rate=1e-4, min_duration=60.0, slopes=None):
+    """Linear fits p(t) of the rising intervals (slope: dp/dt)"""
+    found = intervals(data, RISING, window, min_rate, min_duration, slopes)
+    return fit(data, found)
+
+
+def pump_down(data, window=10, min_rate=1e-4, min_duration=60.0, slopes=None):
+    """
+    Exponential fits of the falling intervals. Returns (fits, tau) where
+    fits are the linear fits of ln(p(t)) and tau the time constants (s)
+    """
+    found = intervals(data, FALLING, window, min_rate, min_duration, slopes)
+    fits = fit(data, found, log=True)
+    with numpy.errstate(divide="ignore"):
+        return fits, -1 / fits.slope
+
+
+Analysis = collections.namedtuple("Analysis", "rise leaks pump_down tau")
+
+
+def analyze(data, volume=None, window=10, min_rate=1e-4, min_duration=60.0,
+            min_r2=0.9):
+    """
+    Rate of rise fits, leak rates, pump-down fits and time constants of
+    all the series (the block slopes are computed only once)
+    """
+    slopes = block_slopes(data.t, data.p, data.offsets, window // 2, log=True)
+    rise = rate_of_rise(data, window, min_rate, min_duration, slopes)
+    fits, tau = pump_down(data, window, min_rate, min_duration, slopes)
+    return Analysis(rise, leak_rates(data, rise, volume, min_r2), fits, tau)
+
+
+def leak_rates(data, fits, volume=None, min_r2=0.9):
+    """
+    Leak rate (pressure unit * volume unit / s) of every channel from its
+    longest rate of rise interval with a good enough fit.
+    volume: {key: chamber volume} (1 for missing channels)
+    """
+    volume = volume or {}
+    good = numpy.flatnonzero(fits.r2 >= min_r2)
+    # longest interval per series: sort by (series, duration)
+    order = good[numpy.lexsort((fits.t1[good] - fits.t0[good], fits.series[good]))]
+    series = fits.series[order]
+    last = numpy.r_[series[1:] != series[:-1], True] if len(order) else []
+    result = {}
+    for i in order[last]:
+        key = data.keys[fits.series[i]]
+        result[key] = float(fits.slope[i]) * volume.get(key, 1)
+    return result
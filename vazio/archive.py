@@ -0,0 +1,468 @@
+"""
+Compressed long-term archive
+
+Time series of controller quantities stored in independent compressed
+segments (`segment_size` samples of one quantity each) using the Gorilla
+encodings:
+
+* timestamps (quantized to `resolution` seconds): delta of delta. A zero
+  costs one bit, others a 2 bit class plus 7, 9, 12 or 64 bits
+* values (float64): XOR with the previous value. An unchanged value costs
+  one bit; otherwise only the meaningful bits of the XOR are stored, with
+  a new (leading zeros, length) window only when the previous one does
+  not fit
+
+The fields are not interleaved in a single bit stream: each kind (zero
+flags, classes, windows, payloads) goes to its own byte aligned plane.
+The size is the same (plus padding) but, since every plane is either
+fixed width or has widths known from the previous planes, a segment is
+decoded by NumPy without a per sample loop.
+
+File layout: MAGIC, then blocks with a SEGMENT header: key records
+(count 0, data: JSON [controller, path], written before the first
+segment of the key) and segments (header + data). When the archive is
+closed, a JSON index followed by FOOTER is added. The index (key, time
+span, position of every segment) lets range queries decode only the
+segments they touch. An archive without index (writer killed) is
+recovered by scanning the block headers.
+
+    with ArchiveWriter("vacuum.vza") as writer:
+        acquisition.subscribe(writer.update)
+        ...
+    with Archive("vacuum.vza") as archive:
+        t, v = archive.read("dual1", "hv1.pressure", start, stop)
+
+Requires numpy.
+"""
+
+import os
+import json
+import struct
+import collections
+
+import numpy
+
+from .acquisition import split_path
+
+
+MAGIC = b"VAZIOARC"
+VERSION = 1
+# key index, count (0 for a key record), first tick, last tick, data size
+SEGMENT = struct.Struct("<IIqqI")
+# index offset, index size, version, magic
+FOOTER = struct.Struct("<QQI8s")
+
+# delta of delta widths (two's complement) per class
+DOD_WIDTHS = numpy.array([7, 9, 12, 64])
+U64 = numpy.uint64
+ONES = U64(0xFFFFFFFFFFFFFFFF)
+
+Segment = collections.namedtuple("Segment", "key count start stop offset size")
+
+
+def pack_fields(values, widths):
+    """Packs values (uint64) in fields of the given bit widths (MSB first)"""
+    widths = numpy.asarray(widths, dtype=numpy.int64)
+    total = int(widths.sum())
+    if not total:
+        return b""
+    field = numpy.repeat(numpy.arange(len(widths)), widths)
+    starts = numpy.cumsum(widths) - widths
+    shift = (widths[field] - 1 - (numpy.arange(total) - starts[field])).astype(U64)
+    bits = (numpy.asarray(values, dtype=U64)[field] >> shift) & U64(1)
+    return numpy.packbits(bits.astype(numpy.uint8)).tobytes()
+
+
+def unpack_fields(data, widths):
+    """Inverse of `pack_fields`. Returns (values, number of bytes used)"""
+    widths = numpy.asarray(widths, dtype=numpy.int64)
+    total = int(widths.sum())
+    size = -(-total // 8)
+    values = numpy.zeros(len(widths), dtype=U64)
+    if not total:
+        return values, 0
+    bits = numpy.unpackbits(numpy.frombuffer(data, numpy.uint8, size), count=total)
+    field = numpy.repeat(numpy.arange(len(widths)), widths)
+    starts = numpy.cumsum(widths) - widths
+    shift = (widths[field] - 1 - (numpy.arange(total) - starts[field])).astype(U64)
+    used = widths > 0
+    values[used] = numpy.bitwise_or.reduceat(bits.astype(U64) << shift, starts[used])
+    return values, size
+
+
+def bit_length(x):
+    """Vectorized int.bit_length of uint64 values"""
+    hi, lo = (x >> U64(32)).astype(float), (x & U64(0xFFFFFFFF)).astype(float)
+    return numpy.where(hi > 0, 32 + numpy.frexp(hi)[1], numpy.frexp(lo)[1])
+
+
+def _mask(widths):
+    return ONES >> (64 - widths).astype(U64)
+
+
+def encode(ticks, values):
+    """
+    Encodes one segment. ticks: int64 timestamps, values: float64.
+    Returns the segment data (the first tick is kept in the header)
+    """
+    ticks = numpy.asarray(ticks, dtype=numpy.int64)
+    bits = numpy.ascontiguousarray(values, dtype=float).view(U64)
+    out = [bits[:1].tobytes()]
+
+    # timestamps: delta of delta
+    delta = numpy.diff(ticks, prepend=ticks[:1])
+    dod = numpy.diff(delta)
+    nonzero = dod != 0
+    dod = dod[nonzero]
+    cls = numpy.zeros(len(dod), dtype=numpy.int64)
+    for width in DOD_WIDTHS[:-1]:
+        limit = 1 << int(width - 1)
+        cls += (dod < -limit) | (dod >= limit)
+    widths = DOD_WIDTHS[cls]
+    out.append(numpy.packbits(nonzero).tobytes())
+    out.append(pack_fields(cls, numpy.full(len(cls), 2)))
+    out.append(pack_fields(dod.view(U64) & _mask(widths), widths))
+
+    # values: XOR with the previous one
+    xor = bits[1:] ^ bits[:-1]
+    nonzero = xor != 0
+    xor = xor[nonzero]
+    leading = numpy.minimum(64 - bit_length(xor), 31).astype(int).tolist()
+    trailing = (bit_length(xor & (~xor + U64(1))) - 1).astype(int).tolist()
+    new, windows, shifts, lengths = [], [], [], []
+    lead = length = None
+    for lz, tz in zip(leading, trailing):
+        if lead is None or lz < lead or tz < 64 - lead - length:
+            lead, length = lz, 64 - lz - tz
+            new.append(True)
+            windows.append(lead << 6 | (length - 1))
+        else:
+            new.append(False)
+        lengths.append(length)
+        shifts.append(64 - lead - length)
+    out.append(numpy.packbits(nonzero).tobytes())
+    out.append(numpy.packbits(numpy.array(new, dtype=bool)).tobytes())
+    out.append(pack_fields(windows, numpy.full(len(windows), 11)))
+    out.append(pack_fields(xor >> numpy.array(shifts, dtype=U64), lengths))
+    return b"".join(out)
+
+
+class _Planes:
+    """Sequential reader of the byte aligned planes of a segment"""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def flags(self, count):
+        size = -(-count // 8)
+        data = self.data[self.offset: self.offset + size]
+        self.offset += size
+        return numpy.unpackbits(numpy.frombuffer(data, numpy.uint8), count=count)
+
+    def fields(self, widths):
+        values, size = unpack_fields(self.data[self.offset:], widths)
+        self.offset += size
+        return values
+
+
+def decode(data, count, first):
+    """Decodes one segment. Returns (ticks, values) arrays"""
+    planes = _Planes(data[8:])
+    n = count - 1
+
+    nonzero = planes.flags(n).astype(bool)
+    cls = planes.fields(numpy.full(int(nonzero.sum()), 2)).astype(numpy.int64)
+    widths = DOD_WIDTHS[cls]
+    raw = planes.fields(widths)
+    sign = (raw >> (widths - 1).astype(U64)) & U64(1)
+    dod = numpy.zeros(count, dtype=numpy.int64)
+    dod[1:][nonzero] = (raw | (~_mask(widths) * sign)).view(numpy.int64)
+    ticks = numpy.cumsum(numpy.cumsum(dod))
+    ticks += first
+
+    nonzero = planes.flags(n).astype(bool)
+    new = planes.flags(int(nonzero.sum())).astype(bool)
+    windows = planes.fields(numpy.full(int(new.sum()), 11)).astype(numpy.int64)
+    window = numpy.cumsum(new) - 1
+    lead, length = windows[window] >> 6, (windows[window] & 63) + 1
+    xor = numpy.zeros(count, dtype=U64)
+    xor[0] = numpy.frombuffer(data, U64, 1)[0]
+    payload = planes.fields(length)
+    xor[1:][nonzero] = payload << (64 - lead - length).astype(U64)
+    values = numpy.bitwise_xor.accumulate(xor).view(float)
+    return ticks, values
+
+
+def _number(value):
+    value = getattr(value, "value", value)
+    return float(value)
+
+
+class ArchiveWriter:
+    """
+    Appends the samples of many quantities to an archive file
+
+    resolution: time resolution (s) of the stored timestamps
+    segment_size: samples per segment
+    quantities: quantity names stored by `update` (None for all the
+                numeric ones)
+    """
+
+    def __init__(self, path, resolution=1e-3, segment_size=4096, quantities=None):
+        self.path = path
+        self.resolution = resolution
+        self.segment_size = segment_size
+        self.quantities = None if quantities is None else set(quantities)
+        self.keys = []
+        self.index = []
+        self.samples = 0
+        self._ids = {}
+        self._pending = {}
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _key(self, controller, path):
+        key = controller, path
+        i = self._ids.get(key)
+        if i is None:
+            i = self._ids[key] = len(self.keys)
+            self.keys.append(key)
+            self._pending[i] = [], []
+            # key record: the names survive a writer which is not closed
+            name = json.dumps(key).encode()
+            self._file.write(SEGMENT.pack(i, 0, 0, 0, len(name)) + name)
+        return i
+
+    def append(self, controller, path, t, v):
+        key = self._key(controller, path)
+        ts, vs = self._pending[key]
+        ts.append(t)
+        vs.append(v)
+        if len(ts) >= self.segment_size:
+            self._write(key)
+
+    def extend(self, controller, path, t, v):
+        key = self._key(controller, path)
+        ts, vs = self._pending[key]
+        ts.extend(t)
+        vs.extend(v)
+        while len(ts) >= self.segment_size:
+            self._write(key)
+
+    def update(self, readings):
+        """Acquisition listener"""
+        for reading in readings:
+            if not reading.valid:
+                continue
+            if (
+                self.quantities is not None
+                and split_path(reading.path)[1] not in self.quantities
+            ):
+                continue
+            try:
+                value = _number(reading.value)
+            except (TypeError, ValueError):
+                continue
+            self.append(reading.controller, reading.path, reading.timestamp, value)
+
+    def _write(self, key):
+        ts, vs = self._pending[key]
+        n = min(len(ts), self.segment_size)
+        ticks = numpy.rint(numpy.array(ts[:n]) / self.resolution).astype(numpy.int64)
+        data = encode(ticks, vs[:n])
+        del ts[:n], vs[:n]
+        offset = self._file.tell()
+        self._file.write(
+            SEGMENT.pack(key, n, ticks[0], ticks[-1], len(data)) + data
+        )
+        self.index.append(
+            Segment(key, n, int(ticks[0]), int(ticks[-1]), offset, len(data))
+        )
+        self.samples += n
+
+    def flush(self):
+        """Writes the pending samples as (possibly short) segments"""
+        for key, (ts, _) in self._pending.items():
+            if ts:
+                self._write(key)
+        self._file.flush()
+
+    @property
+    def size(self):
+        """Stored bytes of the written segments"""
+        return sum(SEGMENT.size + s.size for s in self.index)
+
+    @property
+    def ratio(self):
+        """Compression ratio of the written segments (vs float64 t, v pairs)"""
+        return 16 * self.samples / self.size if self.index else 1.0
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        index = json.dumps(
+            dict(
+                resolution=self.resolution,
+                keys=self.keys,
+                segments=[list(segment) for segment in self.index],
+            )
+        ).encode()
+        offset = self._file.tell()
+        self._file.write(index)
+        self._file.write(FOOTER.pack(offset, len(index), VERSION, MAGIC))
+        self._file.close()
+
+
+class Archive:
+    """Archive file reader"""
+
+    def __init__(self, path, resolution=None):
+        self._file = open(path, "rb")
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError("{!r} is not a vazio archive".format(path))
+        try:
+            info = self._read_index()
+        except ValueError:
+            if resolution is None:
+                self._file.close()
+                raise ValueError(
+                    "{!r} has no index: give the resolution to recover it".format(
+                        path
+                    )
+                )
+            info = self._scan(resolution)
+        self.resolution = info["resolution"]
+        self.keys = [tuple(key) for key in info["keys"]]
+        self._ids = {key: i for i, key in enumerate(self.keys)}
+        self.index = [Segment(*segment) for segment in info["segments"]]
+        self._spans = {}
+        for i in range(len(self.keys)):
+            segments = [s for s in self.index if s.key == i]
+            self._spans[i] = (
+                segments,
+                numpy.array([s.start for s in segments], dtype=numpy.int64),
+                numpy.array([s.stop for s in segments], dtype=numpy.int64),
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read_index(self):
+        f = self._file
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        if end < len(MAGIC) + FOOTER.size:
+            raise ValueError("no footer")
+        f.seek(end - FOOTER.size)
+        offset, size, version, magic = FOOTER.unpack(f.read(FOOTER.size))
+        if magic != MAGIC or offset + size + FOOTER.size != end:
+            raise ValueError("no footer")
+        if version != VERSION:
+            raise ValueError("unsupported archive version {}".format(version))
+        f.seek(offset)
+        return json.loads(f.read(size))
+
+    def _scan(self, resolution):
+        """Rebuilds the index of an archive that was not closed"""
+        f = self._file
+        f.seek(len(MAGIC))
+        segments, names = [], {}
+        while True:
+            offset = f.tell()
+            header = f.read(SEGMENT.size)
+            if len(header) < SEGMENT.size:
+                break
+            key, count, start, stop, size = SEGMENT.unpack(header)
+            data = f.read(size)
+            if len(data) < size:
+                break  # truncated block
+            if count:
+                segments.append((key, count, start, stop, offset, size))
+            else:
+                names[key] = json.loads(data)
+        nkeys = max(
+            [key + 1 for key in names] + [s[0] + 1 for s in segments], default=0
+        )
+        keys = [names.get(i, ("?", str(i))) for i in range(nkeys)]
+        return dict(resolution=resolution, keys=keys, segments=segments)
+
+    @property
+    def samples(self):
+        return sum(s.count for s in self.index)
+
+    @property
+    def size(self):
+        return sum(SEGMENT.size + s.size for s in self.index)
+
+    @property
+    def ratio(self):
+        """Compression ratio (vs float64 t, v pairs)"""
+        return 16 * self.samples / self.size if self.index else 1.0
+
+    def stats(self):
+        """{key: (samples, stored bytes, compression ratio)}"""
+        result = {}
+        for key, i in self._ids.items():
+            segments = self._spans[i][0]
+            samples = sum(s.count for s in segments)
+            size = sum(SEGMENT.size + s.size for s in segments)
+            result[key] = samples, size, 16 * samples / size if size else 1.0
+        return result
+
+    def segments(self, controller, path, start=None, stop=None):
+        """Segments of a quantity overlapping the time range [start, stop]"""
+        i = self._ids.get((controller, path))
+        if i is None:
+            return []
+        segments, starts, stops = self._spans[i]
+        lo, hi = 0, len(segments)
+        if start is not None:
+            lo = numpy.searchsorted(stops, numpy.floor(start / self.resolution))
+        if stop is not None:
+            hi = numpy.searchsorted(
+                starts, numpy.ceil(stop / self.resolution), side="right"
+            )
+        return segments[lo:hi]
+
+    def decode(self, segment):
+        """(t, v) arrays of a segment"""
+        self._file.seek(segment.offset + SEGMENT.size)
+        data = self._file.read(segment.size)
+        ticks, values = decode(data, segment.count, segment.start)
+        return ticks * self.resolution, values
+
+    def iter(self, controller, path, start=None, stop=None):
+        """Yields (t, v) arrays segment by segment, trimmed to [start, stop]"""
+        for segment in self.segments(controller, path, start, stop):
+            t, v = self.decode(segment)
+            if start is not None or stop is not None:
+                lo = 0 if start is None else numpy.searchsorted(t, start)
+                hi = len(t) if stop is None else numpy.searchsorted(
+                    t, stop, side="right"
+                )
+                t, v = t[lo:hi], v[lo:hi]
+            yield t, v
+
+    def read(self, controller, path, start=None, stop=None):
+        """(t, v) arrays of a quantity in the time range [start, stop]"""
+        parts = list(self.iter(controller, path, start, stop))
+        if not parts:
+            empty = numpy.empty(0)
+            return empty, empty
+        t, v = zip(*parts)
+        return numpy.concatenate(t), numpy.concatenate(v)
+
+    def close(self):
+        self._file.close()
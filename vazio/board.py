@@ -0,0 +1,189 @@
+"""
+Shared memory latest value board
+
+A `Board` publishes the latest value, timestamp and quality of every
+quantity of an `vazio.acquisition.Acquisition` in a
+`multiprocessing.shared_memory` block with a fixed layout, so that any
+number of local processes can read them without IPC round trips (and
+without going to the controllers):
+
+    # acquisition process
+    board = Board.create("vacuum", acquisition)
+
+    # any other process
+    reader = BoardReader("vacuum")
+    value, timestamp, quality = reader.read("dual1", "hv1.pressure")
+
+Layout (little endian):
+
+* header: HEADER (magic, version, number of slots, index size, slot offset)
+* index: JSON list of [controller, path] (slot order)
+* slots: one SLOT per quantity (sequence, value, timestamp, quality)
+
+Every slot is protected by a seqlock: the writer makes the sequence odd,
+writes the data and makes it even again. Readers retry until they read
+the same even sequence before and after the data.
+"""
+
+import enum
+import json
+import math
+import time
+import struct
+import collections
+from multiprocessing import shared_memory
+
+
+MAGIC = b"VAZIOBRD"
+VERSION = 1
+HEADER = struct.Struct("<8sIIII")
+SLOT = struct.Struct("<Qddi4x")
+SEQ = struct.Struct("<Q")
+DATA = struct.Struct("<ddi")
+
+# quality
+VALID = 0
+INVALID = 1  # last read failed: value is the previous one
+UNSET = 2  # never read
+
+# blocks created (and tracked) by this process
+_owned = set()
+
+Sample = collections.namedtuple("Sample", "value timestamp quality")
+
+
+def _number(value):
+    if isinstance(value, enum.Enum):
+        value = value.value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _attach(name):
+    """Attaches to an existing block without taking its ownership"""
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # python < 3.13: avoid the resource tracker unlinking the block
+        # when this (reader) process exits
+        from multiprocessing import resource_tracker
+
+        shm = shared_memory.SharedMemory(name)
+        if shm.name not in _owned:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class Board:
+    """
+    Writer side. keys: sequence of (controller, path)
+
+    Use `Board.create` to also publish the readings of an acquisition
+    """
+
+    def __init__(self, keys, name=None):
+        self.keys = [tuple(key) for key in keys]
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        index = json.dumps(self.keys).encode()
+        self.slot_offset = HEADER.size + len(index)
+        self.slot_offset += -self.slot_offset % 8
+        size = self.slot_offset + SLOT.size * len(self.keys)
+        self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        _owned.add(self.shm.name)
+        buf = self.shm.buf
+        for i in range(len(self.keys)):
+            SLOT.pack_into(buf, self._offset(i), 0, math.nan, math.nan, UNSET)
+        buf[HEADER.size: HEADER.size + len(index)] = index
+        HEADER.pack_into(
+            buf, 0, MAGIC, VERSION, len(self.keys), len(index), self.slot_offset
+        )
+
+    @classmethod
+    def create(cls, name, acquisition):
+        """Board with every quantity of the acquisition, fed by it"""
+        keys = [
+            (controller, path)
+            for controller in acquisition.controllers
+            for path in acquisition.quantities
+        ]
+        board = cls(keys, name)
+        acquisition.subscribe(board.update)
+        return board
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _offset(self, slot):
+        return self.slot_offset + slot * SLOT.size
+
+    def write(self, controller, path, value, timestamp, quality=VALID):
+        buf = self.shm.buf
+        offset = self._offset(self.index[controller, path])
+        seq = SEQ.unpack_from(buf, offset)[0]
+        SEQ.pack_into(buf, offset, seq + 1)
+        DATA.pack_into(buf, offset + SEQ.size, value, timestamp, quality)
+        SEQ.pack_into(buf, offset, seq + 2)
+
+    def update(self, readings):
+        """Acquisition listener"""
+        index = self.index
+        for reading in readings:
+            if (reading.controller, reading.path) not in index:
+                continue
+            self.write(
+                reading.controller,
+                reading.path,
+                _number(reading.value),
+                reading.timestamp,
+                VALID if reading.valid else INVALID,
+            )
+
+    def close(self, unlink=True):
+        self.shm.close()
+        if unlink:
+            _owned.discard(self.shm.name)
+            self.shm.unlink()
+
+
+class BoardReader:
+    """Reader side of a `Board` (attach by name)"""
+
+    def __init__(self, name, retries=10000):
+        self.retries = retries
+        self.shm = _attach(name)
+        buf = self.shm.buf
+        magic, version, _, index_size, self.slot_offset = HEADER.unpack_from(buf)
+        if magic != MAGIC or version != VERSION:
+            self.shm.close()
+            raise ValueError("{!r} is not a vazio board".format(name))
+        index = json.loads(bytes(buf[HEADER.size: HEADER.size + index_size]))
+        self.keys = [tuple(key) for key in index]
+        self.index = {key: i for i, key in enumerate(self.keys)}
+
+    def _read(self, slot):
+        buf = self.shm.buf
+        offset = self.slot_offset + slot * SLOT.size
+        data = offset + SEQ.size
+        for _ in range(self.retries):
+            seq = SEQ.unpack_from(buf, offset)[0]
+            if not seq & 1:
+                sample = DATA.unpack_from(buf, data)
+                if SEQ.unpack_from(buf, offset)[0] == seq:
+                    return Sample(*sample)
+            # writer in the middle of an update: let it finish
+            time.sleep(0)
+        raise TimeoutError("could not get a consistent read of slot {}".format(slot))
+
+    def read(self, controller, path):
+        """Latest Sample(value, timestamp, quality) of a quantity"""
+        return self._read(self.index[controller, path])
+
+    def read_all(self):
+        """{(controller, path): Sample}"""
+        return {key: self._read(i) for i, key in enumerate(self.keys)}
+
+    def close(self):
+        self.shm.close()
@@ -0,0 +1,213 @@
+"""
+Fault triggered burst capture
+
+`BurstCapture` polls the pressure, current and HV state of the monitored
+channels of a controller (plus its interlock status) at an elevated rate
+in its own `vazio.acquisition.Acquisition`, keeping the last `pre` seconds
+in a ring buffer. When the HV state of a channel goes to one of the
+`HighVoltage` Off* fault values (negative codes) or the interlock status
+changes, it switches to maximum rate acquisition for `post` seconds and
+then stores the whole event (pre + post trigger samples) as a single
+`Event`.
+
+The capture shares the line with any other acquisition on the same
+controller, so its polls are limited to a fraction of the line time: the
+line time of one poll is computed from the query frames (see
+`vazio.refresh.RefreshPolicy.cost`), the maximum rate (after a trigger)
+is capped to `budget` / poll time and the normal rate to the smaller
+`idle_budget` / poll time. The other acquisitions keep the rest of the
+line, and therefore their rate.
+
+Requires numpy.
+"""
+
+import enum
+import time
+import collections
+
+import numpy
+
+from .acquisition import Acquisition, split_path
+from .refresh import RefreshPolicy, query
+
+
+QUANTITIES = "pressure", "current", "high_voltage"
+
+
+def _number(value):
+    if isinstance(value, enum.Enum):
+        value = value.value
+    return float(value)
+
+
+class Event(collections.namedtuple("Event", "time reason columns data")):
+    """
+    Captured event
+
+    time: trigger timestamp
+    reason: trigger description
+    columns: column names of data ("time" followed by the attribute paths)
+    data: 2D float array (one row per poll)
+    """
+
+    __slots__ = ()
+
+    @property
+    def pre(self):
+        """Samples before the trigger"""
+        return self.data[self.data[:, 0] < self.time]
+
+    @property
+    def post(self):
+        """Samples after (and including) the trigger"""
+        return self.data[self.data[:, 0] >= self.time]
+
+    def save(self, file):
+        """Saves the event in compressed numpy .npz format"""
+        numpy.savez_compressed(
+            file,
+            time=self.time,
+            reason=self.reason,
+            columns=numpy.array(self.columns),
+            data=self.data,
+        )
+
+    @classmethod
+    def load(cls, file):
+        with numpy.load(file) as npz:
+            return cls(
+                float(npz["time"]),
+                str(npz["reason"]),
+                tuple(str(c) for c in npz["columns"]),
+                npz["data"],
+            )
+
+
+class BurstCapture:
+    """
+    ctrl: controller (ex: `vazio.variandual.VarianDual`)
+    channels: monitored channel attribute names
+    pre: pre-trigger duration (s) kept in the ring buffer
+    post: post-trigger duration (s) acquired at maximum rate
+    rate: poll rate (Hz) while waiting for a trigger
+    events: maximum number of events kept in memory
+    budget: maximum fraction of the line time used by the capture (None:
+            no limit, for controllers which do not share a serial line)
+    idle_budget: fraction of the line time used while waiting for a
+                 trigger (lower than budget, so the post trigger rate is
+                 higher)
+    policy: `vazio.refresh.RefreshPolicy` with the line parameters (default:
+            9600 baud)
+    """
+
+    def __init__(self, ctrl, name="ctrl", channels=("hv1", "hv2"), pre=5.0,
+                 post=2.0, rate=10.0, quantities=QUANTITIES, events=100,
+                 budget=0.5, idle_budget=0.2, policy=None, clock=time.time):
+        if budget is not None and not 0 < idle_budget < budget:
+            raise ValueError("idle_budget must be > 0 and lower than budget")
+        self.pre = pre
+        self.post = post
+        paths = [
+            "{}.{}".format(channel, quantity)
+            for channel in channels
+            for quantity in quantities
+        ]
+        paths.append("interlock_status")
+        # shortest periods fitting the line budgets (maximum and normal rate)
+        self.min_period = idle_period = 0.0
+        if budget is not None:
+            policy = RefreshPolicy() if policy is None else policy
+            cost = sum(policy.cost(query(ctrl, path)) for path in paths)
+            self.min_period = cost / budget
+            idle_period = cost / idle_budget
+        self.period = max(1 / rate, idle_period)
+        self.columns = ("time",) + tuple(paths)
+        self._index = {path: i + 1 for i, path in enumerate(paths)}
+        self.ring = collections.deque()
+        self.samples = None
+        self.trigger_time = None
+        self.reason = None
+        self.events = collections.deque(maxlen=events)
+        self.listeners = []
+        self._previous = None
+        self.acquisition = Acquisition({name: ctrl}, paths, self.period, clock)
+        self.acquisition.subscribe(self.update)
+
+    @property
+    def triggered(self):
+        return self.trigger_time is not None
+
+    def subscribe(self, callback):
+        """callback(event) is called for every captured event"""
+        self.listeners.append(callback)
+
+    def start(self):
+        self.acquisition.start()
+
+    def stop(self):
+        self.acquisition.stop()
+
+    def row(self, readings):
+        row = numpy.full(len(self.columns), numpy.nan)
+        row[0] = readings[0].timestamp
+        index = self._index
+        for reading in readings:
+            if reading.valid:
+                try:
+                    row[index[reading.path]] = _number(reading.value)
+                except (TypeError, ValueError):
+                    pass
+        return row
+
+    def check(self, row):
+        """Trigger reason for a new row (None if no trigger)"""
+        previous, self._previous = self._previous, row
+        if previous is None:
+            return None
+        reasons = []
+        with numpy.errstate(invalid="ignore"):
+            for path, i in self._index.items():
+                quantity = split_path(path)[1]
+                if quantity == "high_voltage":
+                    if row[i] < 0 and not previous[i] < 0:
+                        reasons.append("{} fault ({:d})".format(path, int(row[i])))
+                elif quantity == "interlock_status":
+                    old, new = previous[i], row[i]
+                    if old != new and not numpy.isnan(old + new):
+                        reasons.append(
+                            "{} {:d} -> {:d}".format(path, int(old), int(new))
+                        )
+        return ", ".join(reasons) or None
+
+    def update(self, readings):
+        """Acquisition listener"""
+        row = self.row(readings)
+        now = row[0]
+        reason = self.check(row)
+        if self.triggered:
+            self.samples.append(row)
+            if now - self.trigger_time >= self.post:
+                return self._finish()
+            return None
+        ring = self.ring
+        ring.append(row)
+        while ring and ring[0][0] < now - self.pre:
+            ring.popleft()
+        if reason is not None:
+            self.trigger_time, self.reason = float(now), reason
+            self.samples = list(ring)
+            ring.clear()
+            # maximum rate until the post trigger window is over
+            self.acquisition.period = self.min_period
+        return None
+
+    def _finish(self):
+        event = Event(
+            self.trigger_time, self.reason, self.columns, numpy.array(self.samples)
+        )
+        self.trigger_time = self.reason = self.samples = None
+        self.acquisition.period = self.period
+        self.events.append(event)
+        for listener in self.listeners:
+            listener(event)
+        return event
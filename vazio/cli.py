@@ -0,0 +1,421 @@
+"""
+vazio command line monitor
+
+Streams quantities of one or more controllers as fast as the lines allow
+(or at a fixed period) and shows them as a live table or dumps them as CSV
+or as a compact binary stream:
+
+    $ vazio variandual:/dev/ttyS0 pump=agilent/2:tcp://moxa:4002
+    $ vazio -f csv -o dump.csv -d 60 variandual:tcp://moxa:4001
+
+A controller is given as [name=]type[/address]:url. Each controller is
+polled by its own thread; the output is written by another thread through
+a bounded queue so a slow output never blocks the acquisition (batches
+that do not fit are dropped and counted). The achieved rate of every
+controller is reported on stderr at the end.
+
+Binary stream: a "VAZIO 1" line, a JSON line with the "controllers" and
+their "quantities", followed by records of struct RECORD (timestamp,
+controller index, quantity index, value). Non numeric values and errors
+are stored as NaN. See `read_binary`.
+"""
+
+import io
+import sys
+import csv
+import enum
+import json
+import math
+import time
+import queue
+import struct
+import argparse
+import threading
+
+from .acquisition import Acquisition
+from .agilent import Agilent4UHV
+from .connection import connect_codec
+from .mks import MKS937
+from .variandual import VarianDual
+
+
+TYPES = {
+    "variandual": (
+        VarianDual,
+        (
+            "hv1.pressure", "hv1.current", "hv1.voltage",
+            "hv2.pressure", "hv2.current", "hv2.voltage",
+        ),
+    ),
+    "agilent": (
+        Agilent4UHV,
+        tuple(
+            "hv{}.{}".format(ch, q)
+            for ch in range(1, 5)
+            for q in ("pressure", "current", "voltage")
+        ),
+    ),
+    "mks": (MKS937, tuple("gauge{}.pressure".format(ch) for ch in range(1, 6))),
+}
+
+MAGIC = b"VAZIO 1\n"
+RECORD = struct.Struct("<dHHd")
+
+
+def parse_spec(spec):
+    """'[name=]type[/address]:url' -> (name, type, address, url)"""
+    name, sep, rest = spec.partition("=")
+    if not sep or ":" in name:
+        name, rest = None, spec
+    kind, _, url = rest.partition(":")
+    kind, _, address = kind.partition("/")
+    kind = kind.lower()
+    if kind not in TYPES or not url:
+        raise ValueError("invalid controller {!r}".format(spec))
+    address = int(address) if address else None
+    return name or kind, kind, address, url
+
+
+def create_controller(kind, url, address=None, timeout=1.0):
+    klass = TYPES[kind][0]
+    conn = connect_codec(url, klass.table.codec, timeout=timeout)
+    if address is None:
+        return klass(conn)
+    return klass(conn, address)
+
+
+def number(value):
+    """float representation of a reading value (NaN if not numeric)"""
+    if isinstance(value, enum.Enum):
+        value = value.value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def text(reading):
+    if not reading.valid:
+        return ""
+    value = reading.value
+    return value.name if isinstance(value, enum.Enum) else str(value)
+
+
+class Format:
+    """
+    Base of the output formats
+
+    controllers: controller names (in output order)
+    quantities: {controller name: quantity paths} of every controller
+    """
+
+    def __init__(self, controllers, quantities):
+        self.controllers = list(controllers)
+        missing = [name for name in self.controllers if not quantities.get(name)]
+        if missing:
+            raise ValueError("no quantities for {}".format(", ".join(missing)))
+        self.quantities = {name: list(quantities[name]) for name in self.controllers}
+
+
+class CSVFormat(Format):
+    """timestamp,controller,quantity,value,error"""
+
+    def header(self):
+        return b"timestamp,controller,quantity,value,error\n"
+
+    def encode(self, readings):
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerows(
+            (
+                "{:.6f}".format(r.timestamp),
+                r.controller,
+                r.path,
+                text(r),
+                "" if r.valid else repr(r.error),
+            )
+            for r in readings
+        )
+        return out.getvalue().encode()
+
+
+class BinaryFormat(Format):
+    """Fixed size records preceded by a JSON header (see module doc)"""
+
+    def __init__(self, controllers, quantities):
+        super().__init__(controllers, quantities)
+        self._index = {
+            (name, path): (i, j)
+            for i, name in enumerate(self.controllers)
+            for j, path in enumerate(self.quantities[name])
+        }
+
+    def header(self):
+        info = dict(controllers=self.controllers, quantities=self.quantities)
+        return MAGIC + json.dumps(info).encode() + b"\n"
+
+    def encode(self, readings):
+        pack, index = RECORD.pack, self._index
+        return b"".join(
+            pack(
+                r.timestamp,
+                *index[r.controller, r.path],
+                number(r.value) if r.valid else math.nan
+            )
+            for r in readings
+        )
+
+
+FORMATS = {"csv": CSVFormat, "binary": BinaryFormat}
+
+
+def read_binary(stream):
+    """
+    Decodes a binary stream. Returns (header, records) where records
+    yields (timestamp, controller, quantity, value)
+    """
+    if stream.readline() != MAGIC:
+        raise ValueError("not a vazio binary stream")
+    header = json.loads(stream.readline())
+    names = header["controllers"]
+    quantities = [header["quantities"][name] for name in names]
+
+    def records():
+        size = RECORD.size
+        while True:
+            data = stream.read(size * 4096)
+            if not data:
+                break
+            data = data[: len(data) // size * size]
+            for t, i, j, v in RECORD.iter_unpack(data):
+                yield t, names[i], quantities[i][j], v
+
+    return header, records()
+
+
+class Writer:
+    """
+    Writes reading batches to a binary file from a background thread.
+    `put` never blocks: when the queue is full the batch is dropped
+    """
+
+    def __init__(self, fmt, output, maxsize=10000, flush_period=0.5):
+        self.fmt = fmt
+        self.output = output
+        self.flush_period = flush_period
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self._thread = None
+
+    def put(self, readings):
+        try:
+            self.queue.put_nowait(readings)
+        except queue.Full:
+            self.dropped += len(readings)
+
+    def run(self):
+        encode, write = self.fmt.encode, self.output.write
+        write(self.fmt.header())
+        last_flush = time.monotonic()
+        while True:
+            try:
+                batch = self.queue.get(timeout=self.flush_period)
+            except queue.Empty:
+                batch = ()
+            if batch is None:
+                break
+            if batch:
+                write(encode(batch))
+            now = time.monotonic()
+            if now - last_flush >= self.flush_period:
+                self.output.flush()
+                last_flush = now
+        self.output.flush()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Writes the pending batches and stops the thread"""
+        if self._thread is not None:
+            self.queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+
+class Counter:
+    """Acquisition listener counting readings and polls"""
+
+    def __init__(self):
+        self.samples = self.errors = self.cycles = 0
+
+    def __call__(self, readings):
+        self.cycles += 1
+        self.samples += len(readings)
+        self.errors += sum(1 for r in readings if not r.valid)
+
+
+class Monitor:
+    """
+    Polls every controller in its own `Acquisition` thread
+
+    controllers: {name: controller}
+    quantities: {name: paths}
+    period: time (s) between polls (0 means as fast as possible)
+    """
+
+    def __init__(self, controllers, quantities, period=0.0):
+        self.acquisitions = {
+            name: Acquisition({name: ctrl}, quantities[name], period=period)
+            for name, ctrl in controllers.items()
+        }
+        self.counters = {}
+        for name, acq in self.acquisitions.items():
+            counter = Counter()
+            acq.subscribe(counter)
+            self.counters[name] = counter
+        self.start_time = self.stop_time = None
+
+    def subscribe(self, callback):
+        for acq in self.acquisitions.values():
+            acq.subscribe(callback)
+
+    def latest(self):
+        latest = {}
+        for acq in self.acquisitions.values():
+            latest.update(acq.latest)
+        return latest
+
+    def start(self):
+        self.start_time = time.monotonic()
+        for acq in self.acquisitions.values():
+            acq.start()
+
+    def stop(self):
+        for acq in self.acquisitions.values():
+            acq.stop()
+        self.stop_time = time.monotonic()
+
+    @property
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        end = time.monotonic() if self.stop_time is None else self.stop_time
+        return end - self.start_time
+
+    def rates(self):
+        """{name: (samples/s, polls/s)}"""
+        elapsed = self.elapsed or math.inf
+        return {
+            name: (c.samples / elapsed, c.cycles / elapsed)
+            for name, c in self.counters.items()
+        }
+
+    def report(self):
+        lines = []
+        rates = self.rates()
+        for name, counter in self.counters.items():
+            rate, cycles = rates[name]
+            lines.append(
+                "{}: {} samples ({} errors) in {:.1f}s: {:.1f} samples/s, "
+                "{:.1f} polls/s".format(
+                    name, counter.samples, counter.errors, self.elapsed, rate, cycles
+                )
+            )
+        return "\n".join(lines)
+
+
+def table(monitor):
+    """Live table text"""
+    rates = monitor.rates()
+    latest = monitor.latest()
+    lines = ["{:<12} {:<22} {:>14}".format("controller", "quantity", "value")]
+    for (name, path), reading in sorted(latest.items()):
+        value = text(reading) if reading.valid else "<{}>".format(
+            type(reading.error).__name__
+        )
+        lines.append("{:<12} {:<22} {:>14}".format(name, path, value))
+    lines.append("")
+    for name, (rate, cycles) in rates.items():
+        lines.append("{}: {:.1f} samples/s {:.1f} polls/s".format(name, rate, cycles))
+    return "\n".join(lines)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="vazio", description="vacuum controller monitor"
+    )
+    parser.add_argument(
+        "controllers", nargs="+", metavar="controller",
+        help="[name=]type[/address]:url (type: {})".format(", ".join(TYPES)),
+    )
+    parser.add_argument(
+        "-q", "--quantity", dest="quantities", action="append",
+        help="quantity path (ex: hv1.pressure). Default depends on the type",
+    )
+    parser.add_argument(
+        "-f", "--format", default="table", choices=["table"] + list(FORMATS)
+    )
+    parser.add_argument(
+        "-o", "--output", default="-", help="output file (- for stdout)"
+    )
+    parser.add_argument(
+        "-p", "--period", type=float, default=0.0,
+        help="poll period (s). Default: as fast as possible",
+    )
+    parser.add_argument("-d", "--duration", type=float, help="stop after (s)")
+    parser.add_argument("--timeout", type=float, default=1.0, help="reply timeout (s)")
+    parser.add_argument(
+        "--refresh", type=float, default=0.5, help="table refresh period (s)"
+    )
+    return parser
+
+
+def main(args=None):
+    parser = get_parser()
+    opts = parser.parse_args(args)
+    controllers, quantities = {}, {}
+    for spec in opts.controllers:
+        try:
+            name, kind, address, url = parse_spec(spec)
+        except ValueError as error:
+            parser.error(str(error))
+        controllers[name] = create_controller(kind, url, address, opts.timeout)
+        quantities[name] = tuple(opts.quantities or TYPES[kind][1])
+    monitor = Monitor(controllers, quantities, period=opts.period)
+    writer = None
+    if opts.format != "table":
+        if opts.output == "-":
+            output = sys.stdout.buffer
+        else:
+            output = open(opts.output, "wb", buffering=1 << 16)
+        writer = Writer(FORMATS[opts.format](controllers, quantities), output)
+        monitor.subscribe(writer.put)
+        writer.start()
+    monitor.start()
+    deadline = math.inf if opts.duration is None else time.monotonic() + opts.duration
+    try:
+        while time.monotonic() < deadline:
+            time.sleep(min(opts.refresh, max(deadline - time.monotonic(), 0)))
+            if writer is None:
+                sys.stdout.write("\x1b[H\x1b[2J" + table(monitor) + "\n")
+                sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        monitor.stop()
+        if writer is not None:
+            writer.stop()
+            if writer.output is not sys.stdout.buffer:
+                writer.output.close()
+    print(monitor.report(), file=sys.stderr)
+    if writer is not None and writer.dropped:
+        print(
+            "{} samples dropped by a slow output".format(writer.dropped),
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Blocking connections
+
+`connect` opens a line with pyserial (any url supported by
+`serial.serial_for_url`: /dev/ttyS0, socket://host:port, rfc2217://...;
+tcp://host:port is accepted as an alias of socket://) and returns a
+`Connection` providing the write_readline expected by the controllers.
+
+`Supervisor` wraps a connection factory to detect dead links, fail fast
+while they are down and reconnect in the background.
+"""
+
+import os
+import time
+import random
+import select
+import threading
+
+
+class FrameReader:
+    """
+    Buffered frame reader
+
+    Reads whatever bytes are available (a single readv per wakeup when the
+    stream has a file descriptor) into a reusable bytearray and splits
+    frames on eol (+ tail bytes, ex: Agilent ETX + CRC). Bytes following a
+    frame are kept for the next one (pipelined replies).
+
+    stream: object with fileno() or, as a fallback, a pyserial like
+            read(size) and in_waiting
+    """
+
+    def __init__(self, stream, eol=b"\r", tail=0, size=4096):
+        self.stream = stream
+        self.eol = eol
+        self.tail = tail
+        self.buffer = bytearray(size)
+        self.start = self.end = 0
+        self.fd = None
+        if hasattr(os, "readv"):
+            try:
+                self.fd = stream.fileno()
+            except (AttributeError, OSError, ValueError):
+                pass
+
+    def __len__(self):
+        return self.end - self.start
+
+    def clear(self):
+        self.start = self.end = 0
+
+    def discard(self):
+        """Drops the buffered bytes and whatever the stream already received"""
+        self.clear()
+        if self.fd is not None:
+            while select.select((self.fd,), (), (), 0)[0]:
+                if not os.read(self.fd, len(self.buffer)):
+                    break
+        else:
+            self.stream.reset_input_buffer()
+
+    def _compact(self):
+        start, end = self.start, self.end
+        if start == end:
+            self.start = self.end = 0
+        elif end == len(self.buffer):
+            if start:
+                self.buffer[: end - start] = self.buffer[start:end]
+                self.start, self.end = 0, end - start
+            else:
+                self.buffer.extend(bytes(len(self.buffer)))
+
+    def _read(self, view, timeout):
+        if self.fd is not None:
+            if not select.select((self.fd,), (), (), timeout)[0]:
+                return 0
+            n = os.readv(self.fd, (view,))
+            if not n:
+                raise ConnectionError("connection closed by peer")
+            return n
+        stream = self.stream
+        stream.timeout = timeout
+        data = stream.read(min(len(view), max(1, stream.in_waiting)))
+        view[: len(data)] = data
+        return len(data)
+
+    def read_frame(self, timeout):
+        """Next frame. Raises TimeoutError if not complete within timeout (s)"""
+        deadline = time.monotonic() + timeout
+        eol, size = self.eol, len(self.eol) + self.tail
+        buffer = self.buffer
+        offset = 0
+        while True:
+            index = buffer.find(eol, self.start + offset, self.end)
+            if index >= 0:
+                stop = index + size
+                if stop <= self.end:
+                    frame = bytes(buffer[self.start: stop])
+                    self.start = stop
+                    if self.start == self.end:
+                        self.start = self.end = 0
+                    return frame
+                offset = index - self.start
+            else:
+                offset = max(0, self.end - self.start - len(eol) + 1)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("frame not received within {}s".format(timeout))
+            self._compact()
+            buffer = self.buffer
+            with memoryview(buffer) as view:
+                self.end += self._read(view[self.end:], remaining)
+
+
+class Connection:
+    """
+    Request/reply connection on top of a pyserial like stream.
+
+    eol: reply terminator
+    tail: number of bytes following the terminator (ex: Agilent CRC)
+    timeout: maximum time (s) to receive each reply frame
+
+    After a timeout the replies still to come belong to the failed request:
+    the pending input is discarded before the next request.
+    """
+
+    def __init__(self, stream, eol=b"\r", tail=0, timeout=1.0):
+        self.stream = stream
+        self.timeout = timeout
+        self.reader = FrameReader(stream, eol, tail)
+        self._stale = False
+        self._lock = threading.Lock()
+
+    @property
+    def eol(self):
+        return self.reader.eol
+
+    @property
+    def tail(self):
+        return self.reader.tail
+
+    def _readline(self, request):
+        try:
+            return self.reader.read_frame(self.timeout)
+        except TimeoutError:
+            self._stale = True
+            raise TimeoutError("timeout waiting for reply to {!r}".format(request))
+
+    def _write(self, data):
+        if self._stale:
+            self.reader.discard()
+            self._stale = False
+        self.stream.write(data)
+
+    def write_readline(self, data):
+        with self._lock:
+            self._write(data)
+            return self._readline(data)
+
+    def pipeline(self, requests):
+        """
+        Sends all requests back to back and then reads one reply per
+        request (replies come in the same order)
+        """
+        with self._lock:
+            self._write(b"".join(requests))
+            return [self._readline(request) for request in requests]
+
+    def write(self, data):
+        """Sends data without waiting for a reply"""
+        with self._lock:
+            self._write(data)
+
+    def flush(self):
+        """Discards any pending input"""
+        with self._lock:
+            self.reader.clear()
+            self.stream.reset_input_buffer()
+            self._stale = False
+
+    def close(self):
+        self.stream.close()
+
+
+def connect(url, eol=b"\r", tail=0, timeout=1.0, **kwargs):
+    """Opens a Connection to the given url"""
+    import serial
+
+    if url.startswith("tcp://"):
+        url = "socket://" + url[6:]
+    stream = serial.serial_for_url(url, timeout=timeout, **kwargs)
+    return Connection(stream, eol=eol, tail=tail, timeout=timeout)
+
+
+def connect_codec(url, codec, timeout=1.0, **kwargs):
+    """Opens a Connection framed according to the given protocol codec"""
+    return connect(
+        url, eol=codec.eol, tail=getattr(codec, "tail", 0), timeout=timeout, **kwargs
+    )
+
+
+class Disconnected(ConnectionError):
+    """Raised immediately by a `Supervisor` while its link is down"""
+
+
+class Supervisor:
+    """
+    Connection supervisor: reconnects a dropped line in the background.
+
+    factory: callable returning a new connection (object with
+             write_readline and close)
+    on_connect: callable called (from the reconnection thread) once a new
+                connection is established, before it is used by others.
+                Typically `Controller.restore`. If it fails the connection
+                is dropped and retried
+    max_timeouts: consecutive timeouts after which the link is considered
+                  dead (any other OSError drops it immediately)
+    backoff: (first, maximum) delay (s) between reconnection attempts. The
+             delay doubles on every failed attempt and is jittered by up
+             to `jitter` (fraction) to avoid synchronized retries
+
+    While the link is down every transaction fails immediately with
+    `Disconnected` instead of waiting for a timeout. Each supervisor has
+    its own thread so a bad line does not slow down the others.
+    """
+
+    def __init__(self, factory, on_connect=None, max_timeouts=2,
+                 backoff=(0.1, 30.0), jitter=0.5, seed=None, sleep=None):
+        self.factory = factory
+        self.on_connect = on_connect
+        self.max_timeouts = max_timeouts
+        self.backoff = backoff
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.conn = None
+        self.timeouts = 0
+        self.reconnections = 0
+        self.attempts = 0
+        self.last_error = None
+        self._restoring = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sleep = self._stop.wait if sleep is None else sleep
+        self._thread = None
+
+    @property
+    def connected(self):
+        return self.conn is not None
+
+    def delay(self, attempt):
+        """Jittered exponential backoff delay (s) before the given attempt"""
+        first, maximum = self.backoff
+        delay = min(maximum, first * 2 ** attempt)
+        return delay * (1 - self.jitter * self.random.random())
+
+    def start(self):
+        """Starts connecting in the background (non blocking)"""
+        with self._lock:
+            if self._stop.is_set() or self.conn is not None:
+                return
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def wait_connected(self, timeout=None):
+        """Waits until connected. Returns the connected state"""
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        return self.connected
+
+    def _run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            self.attempts += 1
+            try:
+                conn = self.factory()
+            except Exception as error:
+                self.last_error = error
+            else:
+                if self._restore(conn):
+                    self.reconnections += 1
+                    return
+            if self._sleep(self.delay(attempt)):
+                return
+            attempt += 1
+
+    def _restore(self, conn):
+        self._restoring = conn
+        try:
+            if self.on_connect is not None:
+                self.on_connect()
+        except Exception as error:
+            self.last_error = error
+            self._close(conn)
+            return False
+        finally:
+            self._restoring = None
+        self.timeouts = 0
+        self.conn = conn
+        return True
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def drop(self, error=None):
+        """Closes the current connection and starts reconnecting"""
+        with self._lock:
+            conn, self.conn = self.conn, None
+        if conn is not None:
+            self.last_error = error
+            self._close(conn)
+        self.start()
+
+    def _call(self, method, *args):
+        restoring = self._restoring is not None and (
+            self._thread is threading.current_thread()
+        )
+        conn = self._restoring if restoring else self.conn
+        if conn is None:
+            raise Disconnected("link down ({!r})".format(self.last_error))
+        try:
+            result = getattr(conn, method)(*args)
+        except TimeoutError as error:
+            if not restoring:
+                self.timeouts += 1
+                if self.timeouts >= self.max_timeouts:
+                    self.drop(error)
+            raise
+        except OSError as error:
+            if not restoring:
+                self.drop(error)
+            raise
+        self.timeouts = 0
+        return result
+
+    def write_readline(self, data):
+        return self._call("write_readline", data)
+
+    def pipeline(self, requests):
+        return self._call("pipeline", requests)
+
+    def write(self, data):
+        return self._call("write", data)
+
+    def flush(self):
+        return self._call("flush")
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        with self._lock:
+            conn, self.conn = self.conn, None
+        if conn is not None:
+            self._close(conn)
@@ -0,0 +1,304 @@
+"""
+Generic controller helpers
+
+Descriptors and base classes that expose the parameters of a command table
+(see `vazio.protocol.table`) as python attributes. Subclasses only declare
+the `table` and the `channel` (or `channels`) they represent; descriptors
+for every parameter available there are generated when the class is
+created. Attributes defined explicitly in the class body are left untouched.
+
+Several writes can be sent back to back through a `Pipeline`: replies
+are read afterwards and matched to their write (in order).
+
+Reads go through the controller `prefetcher` when one is attached (see
+`vazio.prefetch.Prefetcher`).
+"""
+
+import concurrent.futures
+
+from .acquisition import split_path
+from .protocol.table import EXEC, ProtocolError, ReplyMismatch
+
+
+class Value:
+    """Descriptor for a table parameter"""
+
+    def __init__(self, name, doc=None):
+        self.name = name
+        self.__doc__ = doc
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return obj.ctrl._read(self.name, obj.channel)
+
+    def __set__(self, obj, value):
+        if obj.ctrl.asynchronous:
+            raise TypeError(
+                "cannot assign {!r} of an asyncio controller: use "
+                "'await set({!r}, value)'".format(self.name, self.name)
+            )
+        obj.ctrl._write(self.name, obj.channel, value)
+
+
+class Action:
+    """Descriptor for a table action (a command without data)"""
+
+    def __init__(self, name, doc=None):
+        self.name = name
+        self.__doc__ = doc
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return lambda: obj.ctrl._execute(self.name, obj.channel)
+
+
+def expose(cls, table, channels):
+    """Adds descriptors for the table parameters common to all channels"""
+    if table is None or not channels:
+        return
+    for param in table:
+        if not all(channel in param.channels for channel in channels):
+            continue
+        if param.name in cls.__dict__:
+            continue
+        klass = Action if param.access == EXEC else Value
+        setattr(cls, param.name, klass(param.name, param.doc))
+
+
+class BaseChannel:
+
+    table = None
+    channels = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        expose(cls, cls.table, cls.channels)
+
+    def __init__(self, channel, ctrl=None):
+        self.channel = channel
+        self.ctrl = ctrl
+
+    def __get__(self, ctrl, owner=None):
+        if ctrl is None:
+            return self
+        ch = ctrl._channels.get(self.channel)
+        if ch is None:
+            ch = type(self)(self.channel, ctrl)
+            ctrl._channels[self.channel] = ch
+        return ch
+
+    def get(self, name):
+        return self.ctrl._read(name, self.channel)
+
+    def set(self, name, value):
+        return self.ctrl._write(name, self.channel, value)
+
+
+class WriteErrors(Exception):
+    """Pipelined writes which failed. errors: [(path, value, exception)]"""
+
+    @property
+    def errors(self):
+        return self.args[0]
+
+
+class Pipeline:
+    """
+    Writes sent back to back in a single burst
+
+    `set` validates and queues a write and returns a
+    `concurrent.futures.Future` which is resolved by `flush` once the
+    reply matching that write is read: its exception is the error reply
+    (ex: `vazio.protocol.multigauge.OutOfRange`) for that specific write.
+    Leaving the context flushes and raises `WriteErrors` if any write
+    failed (if the block raises, nothing is sent).
+
+    The connection should provide pipeline(requests) (see
+    `vazio.connection.Connection`); otherwise writes are done one by one.
+    """
+
+    def __init__(self, ctrl):
+        self.ctrl = ctrl
+        self.pending = []
+
+    def set(self, path, value):
+        ctrl = self.ctrl
+        channel, name = split_path(path)
+        channel = getattr(ctrl, channel).channel if channel else ctrl.channel
+        request = ctrl.table.request(name, channel, value, ctrl.codec)
+        future = concurrent.futures.Future()
+        future.path, future.value = path, value
+        self.pending.append((request, future))
+        return future
+
+    def _take(self):
+        pending, self.pending = self.pending, []
+        if pending and self.ctrl.prefetcher is not None:
+            self.ctrl.prefetcher.clear()
+        return pending
+
+    def _send(self, requests):
+        self.ctrl._prepare_write()
+        conn = self.ctrl.conn
+        pipeline = getattr(conn, "pipeline", None)
+        if pipeline is None:
+            return [conn.write_readline(request) for request in requests]
+        return pipeline(requests)
+
+    def _resolve(self, pending, replies=None, error=None):
+        """Resolves the futures from the replies (or the transport error)"""
+        for index, (request, future) in enumerate(pending):
+            if error is not None:
+                future.set_exception(error)
+                continue
+            try:
+                self.ctrl.codec.data(replies[index], request)
+            except ProtocolError as reply_error:
+                future.set_exception(reply_error)
+            else:
+                future.set_result(None)
+        return [future for _, future in pending]
+
+    @staticmethod
+    def _mismatch(futures):
+        """True if a reply did not belong to its write"""
+        return any(isinstance(f.exception(), ReplyMismatch) for f in futures)
+
+    @staticmethod
+    def _check(futures):
+        errors = [
+            (future.path, future.value, future.exception())
+            for future in futures
+            if future.exception() is not None
+        ]
+        if errors:
+            raise WriteErrors(errors)
+
+    def flush(self):
+        """Sends pending writes and matches replies. Returns their futures"""
+        pending = self._take()
+        if not pending:
+            return []
+        try:
+            replies = self._send([request for request, _ in pending])
+        except Exception as error:
+            return self._resolve(pending, error=error)
+        futures = self._resolve(pending, replies)
+        if self._mismatch(futures):
+            self.ctrl._resync()
+        return futures
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is not None:
+            # nothing is sent if the block fails
+            self.pending = []
+            return
+        self._check(self.flush())
+
+
+class Controller:
+    """
+    Base controller
+
+    conn: any object with write_readline (should be configured with the
+          protocol terminator)
+    """
+
+    table = None
+    channel = None
+    codec = None
+    prefetcher = None
+    # reads and writes are coroutines (see `vazio.aio.AsyncController`)
+    asynchronous = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        expose(cls, cls.table, (cls.channel,))
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._channels = {}
+        if self.codec is None:
+            self.codec = self.table.codec
+        self._queries = self.table.queries(self.codec)
+        # parameters written again by restore()
+        self.config = {}
+
+    @property
+    def ctrl(self):
+        return self
+
+    def get(self, name):
+        return self._read(name, self.channel)
+
+    def set(self, name, value):
+        return self._write(name, self.channel, value)
+
+    def pipeline(self):
+        return Pipeline(self)
+
+    def set_many(self, values):
+        """
+        Writes several values in a single burst.
+        values: sequence of (path, value) or dict {path: value}
+        """
+        if isinstance(values, dict):
+            values = values.items()
+        with self.pipeline() as pipeline:
+            for path, value in values:
+                pipeline.set(path, value)
+
+    def configure(self, **config):
+        """Writes controller parameters and remembers them (see restore)"""
+        self.config.update(config)
+        self.set_many(config)
+
+    def restore(self):
+        """Writes the remembered configuration again (ex: after a reconnection)"""
+        self.set_many(self.config)
+
+    def _read(self, name, channel):
+        if self.prefetcher is not None:
+            return self.prefetcher.read(name, channel)
+        return self._query(name, channel)
+
+    def _data(self, reply, request):
+        """Reply data (see the codec data)"""
+        try:
+            return self.codec.data(reply, request)
+        except ReplyMismatch:
+            self._resync()
+            raise
+
+    def _resync(self):
+        """
+        Discards the pending input after a reply to another request (the
+        reply to the request is late as well)
+        """
+        flush = getattr(self.conn, "flush", None)
+        if flush is not None:
+            flush()
+
+    def _query(self, name, channel):
+        request = self._queries[name, channel]
+        reply = self.conn.write_readline(request)
+        return self.table[name, channel].decode(self._data(reply, request))
+
+    def _prepare_write(self):
+        """Called before every write (ex: to set the reply mode up)"""
+
+    def _write(self, name, channel, value):
+        if self.prefetcher is not None:
+            self.prefetcher.clear()
+        request = self.table.request(name, channel, value, self.codec)
+        self._prepare_write()
+        self._data(self.conn.write_readline(request), request)
+
+    def _execute(self, name, channel):
+        request = self._queries[name, channel]
+        return self._data(self.conn.write_readline(request), request)
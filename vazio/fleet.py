@@ -0,0 +1,206 @@
+"""
+Controller fleet
+
+A `Fleet` holds many controllers, each on its own line, and runs the same
+set of queries on all of them concurrently on a bounded thread pool. A
+sweep takes about the time of the slowest controller instead of the sum
+of all of them:
+
+    fleet = Fleet.from_specs(["dual1=variandual:tcp://moxa:4001", ...])
+    for result in fleet.as_completed(["hv1.pressure", "hv1.high_voltage"]):
+        print(result.controller, result.values, result.errors)
+    print(fleet.table(["hv1.pressure", "hv2.pressure"]))
+
+Every controller gets at most `timeout` seconds (counted from the moment
+a worker starts on it) for all its queries; past that its result is
+reported with a `TimeoutError` for the quantities not read yet. The worker
+itself cannot be interrupted: it finishes in the background and the
+controller is skipped (reported busy) until then, so that two sweeps never
+share a line.
+"""
+
+import time
+import operator
+import threading
+import collections
+import concurrent.futures
+
+
+class Result(
+    collections.namedtuple("Result", "controller values errors elapsed")
+):
+    """
+    Queries of one controller
+
+    values: {path: value} of the successful queries
+    errors: {path: exception} of the failed ones
+    elapsed: time (s) spent on the controller
+    """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+class Table(collections.namedtuple("Table", "controllers quantities rows")):
+    """Sweep results. rows: one list per controller (exception if failed)"""
+
+    __slots__ = ()
+
+    def __str__(self):
+        width = max([len(name) for name in self.controllers] + [10])
+        cols = [max(len(q), 14) for q in self.quantities]
+        lines = [
+            " ".join(
+                ["{:<{}}".format("controller", width)]
+                + ["{:>{}}".format(q, w) for q, w in zip(self.quantities, cols)]
+            )
+        ]
+        for name, row in zip(self.controllers, self.rows):
+            cells = [
+                "<{}>".format(type(v).__name__) if isinstance(v, Exception)
+                else getattr(v, "name", v)
+                for v in row
+            ]
+            lines.append(
+                " ".join(
+                    ["{:<{}}".format(name, width)]
+                    + ["{:>{}}".format(str(c), w) for c, w in zip(cells, cols)]
+                )
+            )
+        return "\n".join(lines)
+
+
+class Fleet:
+    """
+    controllers: {name: controller}
+    workers: maximum number of controllers queried in parallel
+    timeout: default time (s) given to every controller (None: no limit)
+    """
+
+    def __init__(self, controllers=(), workers=16, timeout=None):
+        self.controllers = dict(controllers)
+        self.timeout = timeout
+        self._locks = {name: threading.Lock() for name in self.controllers}
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="Fleet"
+        )
+
+    @classmethod
+    def from_specs(cls, specs, workers=16, timeout=None, line_timeout=1.0):
+        """
+        Fleet from controller specifications (see `vazio.cli.parse_spec`),
+        each one on its own connection
+        """
+        from .cli import parse_spec, create_controller
+
+        controllers = {}
+        for spec in specs:
+            name, kind, address, url = parse_spec(spec)
+            controllers[name] = create_controller(kind, url, address, line_timeout)
+        return cls(controllers, workers, timeout)
+
+    def __len__(self):
+        return len(self.controllers)
+
+    def __iter__(self):
+        return iter(self.controllers)
+
+    def __getitem__(self, name):
+        return self.controllers[name]
+
+    def add(self, name, ctrl):
+        self.controllers[name] = ctrl
+        self._locks[name] = threading.Lock()
+
+    def _run(self, name, getters, state):
+        ctrl, lock = self.controllers[name], self._locks[name]
+        state["start"] = time.monotonic()
+        if not lock.acquire(blocking=False):
+            raise TimeoutError("{} still busy with a previous sweep".format(name))
+        try:
+            for path, getter in getters:
+                if state.get("abandoned"):
+                    break
+                try:
+                    state["values"][path] = getter(ctrl)
+                except Exception as error:
+                    state["errors"][path] = error
+        finally:
+            lock.release()
+
+    def _result(self, name, state, error=None):
+        values, errors = dict(state["values"]), dict(state["errors"])
+        if error is not None:
+            for path in state["paths"]:
+                if path not in values and path not in errors:
+                    errors[path] = error
+        start = state.get("start")
+        elapsed = 0.0 if start is None else time.monotonic() - start
+        return Result(name, values, errors, elapsed)
+
+    def as_completed(self, quantities, timeout=None, names=None):
+        """
+        Runs the queries (attribute paths) on every controller (or on the
+        given names). Yields a `Result` per controller as soon as it is
+        complete or timed out
+        """
+        timeout = self.timeout if timeout is None else timeout
+        getters = [(path, operator.attrgetter(path)) for path in quantities]
+        names = list(self.controllers) if names is None else list(names)
+        pending = {}
+        for name in names:
+            state = dict(values={}, errors={}, paths=[p for p, _ in getters])
+            future = self._pool.submit(self._run, name, getters, state)
+            pending[future] = name, state
+        while pending:
+            wait = None
+            if timeout is not None:
+                now = time.monotonic()
+                starts = [s["start"] for _, s in pending.values() if "start" in s]
+                # next deadline, or poll until the queued ones start
+                wait = min(starts) + timeout - now if starts else 0.01
+            done, _ = concurrent.futures.wait(
+                pending, max(wait, 0) if wait is not None else None,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                name, state = pending.pop(future)
+                yield self._result(name, state, future.exception())
+            if timeout is None:
+                continue
+            now = time.monotonic()
+            for future, (name, state) in list(pending.items()):
+                start = state.get("start")
+                if start is not None and now - start >= timeout:
+                    del pending[future]
+                    state["abandoned"] = True
+                    error = TimeoutError(
+                        "{} did not answer within {}s".format(name, timeout)
+                    )
+                    yield self._result(name, state, error)
+
+    def query(self, quantities, timeout=None, names=None):
+        """{name: Result} (in fleet order) once every controller is done"""
+        results = self.as_completed(quantities, timeout, names)
+        results = {result.controller: result for result in results}
+        names = list(self.controllers) if names is None else list(names)
+        return {name: results[name] for name in names}
+
+    def table(self, quantities, timeout=None, names=None):
+        """Sweep results as a `Table` (str() gives a text table)"""
+        quantities = tuple(quantities)
+        results = self.query(quantities, timeout, names)
+        rows = [
+            [
+                result.values[q] if q in result.values else result.errors[q]
+                for q in quantities
+            ]
+            for result in results.values()
+        ]
+        return Table(tuple(results), quantities, rows)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,428 @@
+"""
+WebSocket live stream gateway
+
+`Gateway` subscribes once to an `vazio.acquisition.Acquisition` and fans
+its readings out to any number of WebSocket clients (RFC 6455, served
+with asyncio streams only):
+
+    gateway = Gateway(acquisition, port=8765)
+    await gateway.start()
+
+    # browser
+    ws = new WebSocket("ws://localhost:8765/?format=json&rate=4")
+
+Every client receives deltas: the first message has the latest value of
+every quantity and the following ones only the quantities whose value
+changed. Messages are sent at most `rate` times per second per client
+(the client may ask for less with the rate query parameter); readings
+arriving in between are coalesced, so a client never queues more than
+one value per quantity.
+
+The acquisition is never slowed down by the clients: its listener only
+hands the readings over to the event loop. A client which does not read
+fast enough (more than `max_buffer` bytes waiting to be sent, or a send
+not completed within `send_timeout`) is dropped.
+
+Formats (format query parameter):
+
+* json: text messages {controller: {path: [value, timestamp]}} where
+  value is a number, an enum name, or null for a failed read (then a
+  third item has the error type)
+* binary: a first binary message with the header of
+  `vazio.cli.BinaryFormat` (magic, JSON line with the controllers and
+  quantities) followed by messages of fixed size records (timestamp,
+  controller index, quantity index, value; NaN for errors)
+"""
+
+import enum
+import json
+import math
+import time
+import base64
+import struct
+import asyncio
+import hashlib
+import logging
+import urllib.parse
+
+from .cli import BinaryFormat, Format
+
+
+GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# opcodes
+TEXT, BINARY, CLOSE, PING, PONG = 0x1, 0x2, 0x8, 0x9, 0xA
+# close codes
+MESSAGE_TOO_BIG = 1009
+
+
+class FrameTooLarge(ValueError):
+    """Frame payload above the accepted size"""
+
+
+def accept_key(key):
+    """Sec-WebSocket-Accept value for a Sec-WebSocket-Key"""
+    return base64.b64encode(hashlib.sha1(key.encode() + GUID).digest()).decode()
+
+
+def encode_frame(opcode, payload, mask=None):
+    """Single (final) frame. mask: 4 bytes (clients must mask)"""
+    size = len(payload)
+    header = bytearray([0x80 | opcode])
+    bit = 0x80 if mask else 0
+    if size < 126:
+        header.append(bit | size)
+    elif size < 1 << 16:
+        header.append(bit | 126)
+        header += struct.pack(">H", size)
+    else:
+        header.append(bit | 127)
+        header += struct.pack(">Q", size)
+    if mask:
+        header += mask
+        payload = _mask(payload, mask)
+    return bytes(header) + payload
+
+
+def _mask(payload, mask):
+    size = len(payload)
+    data = int.from_bytes(payload, "big")
+    key = int.from_bytes((mask * (size // 4 + 1))[:size], "big")
+    return (data ^ key).to_bytes(size, "big")
+
+
+async def read_frame(reader, max_size=None):
+    """
+    (opcode, payload) of the next frame (fragments are not supported).
+    Raises FrameTooLarge for a payload above max_size bytes (None: no limit)
+    """
+    first, second = await reader.readexactly(2)
+    size = second & 0x7F
+    if size == 126:
+        size = struct.unpack(">H", await reader.readexactly(2))[0]
+    elif size == 127:
+        size = struct.unpack(">Q", await reader.readexactly(8))[0]
+    if max_size is not None and size > max_size:
+        raise FrameTooLarge("frame of {} bytes (max {})".format(size, max_size))
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(size)
+    if mask:
+        payload = _mask(payload, mask)
+    return first & 0x0F, payload
+
+
+def _json_value(reading):
+    if not reading.valid:
+        return [None, reading.timestamp, type(reading.error).__name__]
+    value = reading.value
+    if isinstance(value, enum.Enum):
+        value = value.name
+    elif isinstance(value, float) and not math.isfinite(value):
+        value = None
+    return [value, reading.timestamp]
+
+
+class JSONFormat(Format):
+
+    opcode = TEXT
+
+    def header(self):
+        return None
+
+    def encode(self, readings):
+        message = {}
+        for r in readings:
+            message.setdefault(r.controller, {})[r.path] = _json_value(r)
+        return json.dumps(message, separators=(",", ":")).encode()
+
+
+class BinaryStream(BinaryFormat):
+
+    opcode = BINARY
+
+
+FORMATS = {"json": JSONFormat, "binary": BinaryStream}
+
+
+class Client:
+    """Server side state of a connected client"""
+
+    def __init__(self, writer, fmt, interval):
+        self.writer = writer
+        self.fmt = fmt
+        self.interval = interval
+        self.pending = {}
+        self.sent = {}
+        self.ready = asyncio.Event()
+        self.messages = 0
+        self.last = -math.inf
+        self.closed = False
+
+    def push(self, readings):
+        pending = self.pending
+        for reading in readings:
+            pending[reading.controller, reading.path] = reading
+        self.ready.set()
+
+    def delta(self):
+        """Pending readings which changed since last sent"""
+        pending, self.pending = self.pending, {}
+        delta = []
+        for key, reading in pending.items():
+            state = reading.valid, reading.value
+            if self.sent.get(key) != state:
+                self.sent[key] = state
+                delta.append(reading)
+        return delta
+
+
+class Gateway:
+    """
+    acquisition: source `vazio.acquisition.Acquisition`
+    rate: maximum messages per second per client
+    max_buffer: bytes waiting to be sent above which a client is dropped
+    send_timeout: time (s) a send may wait for a client before dropping it
+    max_frame: largest frame (bytes) accepted from a client (clients only
+               send control frames); a client sending a larger one is closed
+    """
+
+    def __init__(self, acquisition, host="127.0.0.1", port=8765, rate=10.0,
+                 max_buffer=1 << 20, send_timeout=1.0, max_frame=4096):
+        self.acquisition = acquisition
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.max_buffer = max_buffer
+        self.send_timeout = send_timeout
+        self.max_frame = max_frame
+        self.clients = set()
+        # connection handler tasks: writer
+        self._handlers = {}
+        self.dropped = 0
+        self.server = None
+        self._loop = None
+        self._log = logging.getLogger(type(self).__name__)
+        names = list(acquisition.controllers)
+        self._quantities = {name: acquisition.quantities for name in names}
+
+    @property
+    def url(self):
+        return "ws://{}:{}/".format(self.host, self.port)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.acquisition.subscribe(self.update)
+        return self
+
+    async def stop(self):
+        self.acquisition.unsubscribe(self.update)
+        self.server.close()
+        for client in list(self.clients):
+            self._close(client)
+        # connections still in the handshake
+        for writer in self._handlers.values():
+            writer.transport.abort()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    def update(self, readings):
+        """Acquisition listener (any thread): never blocks"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._dispatch, readings)
+
+    def _dispatch(self, readings):
+        for client in self.clients:
+            client.push(readings)
+
+    def _options(self, target):
+        """(format class, rate) from the request query string"""
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(target).query)
+        params = {name: values[-1] for name, values in query.items()}
+        kind = FORMATS[params.get("format", "json")]
+        rate = float(params.get("rate", self.rate))
+        if not 0 < rate < math.inf:
+            raise ValueError("invalid rate {!r}".format(params["rate"]))
+        return kind, min(rate, self.rate)
+
+    async def _handshake(self, reader, writer):
+        """Returns (format class, rate), or None if the upgrade is refused"""
+        request = await reader.readuntil(b"\r\n\r\n")
+        lines = request.decode("latin-1").split("\r\n")
+        words = lines[0].split(" ")
+        target = words[1] if len(words) > 2 else "/"
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if headers.get("upgrade", "").lower() != "websocket" or not key:
+            writer.write(
+                b"HTTP/1.1 426 Upgrade Required\r\nUpgrade: websocket\r\n"
+                b"Content-Length: 0\r\nConnection: close\r\n\r\n"
+            )
+            return None
+        try:
+            options = self._options(target)
+        except (KeyError, ValueError):
+            writer.write(
+                b"HTTP/1.1 400 Bad Request\r\n"
+                b"Content-Length: 0\r\nConnection: close\r\n\r\n"
+            )
+            return None
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+            "Connection: Upgrade\r\nSec-WebSocket-Accept: {}\r\n\r\n".format(
+                accept_key(key)
+            ).encode()
+        )
+        return options
+
+    async def _serve(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers[task] = writer
+        try:
+            await self._connection(reader, writer)
+        finally:
+            del self._handlers[task]
+
+    async def _connection(self, reader, writer):
+        try:
+            options = await self._handshake(reader, writer)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            options = None
+        if options is None:
+            writer.close()
+            return
+        kind, rate = options
+        fmt = kind(list(self._quantities), self._quantities)
+        client = Client(writer, fmt, 1 / rate)
+        header = fmt.header()
+        if header:
+            writer.write(encode_frame(fmt.opcode, header))
+        # first message: snapshot (copy: the acquisition thread updates it)
+        client.push(self.acquisition.latest.copy().values())
+        self.clients.add(client)
+        sender = asyncio.ensure_future(self._send(client))
+        try:
+            await self._receive(client, reader)
+        finally:
+            sender.cancel()
+            self._close(client)
+            await asyncio.gather(sender, return_exceptions=True)
+
+    async def _receive(self, client, reader):
+        """Answers pings and closes. Other client messages are ignored"""
+        while not client.closed:
+            try:
+                opcode, payload = await read_frame(reader, self.max_frame)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            except FrameTooLarge:
+                self._log.info("closing %s: frame too large", self._peer(client))
+                client.writer.write(
+                    encode_frame(CLOSE, struct.pack(">H", MESSAGE_TOO_BIG))
+                )
+                return
+            if opcode == CLOSE:
+                client.writer.write(encode_frame(CLOSE, payload[:2]))
+                return
+            if opcode == PING:
+                client.writer.write(encode_frame(PONG, payload))
+
+    async def _send(self, client):
+        writer = client.writer
+        while not client.closed:
+            await client.ready.wait()
+            wait = client.last + client.interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            client.ready.clear()
+            delta = client.delta()
+            if not delta:
+                continue
+            writer.write(encode_frame(client.fmt.opcode, client.fmt.encode(delta)))
+            client.last = time.monotonic()
+            client.messages += 1
+            try:
+                if writer.transport.get_write_buffer_size() > self.max_buffer:
+                    raise asyncio.TimeoutError
+                await asyncio.wait_for(writer.drain(), self.send_timeout)
+            except (asyncio.TimeoutError, ConnectionError):
+                self._log.info("dropping slow client %s", self._peer(client))
+                self.dropped += 1
+                self._close(client)
+
+    @staticmethod
+    def _peer(client):
+        return client.writer.get_extra_info("peername")
+
+    def _close(self, client):
+        if client.closed:
+            return
+        client.closed = True
+        client.ready.set()
+        self.clients.discard(client)
+        client.writer.transport.abort()
+
+    def stats(self):
+        return dict(
+            clients=len(self.clients),
+            dropped=self.dropped,
+            messages=sum(client.messages for client in self.clients),
+        )
+
+
+class WebSocket:
+    """Minimal WebSocket client (tests and scripts)"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, url):
+        parsed = urllib.parse.urlparse(url)
+        reader, writer = await asyncio.open_connection(parsed.hostname, parsed.port)
+        key = base64.b64encode(hashlib.sha1(url.encode()).digest()[:16]).decode()
+        target = (parsed.path or "/") + ("?" + parsed.query if parsed.query else "")
+        writer.write(
+            "GET {} HTTP/1.1\r\nHost: {}\r\nUpgrade: websocket\r\n"
+            "Connection: Upgrade\r\nSec-WebSocket-Key: {}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n".format(
+                target, parsed.netloc, key
+            ).encode()
+        )
+        response = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        if " 101 " not in response.split("\r\n")[0]:
+            writer.close()
+            raise ConnectionError(response.split("\r\n")[0])
+        if accept_key(key) not in response:
+            writer.close()
+            raise ConnectionError("invalid Sec-WebSocket-Accept")
+        return cls(reader, writer)
+
+    async def recv(self):
+        """Next message (str for text, bytes for binary)"""
+        while True:
+            opcode, payload = await read_frame(self.reader)
+            if opcode == TEXT:
+                return payload.decode()
+            if opcode == BINARY:
+                return payload
+            if opcode == CLOSE:
+                raise ConnectionError("closed by server")
+
+    def send(self, opcode, payload):
+        self.writer.write(encode_frame(opcode, payload, mask=b"\x01\x02\x03\x04"))
+
+    async def close(self):
+        self.send(CLOSE, struct.pack(">H", 1000))
+        try:
+            await asyncio.wait_for(self.recv(), 1)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        self.writer.close()
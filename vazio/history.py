@@ -0,0 +1,249 @@
+"""
+Sample history and trend export
+
+`History` stores the acquired samples of numeric quantities in growable
+NumPy arrays (one `Series` per controller quantity) and exports a visually
+faithful downsample for a time range and a pixel budget:
+
+* "minmax": min/max envelope per pixel (2 points per pixel)
+* "lttb": largest triangle three buckets (1 point per pixel). Pressures
+  are compared in log scale.
+
+To answer in milliseconds whatever the zoom, each series keeps a pyramid
+of min/max envelope levels (level k summarizes `factor**k` raw samples per
+bucket). Levels are extended incrementally, only for complete buckets, the
+first time they are needed after new samples arrive. An export only looks
+at the coarsest level that still has enough buckets for the pixel budget.
+
+Requires numpy.
+"""
+
+import numpy
+
+from .acquisition import split_path
+
+
+QUANTITIES = "pressure", "current", "voltage"
+
+# level columns
+START, TLO, LO, THI, HI = range(5)
+
+
+class Buffer:
+    """Growable 2D float array (amortized O(1) append)"""
+
+    def __init__(self, columns, capacity=1024):
+        self.data = numpy.empty((capacity, columns))
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def reserve(self, size):
+        if size > len(self.data):
+            data = numpy.empty((max(size, 2 * len(self.data)), self.data.shape[1]))
+            data[: self.size] = self.data[: self.size]
+            self.data = data
+
+    def append(self, row):
+        self.reserve(self.size + 1)
+        self.data[self.size] = row
+        self.size += 1
+
+    def extend(self, rows):
+        rows = numpy.asarray(rows, dtype=float)
+        self.reserve(self.size + len(rows))
+        self.data[self.size: self.size + len(rows)] = rows
+        self.size += len(rows)
+
+    @property
+    def array(self):
+        return self.data[: self.size]
+
+
+def envelope(start, tlo, lo, thi, hi, factor):
+    """Reduces complete groups of `factor` consecutive buckets into one"""
+    n = len(lo) // factor * factor
+    shape = (-1, factor)
+    lo, hi = lo[:n].reshape(shape), hi[:n].reshape(shape)
+    tlo, thi = tlo[:n].reshape(shape), thi[:n].reshape(shape)
+    rows = numpy.arange(len(lo))
+    ilo, ihi = lo.argmin(axis=1), hi.argmax(axis=1)
+    return numpy.column_stack(
+        (
+            start[:n:factor],
+            tlo[rows, ilo],
+            lo[rows, ilo],
+            thi[rows, ihi],
+            hi[rows, ihi],
+        )
+    )
+
+
+def group_envelope(group, tlo, lo, thi, hi):
+    """min/max (with their times) of buckets sharing the same group index"""
+    starts = numpy.flatnonzero(numpy.r_[True, group[1:] != group[:-1]])
+    # first of each group after sorting by (group, value)
+    order = numpy.lexsort((lo, group))
+    first = order[numpy.searchsorted(group[order], group[starts])]
+    order = numpy.lexsort((-hi, group))
+    last = order[numpy.searchsorted(group[order], group[starts])]
+    return tlo[first], lo[first], thi[last], hi[last]
+
+
+def lttb(t, v, threshold, log=False):
+    """Largest triangle three buckets downsample to threshold points"""
+    n = len(t)
+    if threshold >= n or threshold < 3:
+        return t, v
+    y = numpy.log10(numpy.clip(v, 1e-300, None)) if log else v
+    edges = numpy.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = numpy.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            nlo, nhi = edges[i + 1], edges[i + 2]
+            cx, cy = t[nlo:nhi].mean(), y[nlo:nhi].mean()
+        else:
+            cx, cy = t[-1], y[-1]
+        ax, ay = t[a], y[a]
+        area = numpy.abs(
+            (ax - cx) * (y[lo:hi] - ay) - (ax - t[lo:hi]) * (cy - ay)
+        )
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return t[selected], v[selected]
+
+
+class Series:
+    """Samples (t, v) of one quantity plus its envelope pyramid"""
+
+    def __init__(self, factor=16, capacity=1024):
+        self.factor = factor
+        self.raw = Buffer(2, capacity)
+        self.levels = []
+
+    def __len__(self):
+        return len(self.raw)
+
+    def append(self, t, v):
+        self.raw.append((t, v))
+
+    def extend(self, t, v):
+        self.raw.extend(numpy.column_stack((t, v)))
+
+    @property
+    def t(self):
+        return self.raw.array[:, 0]
+
+    @property
+    def v(self):
+        return self.raw.array[:, 1]
+
+    def level(self, k):
+        """Envelope level k (k >= 1) as an array of [start, tlo, lo, thi, hi]"""
+        while len(self.levels) < k:
+            self.levels.append(Buffer(5, 64))
+        for i in range(k):
+            level = self.levels[i]
+            if i == 0:
+                t, v = self.t, self.v
+                source = (t, t, v, t, v)
+            else:
+                source = self.levels[i - 1].array.T
+            done = len(level) * self.factor
+            if len(source[0]) - done >= self.factor:
+                level.extend(
+                    envelope(*(column[done:] for column in source), self.factor)
+                )
+        return self.levels[k - 1].array
+
+    def export(self, start, stop, pixels, method="minmax", log=False):
+        """Downsampled (t, v) arrays for the time range [start, stop]"""
+        t = self.t
+        i0 = numpy.searchsorted(t, start, side="left")
+        i1 = numpy.searchsorted(t, stop, side="right")
+        count = i1 - i0
+        if count <= 2 * pixels:
+            return t[i0:i1].copy(), self.v[i0:i1].copy()
+        # coarsest level with at least 4 buckets per pixel
+        k, size = 0, 1
+        while count // (size * self.factor) >= 4 * pixels:
+            k, size = k + 1, size * self.factor
+        if k:
+            level = self.level(k)
+            # complete buckets inside the range; raw samples at both ends
+            b0, b1 = -(-i0 // size), min(i1 // size, len(level))
+            buckets = level[b0:b1]
+            raw = numpy.r_[numpy.arange(i0, b0 * size), numpy.arange(b1 * size, i1)]
+            rt, rv = t[raw], self.v[raw]
+            cols = [numpy.r_[buckets[:, c], x] for c, x in
+                    zip((START, TLO, LO, THI, HI), (rt, rt, rv, rt, rv))]
+            order = numpy.argsort(cols[START], kind="stable")
+            bstart, tlo, lo, thi, hi = (c[order] for c in cols)
+        else:
+            bstart = tlo = thi = t[i0:i1]
+            lo = hi = self.v[i0:i1]
+        if method == "lttb":
+            points_t = numpy.r_[tlo, thi]
+            order = numpy.argsort(points_t, kind="stable")
+            points_v = numpy.r_[lo, hi][order]
+            return lttb(points_t[order], points_v, pixels, log=log)
+        span = (stop - start) or 1
+        group = ((bstart - start) * pixels // span).clip(0, pixels - 1).astype(int)
+        tlo, lo, thi, hi = group_envelope(group, tlo, lo, thi, hi)
+        points_t = numpy.column_stack((tlo, thi))
+        points_v = numpy.column_stack((lo, hi))
+        swap = thi < tlo
+        points_t[swap] = points_t[swap][:, ::-1]
+        points_v[swap] = points_v[swap][:, ::-1]
+        return points_t.ravel(), points_v.ravel()
+
+
+class History:
+    """
+    Acquisition listener storing the samples of numeric quantities
+
+    quantities: quantity names to store (ex: pressure matches hv1.pressure
+                and gauge1.pressure)
+    """
+
+    def __init__(self, acquisition=None, quantities=QUANTITIES, factor=16):
+        self.quantities = set(quantities)
+        self.factor = factor
+        self.series = {}
+        if acquisition is not None:
+            acquisition.subscribe(self.update)
+
+    def get(self, controller, path):
+        key = controller, path
+        series = self.series.get(key)
+        if series is None:
+            series = Series(self.factor)
+            self.series[key] = series
+        return series
+
+    def update(self, readings):
+        for reading in readings:
+            if not reading.valid:
+                continue
+            if split_path(reading.path)[1] not in self.quantities:
+                continue
+            value = reading.value
+            self.get(reading.controller, reading.path).append(
+                reading.timestamp, float(getattr(value, "value", value))
+            )
+
+    def export(self, controller, path, start, stop, pixels, method="minmax"):
+        """
+        Downsampled (t, v) arrays of a quantity for the time range
+        [start, stop] fitting a budget of `pixels` horizontal pixels
+        """
+        series = self.series.get((controller, path))
+        if series is None:
+            empty = numpy.empty(0)
+            return empty, empty
+        log = split_path(path)[1] == "pressure"
+        return series.export(start, stop, pixels, method=method, log=log)
@@ -0,0 +1,114 @@
+"""
+In-process loopback transport
+
+A `Loopback` is a connection (write_readline, pipeline, write, flush)
+whose requests are processed directly by a simulated instrument state
+machine (see `vazio.simulator.engine`): no sockets, ptys or sinstruments.
+
+    ctrl = VarianDual(variandual(ack=True))
+    ctrl.hv1.pressure
+
+Line timing is modeled with a `vazio.simulator.bus.Bus` (baud rate,
+bits per character and turnaround). By default it is only accounted
+(see `Loopback.bus.stats()`); with `realtime=True` each transaction also
+takes that time.
+"""
+
+import math
+import functools
+
+from .simulator.bus import Bus
+from .simulator.engine import agilent as _agilent, mks as _mks
+from .simulator.engine import variandual as _variandual
+from .protocol import agilent as agilent_protocol, mks as mks_protocol
+from .variandual import SerialProperty
+
+
+class Loopback:
+    """
+    handler: callable(request) -> reply (None when the instrument does
+             not answer)
+    eol, tail: reply framing (see `vazio.connection.Connection`)
+    baudrate: line speed (bits/s). None means infinitely fast
+    turnaround: time (s) the instrument takes to start answering
+    """
+
+    def __init__(self, handler, eol=b"\r", tail=0, baudrate=None, bits=10,
+                 turnaround=0.0, realtime=False, **kwargs):
+        self.eol = eol
+        self.tail = tail
+        self.input = bytearray()
+        self.bus = Bus(
+            lambda request: None,
+            baudrate=math.inf if baudrate is None else baudrate,
+            bits=bits,
+            turnaround=turnaround,
+            realtime=realtime,
+            **kwargs
+        )
+        self.bus.add(None, handler)
+
+    def _send(self, data):
+        reply = self.bus.handle(data)
+        if reply is not None:
+            self.input += reply
+
+    def _readline(self, request):
+        index = self.input.find(self.eol)
+        end = index + len(self.eol) + self.tail
+        if index < 0 or end > len(self.input):
+            raise TimeoutError("timeout waiting for reply to {!r}".format(request))
+        reply = bytes(self.input[:end])
+        del self.input[:end]
+        return reply
+
+    def write_readline(self, data):
+        self._send(data)
+        return self._readline(data)
+
+    def pipeline(self, requests):
+        for request in requests:
+            self._send(request)
+        return [self._readline(request) for request in requests]
+
+    def write(self, data):
+        self._send(data)
+
+    def flush(self):
+        self.input.clear()
+
+    def close(self):
+        pass
+
+
+def variandual(state=None, ack=False, **kwargs):
+    """
+    Loopback to a simulated VarianDual. ack: start in ACK reply mode
+    (otherwise writes are not answered until `VarianDual.enable_ack`,
+    done by the controller before its first write)
+    """
+    if state is None:
+        state = _variandual.create_state()
+    if ack:
+        prop = _variandual.Command.SerialProperty
+        channel = _variandual.Channel.NoChannel
+        state[prop][channel] = SerialProperty.encode(SerialProperty.AckNack)
+    return Loopback(functools.partial(_variandual.handle, state), **kwargs)
+
+
+def agilent(state=None, address=0, **kwargs):
+    """Loopback to a simulated Agilent 4UHV"""
+    if state is None:
+        state = _agilent.create_state()
+    codec = agilent_protocol.Codec(address)
+    handler = functools.partial(_agilent.handle, state, codec=codec)
+    return Loopback(handler, eol=codec.eol, tail=codec.tail, **kwargs)
+
+
+def mks(state=None, address=None, **kwargs):
+    """Loopback to a simulated MKS 937A"""
+    if state is None:
+        state = _mks.create_state()
+    codec = mks_protocol.Codec(address)
+    handler = functools.partial(_mks.handle, state, codec=codec)
+    return Loopback(handler, eol=codec.eol, **kwargs)
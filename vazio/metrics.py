@@ -0,0 +1,273 @@
+"""
+Prometheus metrics
+
+`Metrics` renders the latest readings of an `vazio.acquisition.Acquisition`
+in the Prometheus text exposition format. Scrapes are served from memory:
+they never trigger a hardware read.
+
+Transaction latency and error counters come from `Instrumented`
+connections (a wrapper around any write_readline connection).
+
+    acq = Acquisition({"d1": VarianDual(Instrumented(conn))}, paths)
+    metrics = Metrics(acq)
+    server = serve(metrics, port=9100)
+"""
+
+import enum
+import math
+import time
+import bisect
+import functools
+import threading
+import http.server
+
+from .acquisition import split_path
+
+
+# quantity: (metric name, help)
+QUANTITIES = {
+    "pressure": ("vazio_pressure", "Pressure (controller unit)"),
+    "current": ("vazio_current", "Ion pump current"),
+    "voltage": ("vazio_voltage", "High voltage (V)"),
+    "high_voltage": ("vazio_high_voltage", "High voltage state (<=0 means off)"),
+    "interlock_status": ("vazio_interlock_status", "Interlock status flags"),
+    "error_status": ("vazio_error_status", "Controller error status"),
+}
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _number(value):
+    if isinstance(value, enum.Enum):
+        value = value.value
+    return float(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(**labels):
+    return ",".join(
+        '{}="{}"'.format(k, _escape(v)) for k, v in labels.items() if v
+    )
+
+
+def _float(value):
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+class Instrumented:
+    """
+    Connection wrapper counting transactions, errors and latency
+
+    conn: object with write_readline (pipeline and write, when provided,
+          are counted too: every request of a pipelined burst is a
+          transaction taking its share of the burst time). Like any other
+          attribute they only exist if conn has them
+    """
+
+    def __init__(self, conn, buckets=LATENCY_BUCKETS, clock=time.perf_counter):
+        self.conn = conn
+        self.buckets = tuple(buckets)
+        self.clock = clock
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.errors = 0
+        self.latency = 0.0
+
+    def __getattr__(self, name):
+        if name == "conn":
+            raise AttributeError(name)
+        attr = getattr(self.conn, name)
+        if name in ("pipeline", "write"):
+            return functools.partial(getattr(self, "_" + name), attr)
+        return attr
+
+    def _call(self, count, method, *args):
+        start = self.clock()
+        try:
+            return method(*args)
+        except Exception:
+            self.errors += count
+            raise
+        finally:
+            # pipelined requests share the burst time
+            dt = (self.clock() - start) / count
+            self.total += count
+            self.latency += dt * count
+            self.counts[bisect.bisect_left(self.buckets, dt)] += count
+
+    def write_readline(self, data):
+        return self._call(1, self.conn.write_readline, data)
+
+    def _pipeline(self, pipeline, requests):
+        if not requests:
+            return []
+        return self._call(len(requests), pipeline, requests)
+
+    def _write(self, write, data):
+        return self._call(1, write, data)
+
+
+class Metrics:
+    """
+    acquisition: `vazio.acquisition.Acquisition` with the latest readings.
+                 Controllers with an `Instrumented` connection also export
+                 transaction metrics
+    quantities: {quantity: (metric name, help)}
+    """
+
+    def __init__(self, acquisition, quantities=QUANTITIES):
+        self.acquisition = acquisition
+        self.quantities = dict(quantities)
+        self.read_errors = {}
+        self._series = {}
+        acquisition.subscribe(self.update)
+
+    def update(self, readings):
+        """Acquisition listener counting failed reads"""
+        errors = self.read_errors
+        for reading in readings:
+            if not reading.valid:
+                key = reading.controller, reading.path
+                errors[key] = errors.get(key, 0) + 1
+
+    def _serie(self, key):
+        """(metric name, labels) of a (controller, path) or None"""
+        try:
+            return self._series[key]
+        except KeyError:
+            channel, quantity = split_path(key[1])
+            info = self.quantities.get(quantity)
+            serie = None
+            if info is not None:
+                serie = info[0], _labels(controller=key[0], channel=channel)
+            self._series[key] = serie
+            return serie
+
+    def render(self):
+        """Prometheus text exposition of the current state"""
+        samples = {}
+        for key, reading in list(self.acquisition.latest.items()):
+            serie = self._serie(key)
+            if serie is None:
+                continue
+            try:
+                value = _number(reading.value) if reading.valid else math.nan
+            except (TypeError, ValueError):
+                continue
+            name, labels = serie
+            samples.setdefault(name, []).append(
+                "{}{{{}}} {}".format(name, labels, _float(value))
+            )
+        lines = []
+        for name, help in self.quantities.values():
+            if name in samples:
+                lines.append("# HELP {} {}".format(name, help))
+                lines.append("# TYPE {} gauge".format(name))
+                lines.extend(samples[name])
+        if self.read_errors:
+            lines.append("# HELP vazio_read_errors_total Failed reads")
+            lines.append("# TYPE vazio_read_errors_total counter")
+            for (ctrl, path), count in list(self.read_errors.items()):
+                lines.append(
+                    "vazio_read_errors_total{{{}}} {}".format(
+                        _labels(controller=ctrl, path=path), count
+                    )
+                )
+        lines.extend(self._render_transactions())
+        lines.append("")
+        return "\n".join(lines)
+
+    def _render_transactions(self):
+        conns = [
+            (name, ctrl.conn)
+            for name, ctrl in self.acquisition.controllers.items()
+            if isinstance(getattr(ctrl, "conn", None), Instrumented)
+        ]
+        if not conns:
+            return []
+        total = ["# HELP vazio_transactions_total Request/reply transactions",
+                 "# TYPE vazio_transactions_total counter"]
+        errors = ["# HELP vazio_transaction_errors_total Failed transactions",
+                  "# TYPE vazio_transaction_errors_total counter"]
+        latency = ["# HELP vazio_transaction_latency_seconds Transaction latency",
+                   "# TYPE vazio_transaction_latency_seconds histogram"]
+        for name, conn in conns:
+            labels = _labels(controller=name)
+            total.append("vazio_transactions_total{{{}}} {}".format(labels, conn.total))
+            errors.append(
+                "vazio_transaction_errors_total{{{}}} {}".format(labels, conn.errors)
+            )
+            cumulative = 0
+            counts = list(conn.counts)
+            for bound, count in zip(conn.buckets + (math.inf,), counts):
+                cumulative += count
+                latency.append(
+                    'vazio_transaction_latency_seconds_bucket{{{},le="{}"}} {}'.format(
+                        labels, _float(float(bound)), cumulative
+                    )
+                )
+            latency.append(
+                "vazio_transaction_latency_seconds_sum{{{}}} {}".format(
+                    labels, _float(conn.latency)
+                )
+            )
+            latency.append(
+                "vazio_transaction_latency_seconds_count{{{}}} {}".format(
+                    labels, cumulative
+                )
+            )
+        return total + errors + latency
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(http.server.ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, metrics, address=("127.0.0.1", 9100)):
+        self.metrics = metrics
+        super().__init__(address, Handler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://{}:{}/metrics".format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def serve(metrics, host="127.0.0.1", port=9100):
+    """Serves metrics from a background thread (port 0 picks a free port)"""
+    return MetricsServer(metrics, (host, port)).start()
@@ -0,0 +1,36 @@
+from vazio.controller import BaseChannel, Controller
+from vazio.protocol.mks import TABLE, CONTROLLER, CHANNELS, COLD_CATHODE_CHANNELS, Codec
+
+
+class Gauge(BaseChannel):
+
+    table = TABLE
+    channels = CHANNELS
+
+
+class ColdCathode(Gauge):
+
+    channels = COLD_CATHODE_CHANNELS
+
+
+class MKS937(Controller):
+    """
+    MKS 937A gauge controller
+
+    conn: any object with write_readline (should be configured
+          with eol='\r')
+    address: multidrop address (None for the simple protocol)
+    """
+
+    table = TABLE
+    channel = CONTROLLER
+
+    gauge1 = ColdCathode(1)
+    gauge2 = ColdCathode(2)
+    gauge3 = Gauge(3)
+    gauge4 = ColdCathode(4)
+    gauge5 = Gauge(5)
+
+    def __init__(self, conn, address=None):
+        self.codec = Codec(address)
+        super().__init__(conn)
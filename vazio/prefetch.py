@@ -0,0 +1,169 @@
+"""
+Access pattern prefetcher
+
+Clients read parameters in very regular groups (ex: `hv1.voltage`,
+`hv1.current` and `hv1.pressure` within milliseconds, or `hv1.device_type`
+followed by `hv2.device_type`). A `Prefetcher` attached to a controller
+watches the stream of parameter reads and learns which parameters follow
+the first read of a burst (reads closer than `window` to each other).
+Once a group is learned, its first read also queries the rest of the group
+in the same pipelined burst; the extra values are kept for `ttl` seconds
+and serve the reads that follow without going to the line.
+
+    ctrl = VarianDual(conn)
+    prefetcher = Prefetcher(ctrl)
+    ...
+    prefetcher.stats()
+
+Any write clears the buffered values. The connection must provide
+pipeline(requests) (see `vazio.connection.Connection`), otherwise reads
+are never prefetched.
+
+Bursts are tracked per thread, so concurrent clients do not mix their
+access patterns; what they learn is shared. The prefetcher lock only
+guards its own state: it is never held while going to the line.
+"""
+
+import time
+import threading
+import collections
+
+from .protocol.table import ProtocolError
+
+
+class Prefetcher:
+    """
+    ctrl: controller (ex: `vazio.variandual.VarianDual`)
+    window: maximum time (s) between two reads of the same burst
+    ttl: lifetime (s) of a prefetched value
+    support: bursts a leader must start before its group is used
+    confidence: fraction of those bursts a parameter must appear in to
+                belong to the group of the leader
+    """
+
+    def __init__(self, ctrl, window=0.05, ttl=0.1, support=3, confidence=0.8,
+                 clock=time.monotonic):
+        self.ctrl = ctrl
+        self.window = window
+        self.ttl = ttl
+        self.support = support
+        self.confidence = confidence
+        self.clock = clock
+        # leader: number of bursts started
+        self.leaders = collections.Counter()
+        # leader: {key: number of those bursts where key was read}
+        self.follows = collections.defaultdict(collections.Counter)
+        # key: (value, expiration time)
+        self.buffer = {}
+        self.reads = self.hits = self.prefetched = self.wasted = 0
+        # burst being read by the current thread
+        self._local = threading.local()
+        # incremented by clear(): values fetched before are not buffered
+        self._generation = 0
+        self._lock = threading.Lock()
+        ctrl.prefetcher = self
+
+    def detach(self):
+        self.clear()
+        self.ctrl.prefetcher = None
+
+    def group(self, key):
+        """Keys learned to be read in the same burst after key"""
+        count = self.leaders[key]
+        if count < self.support:
+            return []
+        limit = self.confidence * count
+        return [k for k, n in self.follows[key].items() if n >= limit]
+
+    def _learn(self, key, now):
+        """Records a read. Returns True if it starts a new burst"""
+        local = self._local
+        last = getattr(local, "last", None)
+        if last is not None and now - last <= self.window:
+            local.last = now
+            if key != local.leader:
+                local.burst.add(key)
+            return False
+        # previous burst of this thread is complete
+        if last is not None:
+            self.leaders[local.leader] += 1
+            self.follows[local.leader].update(local.burst)
+        local.leader, local.burst, local.last = key, set(), now
+        return True
+
+    def _expire(self, now):
+        expired = [k for k, (_, t) in self.buffer.items() if t <= now]
+        for key in expired:
+            del self.buffer[key]
+        self.wasted += len(expired)
+
+    def read(self, name, channel):
+        """Value of a parameter (from the buffer if prefetched)"""
+        key = name, channel
+        with self._lock:
+            now = self.clock()
+            self.reads += 1
+            self._expire(now)
+            leader = self._learn(key, now)
+            entry = self.buffer.pop(key, None)
+            if entry is not None:
+                self.hits += 1
+                return entry[0]
+            group = self.group(key) if leader else []
+            group = [k for k in group if k not in self.buffer]
+            generation = self._generation
+        pipeline = getattr(self.ctrl.conn, "pipeline", None)
+        if not group or pipeline is None:
+            return self.ctrl._query(name, channel)
+        return self._fetch(pipeline, key, group, now, generation)
+
+    def _fetch(self, pipeline, key, group, now, generation):
+        ctrl = self.ctrl
+        requests = [ctrl._queries[k] for k in [key] + group]
+        replies = pipeline(requests)
+        values = {}
+        for k, request, reply in zip(group, requests[1:], replies[1:]):
+            try:
+                values[k] = ctrl.table[k].decode(ctrl._data(reply, request))
+            except ProtocolError:
+                continue
+        expiration = now + self.ttl
+        with self._lock:
+            self.prefetched += len(values)
+            if generation != self._generation:
+                # written meanwhile: the values may be outdated
+                self.wasted += len(values)
+            else:
+                for k, value in values.items():
+                    if k in self.buffer:
+                        # fetched by another thread as well
+                        self.wasted += 1
+                    self.buffer[k] = value, expiration
+        return ctrl.table[key].decode(ctrl._data(replies[0], requests[0]))
+
+    def clear(self):
+        """Forgets the buffered values (ex: after a write)"""
+        with self._lock:
+            self._generation += 1
+            self.wasted += len(self.buffer)
+            self.buffer.clear()
+
+    @property
+    def hit_rate(self):
+        """Fraction of the reads served from the buffer"""
+        return self.hits / self.reads if self.reads else 0.0
+
+    @property
+    def waste_rate(self):
+        """Fraction of the prefetched values discarded unused"""
+        return self.wasted / self.prefetched if self.prefetched else 0.0
+
+    def stats(self):
+        return dict(
+            reads=self.reads,
+            hits=self.hits,
+            prefetched=self.prefetched,
+            wasted=self.wasted,
+            hit_rate=self.hit_rate,
+            waste_rate=self.waste_rate,
+        )
@@ -0,0 +1,286 @@
+"""
+Agilent 4UHV window protocol
+
+MESSAGE: <STX>+<ADDR>+<WIN>+<COM>+<DATA>+<ETX>+<CRC>
+
+ADDR = 0x80 (RS232) or 0x80 + device number [0, 31] (RS485)
+WIN = 3 numerics window number
+COM = 0x30 (read) or 0x31 (write)
+DATA = absent on read; Logic(1), Numeric(6) or Alphanumeric(10) otherwise
+CRC = XOR of all characters after STX up to ETX (included) coded as 2 hex
+      ASCII characters
+
+The answer to a read has the same structure as the message. Any other
+answer carries a single result byte (ACK, NACK...) instead of WIN+COM+DATA.
+"""
+
+import enum
+import operator
+import functools
+
+from .table import ProtocolError, Param, Table, RW, mismatch
+
+
+STX = b"\x02"
+ETX = b"\x03"
+ACK = b"\x06"
+NACK = b"\x15"
+UNKNOWN_WINDOW = b"\x32"
+DATA_TYPE_ERROR = b"\x33"
+OUT_OF_RANGE = b"\x34"
+WINDOW_DISABLED = b"\x35"
+RS232_ADDR = b"\x80"
+
+CONTROLLER = 0
+CHANNELS = 1, 2, 3, 4
+
+
+Errors = {
+    NACK: "Execution of the command has failed",
+    UNKNOWN_WINDOW: "The window specified in the command is not a valid window",
+    DATA_TYPE_ERROR: "The data type specified in the command does not match",
+    OUT_OF_RANGE: "The value specified in the command is out of range",
+    WINDOW_DISABLED: "The window specified is read only or temporarily disabled",
+}
+
+
+class Command(enum.Enum):
+    READ = b"\x30"
+    WRITE = b"\x31"
+
+
+class Window(enum.Enum):
+    LocalMode = b"008"
+    HV1_ON = b"011"
+    HV2_ON = b"012"
+    HV3_ON = b"013"
+    HV4_ON = b"014"
+    Status = b"205"
+    ErrorCode = b"206"
+    Model = b"319"
+
+    SerialNumber = b"323"
+    SerialType = b"504"
+    Channel = b"505"
+    Unit = b"600"
+    Mode = b"601"
+    Protect = b"602"
+    FixedStep = b"603"
+
+    Dev1 = b"610"
+    Power1 = b"612"
+    Vt1 = b"613"
+    IProt1 = b"614"
+    SP1 = b"615"
+
+    Dev2 = b"620"
+    Power2 = b"622"
+    Vt2 = b"623"
+    IProt2 = b"624"
+    SP2 = b"625"
+
+    Dev3 = b"630"
+    Power3 = b"632"
+    Vt3 = b"633"
+    IProt3 = b"634"
+    SP3 = b"635"
+
+    Dev4 = b"640"
+    Power4 = b"642"
+    Vt4 = b"643"
+    IProt4 = b"644"
+    SP4 = b"645"
+
+    Temp1 = b"801"
+    Temp2 = b"802"
+    Temp3 = b"808"
+    Temp4 = b"809"
+
+    Ilock = b"803"
+    StatusSP = b"804"
+
+    V1 = b"810"
+    I1 = b"811"
+    P1 = b"812"
+
+    V2 = b"820"
+    I2 = b"821"
+    P2 = b"822"
+
+    V3 = b"830"
+    I3 = b"831"
+    P3 = b"832"
+
+    V4 = b"840"
+    I4 = b"841"
+    P4 = b"842"
+
+
+crc = functools.partial(functools.reduce, operator.xor)
+
+
+def crc_ascii(msg):
+    return "{:02X}".format(crc(msg)).encode()
+
+
+def address(addr=0):
+    return bytes((RS232_ADDR[0] + addr,))
+
+
+def frame(body):
+    """Frames body (ADDR up to DATA) with STX, ETX and CRC"""
+    body += ETX
+    return STX + body + crc_ascii(body)
+
+
+def decode_message(msg):
+    assert msg[0:1] == STX, "invalid start byte"
+    addr = msg[1] - RS232_ADDR[0]
+    wnd = Window(msg[2:5])
+    cmd = Command(msg[5:6])
+    data = msg[6:-3]
+    assert msg[-3:-2] == ETX, "invalid end byte"
+    assert crc_ascii(msg[1:-2]) == msg[-2:], "invalid crc"
+    return addr, wnd, cmd, data
+
+
+def encode_answer(wnd, data=ACK, addr=0):
+    if isinstance(data, str):
+        data = data.encode()
+    if wnd is None:
+        return frame(address(addr) + data)
+    return frame(address(addr) + wnd.value + Command.READ.value + data)
+
+
+# data types
+
+def _logic(*args, **kwargs):
+    kwargs.setdefault("access", RW)
+    return Param(*args, type=bool, **kwargs)
+
+
+def _numeric(*args, **kwargs):
+    kwargs.setdefault("encode", "{:06d}".format)
+    return Param(*args, type=int, **kwargs)
+
+
+def _alpha(*args, **kwargs):
+    return Param(*args, decode=str.strip, **kwargs)
+
+
+def _alpha_float(*args, **kwargs):
+    kwargs.setdefault("encode", "{:10.1E}".format)
+    return Param(*args, type=float, **kwargs)
+
+
+def _per_channel(prefix, suffix=""):
+    return {ch: getattr(Window, "{}{}{}".format(prefix, ch, suffix)) for ch in CHANNELS}
+
+
+class Codec:
+    """
+    4UHV wire codec for command tables (see `vazio.protocol.table`)
+
+    The key of a parameter is its window. addr is the RS485 device number
+    (0 for RS232)
+    """
+
+    eol = ETX
+    # CRC bytes following eol
+    tail = 2
+
+    def __init__(self, addr=0):
+        self.addr = addr
+        self._addr = address(addr)
+
+    def __eq__(self, other):
+        return isinstance(other, Codec) and other.addr == self.addr
+
+    def __hash__(self):
+        return hash((Codec, self.addr))
+
+    def __repr__(self):
+        return "Codec(addr={})".format(self.addr)
+
+    @staticmethod
+    def key(channel, window):
+        return Window(window).value
+
+    def query(self, key):
+        return frame(self._addr + key + Command.READ.value)
+
+    def write(self, key, data):
+        return frame(self._addr + key + Command.WRITE.value + data.encode())
+
+    def reply(self, key, data):
+        return frame(self._addr + key + Command.READ.value + data.encode())
+
+    def error(self, key, code):
+        return frame(self._addr + code)
+
+    @staticmethod
+    def address_of(msg):
+        """RS485 device number a message is addressed to"""
+        return msg[1] - RS232_ADDR[0]
+
+    def split(self, msg):
+        """Decodes a message into (key, data). data is None for reads"""
+        addr, wnd, cmd, data = decode_message(msg)
+        return wnd.value, None if cmd == Command.READ else data.decode()
+
+    @staticmethod
+    def matches(request, msg):
+        """True if msg can be the answer to request"""
+        if len(msg) == 6:
+            # ACK (writes only) or error: no window
+            write = request[5:6] == Command.WRITE.value
+            return msg[1:2] == request[1:2] and (msg[2:3] != ACK or write)
+        read = request[5:6] == Command.READ.value
+        return read and msg[1:5] == request[1:5]
+
+    @staticmethod
+    def data(msg, request=None):
+        """
+        Decodes answer data. Raises ProtocolError on error answers and
+        ReplyMismatch if the answer does not belong to request
+        """
+        assert msg[-3:-2] == ETX, "invalid end byte"
+        if request is not None and not Codec.matches(request, msg):
+            raise mismatch(request, msg)
+        if len(msg) == 6:
+            code = msg[2:3]
+            if code == ACK:
+                return ""
+            raise ProtocolError(code, Errors.get(code, "Unknown error"))
+        return msg[6:-3].decode()
+
+
+TABLE = Table(
+    [
+        _numeric("local_mode", {CONTROLLER: Window.LocalMode}, access=RW),
+        _numeric("status", {CONTROLLER: Window.Status}),
+        _numeric("error_code", {CONTROLLER: Window.ErrorCode}),
+        _alpha("model", {CONTROLLER: Window.Model}),
+        _alpha("serial_number", {CONTROLLER: Window.SerialNumber}),
+        _logic("serial_type", {CONTROLLER: Window.SerialType}),
+        _numeric("selected_channel", {CONTROLLER: Window.Channel}, access=RW),
+        _numeric("unit", {CONTROLLER: Window.Unit}, access=RW),
+        _numeric("mode", {CONTROLLER: Window.Mode}, access=RW),
+        _logic("protect", {CONTROLLER: Window.Protect}),
+        _logic("fixed_step", {CONTROLLER: Window.FixedStep}),
+        _numeric("interlock", {CONTROLLER: Window.Ilock}),
+        _numeric("set_point_status", {CONTROLLER: Window.StatusSP}),
+        _logic("high_voltage", _per_channel("HV", "_ON")),
+        _numeric("device_number", _per_channel("Dev"), access=RW),
+        _numeric("power_max", _per_channel("Power"), access=RW),
+        _numeric("voltage_target", _per_channel("Vt"), access=RW),
+        _numeric("current_protect", _per_channel("IProt"), access=RW),
+        _alpha_float("set_point", _per_channel("SP"), access=RW),
+        _numeric("temperature", {1: Window.Temp1, 2: Window.Temp2,
+                                 3: Window.Temp3, 4: Window.Temp4}),
+        _numeric("voltage", _per_channel("V")),
+        _alpha_float("current", _per_channel("I")),
+        _alpha_float("pressure", _per_channel("P")),
+    ],
+    Codec(),
+)
@@ -0,0 +1,105 @@
+"""
+MKS 937A serial protocol
+
+Commands and responses are ASCII mnemonics terminated with '\r'.
+
+query = [mnemonic] '\r'
+write = [mnemonic] '=' [value] '\r'
+reply = [data] '\r'  (error replies end with '!')
+
+With the RS485 multidrop protocol every command is prefixed with the
+attention character '$' followed by the address character.
+"""
+
+from .table import ProtocolError, Param, Table, RW, EXEC
+
+
+EOL = b"\r"
+ATTENTION = b"$"
+ERROR = "!"
+OK = "OK"
+NOT_A_COMMAND = "NotCMD!"
+
+CONTROLLER = 0
+CHANNELS = 1, 2, 3, 4, 5
+COLD_CATHODE_CHANNELS = 1, 2, 4
+
+
+def _per_channel(prefix, channels=CHANNELS):
+    return {ch: "{}{}".format(prefix, ch) for ch in channels}
+
+
+class Codec:
+    """
+    MKS 937A wire codec for command tables (see `vazio.protocol.table`)
+
+    The key of a parameter is its mnemonic. addr (multidrop protocol only)
+    is the controller address [0, 0x7F] (except 0x24)
+    """
+
+    eol = EOL
+
+    def __init__(self, addr=None):
+        self.addr = addr
+        self._prefix = b"" if addr is None else ATTENTION + bytes((addr,))
+
+    def __eq__(self, other):
+        return isinstance(other, Codec) and other.addr == self.addr
+
+    def __hash__(self):
+        return hash((Codec, self.addr))
+
+    def __repr__(self):
+        return "Codec(addr={})".format(self.addr)
+
+    @staticmethod
+    def key(channel, mnemonic):
+        return mnemonic.encode()
+
+    def query(self, key):
+        return self._prefix + key + EOL
+
+    def write(self, key, data):
+        return self._prefix + key + b"=" + data.encode() + EOL
+
+    @staticmethod
+    def reply(key, data):
+        return data.encode() + EOL
+
+    @staticmethod
+    def error(key, code):
+        return code.encode() + EOL
+
+    def split(self, frame):
+        """Decodes a command into (key, data). data is None for queries"""
+        frame = frame[len(self._prefix):].rstrip(EOL)
+        key, sep, data = frame.partition(b"=")
+        return key, data.decode() if sep else None
+
+    @staticmethod
+    def data(frame, request=None):
+        """
+        Decodes reply data. Raises ProtocolError on error replies (replies
+        carry no key: they cannot be matched to request)
+        """
+        data = frame.rstrip(EOL).decode().strip()
+        if data.endswith(ERROR):
+            raise ProtocolError(data, data)
+        return data
+
+
+TABLE = Table(
+    [
+        Param("gauges", {CONTROLLER: "GAUGES"}),
+        Param("relays", {CONTROLLER: "RELAYS"}),
+        Param("version", {CONTROLLER: "VER"}),
+        Param("unit", {CONTROLLER: "UNIT"}),
+        Param("pressure", _per_channel("P"), type=float),
+        Param("combined_pressure", _per_channel("C"), type=float),
+        Param("protection_set_point", _per_channel("PRO"), type=float, access=RW),
+        Param("relay_set_point", _per_channel("RLY"), type=float, access=RW),
+        Param("enable_cc", _per_channel("ECC", COLD_CATHODE_CHANNELS), access=EXEC),
+        Param("disable_cc", _per_channel("XCC", COLD_CATHODE_CHANNELS), access=EXEC),
+    ],
+    Codec(),
+)
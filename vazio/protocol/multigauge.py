@@ -14,10 +14,14 @@ Controller to Host reply format:
 
 import enum
 
+from .table import ProtocolError, mismatch
+
 
 HEADER_REQ = "#"
 HEADER_REP = ">"
 ACK = '\x06'
+ERROR = '!'
+QUERY = '?'
 
 
 class Enum(enum.Enum):
@@ -75,6 +79,7 @@ class Command(Enum):
     RemoteOutput = "73"
     RemoteInput = "74"
     SerialConfig = "80"
+    SerialProperty = "81"
 
     @staticmethod
     def _size():
@@ -114,3 +119,142 @@ def decode_reply(data):
     result = decode(data)
     assert result[0] == HEADER_REP
     return result
+
+
+class Codec:
+    """
+    MultiGauge wire codec for command tables (see `vazio.protocol.table`)
+
+    The key of a parameter is the [channel(1)] [command(2)] part of a frame
+    """
+
+    eol = b"\r"
+
+    @staticmethod
+    def key(channel, command):
+        channel = Channel.decode(channel).value
+        command = Command.decode(command).value
+        return (channel + command).encode()
+
+    @staticmethod
+    def query(key):
+        return b"#" + key + b"?\r"
+
+    @staticmethod
+    def write(key, data):
+        return b"#" + key + data.encode() + b"\r"
+
+    @staticmethod
+    def reply(key, data):
+        return b">" + key + data.encode() + b"\r"
+
+    @staticmethod
+    def error(key, code):
+        return b">" + key[:1] + b"00" + ERROR.encode() + code.encode() + b"\r"
+
+    @staticmethod
+    def matches(request, frame):
+        """True if frame can be the reply to request"""
+        if frame[:1] == ACK.encode():
+            # writes only
+            return request[-2:-1] != QUERY.encode()
+        if frame[4:5] == ERROR.encode():
+            # error replies only carry the channel
+            return frame[1:2] == request[1:2]
+        return frame[1:4] == request[1:4]
+
+    @staticmethod
+    def split(frame):
+        """Decodes a request frame into (key, data). data is None for queries"""
+        assert frame[:1] == b"#", "invalid header"
+        data = frame[4:].rstrip(b"\r").decode()
+        return frame[1:4], None if data == QUERY else data
+
+    @staticmethod
+    def data(frame, request=None):
+        """
+        Decodes reply data. Raises ProtocolError on error replies and
+        ReplyMismatch if the reply does not belong to request
+        """
+        if request is not None and not Codec.matches(request, frame):
+            raise mismatch(request, frame)
+        data = frame[4:].rstrip(b"\r").decode()
+        if data[:1] == ERROR:
+            code = data[1:]
+            error = Errors.get(code, ProtocolError)
+            raise error(code, ProtocolErrors.get(code, "Unknown error"))
+        return data
+
+
+ProtocolErrors = {
+    # If incongruencies are detected in the composition of the
+    # data packet sent to the Dual controller (in other words a
+    # correct reception but an incorrect data format), the Dual
+    # controller will reply with an error code identified by the
+    # .!. (21h) command according to the following table.
+    "1": "Reserved (checksum error)",
+    "2": "Non existent command code",
+    "3": "Channel not valid for the selected command",
+    "4": "Write mode not allowed for the selected command",
+    "5": "Unvalid or non-congruent data transmitted",
+    "6": "Write value exceeding the allowed limits or step not allowed",
+    "7": "Data format not recognized on the protocols implemented",
+    "8": "Write not allowed to channel ON",
+    "9": "Write not allowed to channel OFF",
+    ":": "Write allowed in Serial Configuration Mode only",
+}
+
+
+class ChecksumError(ProtocolError):
+    pass
+
+
+class UnknownCommand(ProtocolError):
+    pass
+
+
+class InvalidChannel(ProtocolError):
+    pass
+
+
+class ReadOnly(ProtocolError):
+    pass
+
+
+class InvalidData(ProtocolError):
+    pass
+
+
+class OutOfRange(ProtocolError):
+    pass
+
+
+class FormatError(ProtocolError):
+    pass
+
+
+class ChannelOn(ProtocolError):
+    pass
+
+
+class ChannelOff(ProtocolError):
+    pass
+
+
+class SerialConfigOnly(ProtocolError):
+    pass
+
+
+# error code: exception raised by Codec.data
+Errors = {
+    "1": ChecksumError,
+    "2": UnknownCommand,
+    "3": InvalidChannel,
+    "4": ReadOnly,
+    "5": InvalidData,
+    "6": OutOfRange,
+    "7": FormatError,
+    "8": ChannelOn,
+    "9": ChannelOff,
+    ":": SerialConfigOnly,
+}
@@ -0,0 +1,203 @@
+"""
+Declarative command tables
+
+Each instrument describes its parameters once, as a list of `Param`
+(name, code, channels, type, range, access). A `Table` built from that list
+gives, at import time:
+
+* per parameter codecs (`Param.decode` / `Param.encode` / `Param.check`)
+* the wire key of every (name, channel) pair and pre-built query frames
+  (see `Table.queries`)
+* a dispatch dictionary (wire key -> (param, channel)) used by the simulators
+
+The wire format itself is provided by a protocol *codec* (see for example
+`vazio.protocol.multigauge.Codec`) which must implement:
+
+* ``key(channel, code)`` -> bytes identifying a parameter on a channel
+* ``query(key)`` -> full query frame
+* ``write(key, data)`` -> full write frame
+* ``data(frame, request=None)`` -> reply data (raises `ProtocolError` on
+  error replies and `ReplyMismatch` if the reply does not belong to
+  request, when the protocol makes that visible)
+
+and, for simulators, ``split(frame)``, ``reply(key, data)`` and
+``error(key, code)``.
+"""
+
+import enum
+
+
+READ = "r"
+WRITE = "w"
+RW = READ + WRITE
+EXEC = "x"
+
+
+class ProtocolError(Exception):
+    """Error reply sent by an instrument. args: (code, description)"""
+
+    @property
+    def code(self):
+        return self.args[0]
+
+
+class ReplyMismatch(ProtocolError):
+    """
+    Reply which does not belong to the request, ex: the late reply to a
+    request which timed out. args: (reply, description)
+    """
+
+
+def mismatch(request, reply):
+    return ReplyMismatch(
+        reply, "reply {!r} does not match request {!r}".format(reply, request)
+    )
+
+
+def nop(v):
+    return v
+
+
+def _codec(type):
+    if isinstance(type, enum.EnumMeta):
+        return getattr(type, "decode", type), getattr(type, "encode", None)
+    if type is bool:
+        return (lambda v: v.strip() == "1"), (lambda v: "1" if v else "0")
+    if type is int:
+        return int, "{:d}".format
+    if type is float:
+        return float, "{:.1E}".format
+    return nop, nop
+
+
+class Param:
+    """
+    A single parameter of an instrument
+
+    code: wire code. Either a single code shared by all channels or a
+          dict {channel: code} for protocols where the channel is part of
+          the code (ex: Agilent windows, MKS mnemonics)
+    channels: sequence of channels where the parameter is available
+    type: python type or Enum used to build the default decode/encode
+    range: optional (low, high) or (low, high, step) validated on write
+    access: READ, WRITE, RW or EXEC
+    """
+
+    def __init__(
+        self,
+        name,
+        code,
+        channels=(None,),
+        type=str,
+        range=None,
+        access=READ,
+        decode=None,
+        encode=None,
+        doc=None,
+    ):
+        self.name = name
+        if isinstance(code, dict):
+            self.codes = dict(code)
+            channels = tuple(code)
+        else:
+            self.codes = {channel: code for channel in channels}
+        self.channels = tuple(channels)
+        self.type = type
+        self.range = range
+        self.access = access
+        default_decode, default_encode = _codec(type)
+        self.decode = default_decode if decode is None else decode
+        self.encode = default_encode if encode is None else encode
+        self.doc = doc
+
+    def __repr__(self):
+        return "Param({!r})".format(self.name)
+
+    @property
+    def readable(self):
+        return READ in self.access
+
+    @property
+    def writable(self):
+        return WRITE in self.access and self.encode is not None
+
+    def check(self, value):
+        """Raises ValueError if value is outside the parameter range"""
+        if self.range is None:
+            return value
+        low, high, *step = self.range
+        if not low <= value <= high:
+            raise ValueError(
+                "{} {!r} outside [{}, {}]".format(self.name, value, low, high)
+            )
+        if step and (value - low) % step[0]:
+            raise ValueError(
+                "{} {!r} not a multiple of {} step".format(self.name, value, step[0])
+            )
+        return value
+
+    def to_wire(self, value):
+        """Validates and encodes value into its wire representation"""
+        if not self.writable:
+            raise AttributeError("can't set: {}".format(self.name))
+        if self.range is not None:
+            value = self.check(self.type(value))
+        return self.encode(value)
+
+
+class Table:
+    """
+    Command table of an instrument
+
+    table[name, channel] -> Param
+    """
+
+    def __init__(self, params, codec):
+        self.params = tuple(params)
+        self.codec = codec
+        self.entries = {}
+        self.keys = {}
+        self.dispatch = {}
+        for param in self.params:
+            for channel in param.channels:
+                code = param.codes[channel]
+                key = codec.key(channel, code)
+                self.entries[param.name, channel] = param
+                self.keys[param.name, channel] = key
+                self.dispatch[key] = param, channel
+        self._queries = {}
+
+    def __getitem__(self, item):
+        return self.entries[item]
+
+    def __contains__(self, item):
+        return item in self.entries
+
+    def __iter__(self):
+        return iter(self.params)
+
+    def names(self, channel):
+        """Parameter names available on the given channel"""
+        return [p.name for p in self.params if channel in p.channels]
+
+    def queries(self, codec=None):
+        """
+        Pre-built frames {(name, channel): frame} for all parameters that
+        are sent without data (queries and actions). Cached per codec
+        """
+        codec = self.codec if codec is None else codec
+        frames = self._queries.get(codec)
+        if frames is None:
+            frames = {
+                item: codec.query(key)
+                for item, key in self.keys.items()
+                if self.entries[item].access != WRITE
+            }
+            self._queries[codec] = frames
+        return frames
+
+    def request(self, name, channel, value, codec=None):
+        """Encodes a write frame for the given value"""
+        codec = self.codec if codec is None else codec
+        param = self.entries[name, channel]
+        return codec.write(self.keys[name, channel], param.to_wire(value))
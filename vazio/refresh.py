@@ -0,0 +1,234 @@
+"""
+Adaptive refresh rates
+
+`AdaptiveAcquisition` is an `vazio.acquisition.Acquisition` where every
+quantity has its own refresh rate, chosen by a `RefreshPolicy` from the
+state of its channel and the dynamics of its signal:
+
+* a quantity that moved by more than `tolerance` (relative) or whose
+  channel `high_voltage` state changed is refreshed at `max_rate` for
+  `hold` seconds
+* a quantity of an HV channel which is off (or in fault), or which has
+  not moved for `flat_time` seconds, is refreshed at `min_rate`
+* anything else at `base_rate`
+
+The rates must fit in the line bandwidth: the line time of every query is
+computed from the baud rate and the frame sizes (see
+`vazio.simulator.bus.Bus.transaction_time`) and the total may use at most
+`utilization` of the line. When the requested rates do not fit, every
+quantity keeps its `min_rate` and the remaining time is shared in
+proportion to what they asked above it. The time freed by the idle
+quantities therefore goes to the ones that are moving. If the `min_rate`
+of all quantities alone does not fit, they are all scaled down below it.
+
+All controllers of an adaptive acquisition are assumed to share one line.
+
+    acquisition = AdaptiveAcquisition(
+        {"dual": ctrl}, ["hv1.high_voltage", "hv1.pressure", "hv1.current"],
+        RefreshPolicy(baudrate=9600),
+    )
+    acquisition.start()
+"""
+
+import enum
+import math
+import time
+
+from .acquisition import Acquisition, split_path
+from .simulator.bus import Bus
+
+
+HV_STATE = "high_voltage"
+
+
+def _number(value):
+    if isinstance(value, enum.Enum):
+        value = value.value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def query(ctrl, path):
+    """Query frame of an attribute path of a controller"""
+    channel, name = split_path(path)
+    obj = ctrl
+    for attr in channel.split(".") if channel else ():
+        obj = getattr(obj, attr)
+    return ctrl._queries[name, obj.channel]
+
+
+class RefreshPolicy:
+    """
+    Refresh rates (Hz) and line budget
+
+    baudrate, bits, turnaround: line parameters (see `Bus`)
+    utilization: fraction of the line time the acquisition may use
+    data_size: estimated data characters of a reply (reply frame size is
+               taken as the query size plus data_size)
+    """
+
+    def __init__(self, baudrate=9600, bits=10, turnaround=0.002, utilization=0.8,
+                 min_rate=0.05, base_rate=1.0, max_rate=5.0, tolerance=0.01,
+                 flat_time=600.0, hold=30.0, data_size=8):
+        self.line = Bus(None, baudrate=baudrate, bits=bits, turnaround=turnaround)
+        self.utilization = utilization
+        self.min_rate = min_rate
+        self.base_rate = base_rate
+        self.max_rate = max_rate
+        self.tolerance = tolerance
+        self.flat_time = flat_time
+        self.hold = hold
+        self.data_size = data_size
+
+    def cost(self, query):
+        """Line time (s) of a query frame and its reply"""
+        return self.line.transaction_time(len(query), len(query) + self.data_size)
+
+    def moved(self, reference, value):
+        if math.isnan(reference) or math.isnan(value):
+            return reference != value and not (
+                math.isnan(reference) and math.isnan(value)
+            )
+        return abs(value - reference) > self.tolerance * abs(reference)
+
+    def rate(self, track, off, now):
+        """Requested rate of a quantity"""
+        if now < track.hold_until:
+            return self.max_rate
+        if track.hv_state:
+            return self.base_rate
+        if off or now - track.moved >= self.flat_time:
+            return self.min_rate
+        return self.base_rate
+
+    def allocate(self, requested, costs):
+        """
+        Rates fitting the line budget. requested, costs: {key: rate},
+        {key: line time of one refresh}
+        """
+        budget = self.utilization
+        load = sum(requested[key] * costs[key] for key in requested)
+        if load <= budget:
+            return dict(requested)
+        floor = {key: min(self.min_rate, rate) for key, rate in requested.items()}
+        base = sum(floor[key] * costs[key] for key in requested)
+        if base > budget:
+            # not even the floors fit: slow them all down by the same factor
+            scale = budget / base
+            return {key: rate * scale for key, rate in floor.items()}
+        extra = load - base
+        scale = (budget - base) / extra
+        return {
+            key: floor[key] + (rate - floor[key]) * scale
+            for key, rate in requested.items()
+        }
+
+
+class Track:
+    """Refresh state of one quantity"""
+
+    __slots__ = ("reference", "moved", "hold_until", "hv_state", "rate", "due")
+
+    def __init__(self, now, rate, hv_state):
+        self.reference = math.nan
+        self.moved = now
+        self.hold_until = -math.inf
+        self.hv_state = hv_state
+        self.rate = rate
+        self.due = now
+
+
+class AdaptiveAcquisition(Acquisition):
+    """
+    controllers: {name: controller}
+    quantities: sequence of attribute paths read on every controller
+    policy: `RefreshPolicy`
+    """
+
+    def __init__(self, controllers, quantities, policy=None, clock=time.time):
+        super().__init__(controllers, quantities, period=None, clock=clock)
+        self.policy = RefreshPolicy() if policy is None else policy
+        now = clock()
+        self.tracks = {}
+        self.costs = {}
+        for controller, ctrl in self.controllers.items():
+            for path in self.quantities:
+                key = controller, path
+                hv_state = split_path(path)[1] == HV_STATE
+                self.tracks[key] = Track(now, self.policy.base_rate, hv_state)
+                self.costs[key] = self.policy.cost(query(ctrl, path))
+
+    def rates(self):
+        """{(controller, path): current refresh rate (Hz)}"""
+        return {key: track.rate for key, track in self.tracks.items()}
+
+    @property
+    def load(self):
+        """Fraction of the line time used by the current rates"""
+        return sum(t.rate * self.costs[key] for key, t in self.tracks.items())
+
+    def _off(self, controller, channel):
+        reading = self.latest.get((controller, "{}.{}".format(channel, HV_STATE)))
+        if reading is None or not reading.valid:
+            return False
+        return _number(reading.value) <= 0
+
+    def update(self, readings):
+        """Updates the signal dynamics and the rates after new readings"""
+        policy = self.policy
+        for reading in readings:
+            if not reading.valid:
+                continue
+            track = self.tracks[reading.controller, reading.path]
+            value = _number(reading.value)
+            if policy.moved(track.reference, value):
+                if not math.isnan(track.reference):
+                    until = reading.timestamp + policy.hold
+                    if track.hv_state:
+                        # the whole channel reacts to a state change
+                        channel = split_path(reading.path)[0]
+                        for (c, path), other in self.tracks.items():
+                            if c == reading.controller and (
+                                split_path(path)[0] == channel
+                            ):
+                                other.hold_until = until
+                    else:
+                        track.hold_until = until
+                track.reference = value
+                track.moved = reading.timestamp
+        now = self.clock()
+        requested = {
+            key: policy.rate(
+                track, self._off(key[0], split_path(key[1])[0]), now
+            )
+            for key, track in self.tracks.items()
+        }
+        for key, rate in policy.allocate(requested, self.costs).items():
+            track = self.tracks[key]
+            # a new rate applies from the last refresh
+            track.due += 1 / rate - 1 / track.rate
+            track.rate = rate
+
+    def poll(self):
+        """Reads the quantities which are due"""
+        now = self.clock()
+        due = [key for key, track in self.tracks.items() if track.due <= now]
+        readings = [self.read(controller, path) for controller, path in due]
+        for key, reading in zip(due, readings):
+            track = self.tracks[key]
+            track.due = reading.timestamp + 1 / track.rate
+        if readings:
+            self.publish(readings)
+        self.update(readings)
+        return readings
+
+    @property
+    def next_due(self):
+        return min(track.due for track in self.tracks.values())
+
+    def run(self):
+        while not self._stop.is_set():
+            self.poll()
+            self._stop.wait(max(0, self.next_due - self.clock()))
@@ -0,0 +1,191 @@
+"""
+Incremental rolling statistics
+
+Each `Window` keeps min/max/mean/std and a rate of change (least squares
+slope) over the samples of the last `duration` seconds. Every sample costs
+amortized O(1):
+
+* min and max use monotonic deques
+* mean and variance use Welford updates (applied in reverse on expiry)
+* the slope uses running sums of t, v, t*t and t*v
+
+Memory is bounded by `capacity` samples per window: when it is reached the
+oldest sample is expired early.
+
+`RollingStatistics` feeds windows from an `vazio.acquisition.Acquisition`.
+"""
+
+import math
+import threading
+import collections
+
+
+Stats = collections.namedtuple("Stats", "count min max mean std rate")
+
+NO_STATS = Stats(0, math.nan, math.nan, math.nan, math.nan, math.nan)
+
+# 1s, 1min, 1h
+WINDOWS = 1, 60, 3600
+
+
+class Window:
+    """Rolling statistics over the last duration (s)"""
+
+    def __init__(self, duration, capacity=100000):
+        self.duration = duration
+        self.capacity = capacity
+        self.samples = collections.deque()
+        self.mins = collections.deque()
+        self.maxs = collections.deque()
+        self.seq = 0
+        self.t0 = None
+        self._reset()
+
+    def _reset(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.st = self.sv = self.stt = self.stv = 0.0
+
+    def add(self, t, v):
+        if self.t0 is None:
+            self.t0 = t
+        seq = self.seq
+        self.seq += 1
+        self.samples.append((seq, t, v))
+        mins, maxs = self.mins, self.maxs
+        while mins and mins[-1][1] >= v:
+            mins.pop()
+        mins.append((seq, v))
+        while maxs and maxs[-1][1] <= v:
+            maxs.pop()
+        maxs.append((seq, v))
+        # Welford
+        self.n += 1
+        delta = v - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (v - self.mean)
+        # least squares sums (rebased once in a while to keep precision)
+        x = t - self.t0
+        if x > 16 * self.duration:
+            self._rebase()
+            x = t - self.t0
+        self.st += x
+        self.sv += v
+        self.stt += x * x
+        self.stv += x * v
+        self.expire(t)
+
+    def _rebase(self):
+        self.t0 = self.samples[0][1]
+        values = [v for _, _, v in self.samples]
+        xs = [t - self.t0 for _, t, _ in self.samples]
+        # samples already contain the sample being added: exclude it
+        xs, values = xs[:-1], values[:-1]
+        self.st = math.fsum(xs)
+        self.sv = math.fsum(values)
+        self.stt = math.fsum(x * x for x in xs)
+        self.stv = math.fsum(x * v for x, v in zip(xs, values))
+
+    def _remove(self):
+        seq, t, v = self.samples.popleft()
+        if self.mins[0][0] == seq:
+            self.mins.popleft()
+        if self.maxs[0][0] == seq:
+            self.maxs.popleft()
+        self.n -= 1
+        if not self.n:
+            self._reset()
+            self.t0 = None
+            return
+        delta = v - self.mean
+        self.mean -= delta / self.n
+        self.m2 = max(self.m2 - delta * (v - self.mean), 0.0)
+        x = t - self.t0
+        self.st -= x
+        self.sv -= v
+        self.stt -= x * x
+        self.stv -= x * v
+
+    def expire(self, now):
+        """Removes samples older than now - duration"""
+        samples, limit = self.samples, now - self.duration
+        while samples and (samples[0][1] <= limit or len(samples) > self.capacity):
+            self._remove()
+
+    @property
+    def rate(self):
+        """Least squares slope (value units per second)"""
+        n = self.n
+        den = n * self.stt - self.st * self.st
+        if n < 2 or den <= 0:
+            return math.nan
+        return (n * self.stv - self.st * self.sv) / den
+
+    def stats(self):
+        n = self.n
+        if not n:
+            return NO_STATS
+        std = math.sqrt(self.m2 / (n - 1)) if n > 1 else 0.0
+        return Stats(n, self.mins[0][1], self.maxs[0][1], self.mean, std, self.rate)
+
+
+class Rolling:
+    """Several rolling windows over the same signal"""
+
+    def __init__(self, windows=WINDOWS, capacity=100000):
+        self.windows = {duration: Window(duration, capacity) for duration in windows}
+
+    def add(self, t, v):
+        for window in self.windows.values():
+            window.add(t, v)
+
+    def stats(self, duration=None):
+        if duration is not None:
+            return self.windows[duration].stats()
+        return {d: w.stats() for d, w in self.windows.items()}
+
+
+class RollingStatistics:
+    """
+    Acquisition listener keeping rolling statistics of numeric quantities
+
+    quantities: quantity names to follow (ex: pressure matches hv1.pressure)
+
+    Thread safe: updated from the acquisition thread, read from any other
+    """
+
+    def __init__(self, acquisition=None, quantities=("pressure", "current"),
+                 windows=WINDOWS, capacity=100000):
+        self.quantities = set(quantities)
+        self.windows = tuple(windows)
+        self.capacity = capacity
+        self.signals = {}
+        self._lock = threading.Lock()
+        if acquisition is not None:
+            acquisition.subscribe(self.update)
+
+    def update(self, readings):
+        readings = [
+            reading
+            for reading in readings
+            if reading.valid
+            and reading.path.rpartition(".")[2] in self.quantities
+        ]
+        with self._lock:
+            for reading in readings:
+                key = reading.controller, reading.path
+                rolling = self.signals.get(key)
+                if rolling is None:
+                    rolling = Rolling(self.windows, self.capacity)
+                    self.signals[key] = rolling
+                rolling.add(reading.timestamp, float(reading.value))
+
+    def stats(self, controller, path, duration=None):
+        with self._lock:
+            rolling = self.signals.get((controller, path))
+            if rolling is not None:
+                return rolling.stats(duration)
+        if duration is None:
+            return {d: NO_STATS for d in self.windows}
+        return NO_STATS
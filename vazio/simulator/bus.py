@@ -0,0 +1,100 @@
+"""
+Multi-drop (RS485) serial line model
+
+A `Bus` holds several addressed units sharing the same half-duplex line.
+Each request is delivered only to the unit it is addressed to; a request
+to a missing unit is lost (the host has to time out).
+
+The line time of every transaction is computed from the baud rate and the
+frame sizes (plus the unit turnaround time) and accumulated so that the
+bus occupancy can be measured. With `realtime=True` the bus also sleeps
+for that time, pacing replies like a real line would.
+"""
+
+import time
+
+
+class Bus:
+    """
+    address: callable(request) -> unit address
+    baudrate: line speed (bits/s)
+    bits: bits per character (start + data + parity + stop)
+    turnaround: time (s) a unit takes to start answering a request
+    """
+
+    def __init__(
+        self,
+        address,
+        baudrate=9600,
+        bits=10,
+        turnaround=0.002,
+        realtime=False,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.address = address
+        self.baudrate = baudrate
+        self.bits = bits
+        self.turnaround = turnaround
+        self.realtime = realtime
+        self.clock = clock
+        self.sleep = sleep
+        self.units = {}
+        self.reset()
+
+    def add(self, addr, handler):
+        """Attach a unit. handler: callable(request) -> reply (or None)"""
+        self.units[addr] = handler
+
+    def reset(self):
+        self.start = self.clock()
+        self.busy = 0.0
+        self.transactions = 0
+        self.lost = 0
+
+    @property
+    def char_time(self):
+        return self.bits / self.baudrate
+
+    def transaction_time(self, request_size, reply_size):
+        """Line time (s) of one request/reply exchange"""
+        return (request_size + reply_size) * self.char_time + self.turnaround
+
+    def handle(self, request):
+        unit = self.units.get(self.address(request))
+        reply = None if unit is None else unit(request)
+        if reply is None:
+            duration = len(request) * self.char_time
+            self.lost += 1
+        else:
+            duration = self.transaction_time(len(request), len(reply))
+        self.busy += duration
+        self.transactions += 1
+        if self.realtime:
+            self.sleep(duration)
+        return reply
+
+    @property
+    def occupancy(self):
+        """Fraction of the elapsed time the line was busy"""
+        elapsed = self.clock() - self.start
+        return self.busy / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        return dict(
+            units=len(self.units),
+            transactions=self.transactions,
+            lost=self.lost,
+            busy=self.busy,
+            occupancy=self.occupancy,
+        )
+
+    def capacity(self, request_size, reply_size, queries, refresh_rate):
+        """
+        Maximum number of units that can be polled on this line
+
+        queries: number of queries per unit per refresh
+        refresh_rate: refreshes per second (Hz)
+        """
+        per_unit = queries * self.transaction_time(request_size, reply_size)
+        return int(1 / (refresh_rate * per_unit))
@@ -0,0 +1,7 @@
+"""
+Simulated instrument state machines
+
+Pure protocol logic shared by the sinstruments based simulators
+(`vazio.simulator`) and the in-process loopback transport
+(`vazio.loopback`).
+"""
@@ -0,0 +1,86 @@
+"""
+Agilent 4UHV simulated state machine (no sinstruments dependency)
+
+`handle(state, msg, codec)` processes one message against a state
+dictionary ({window: value}) and returns the answer.
+"""
+
+import random
+
+from ...protocol.agilent import (
+    NACK, UNKNOWN_WINDOW, DATA_TYPE_ERROR, OUT_OF_RANGE, WINDOW_DISABLED, ACK,
+    TABLE, Window,
+)
+
+
+def funiform(a, b):
+    return lambda: '{: 10.1E}'.format(random.uniform(a, b))
+
+
+def iuniform(a, b, x=1):
+    return lambda: '{:06d}'.format(x*random.randint(a, b))
+
+
+state = {
+    Window.LocalMode: "000001",      # SERIAL:000000, REMOTE:000001, LOCAL:000002
+    Window.ErrorCode: "000000",
+    Window.Model: "4UHV".ljust(10),
+    Window.P1: funiform(5e-9, 9e-7),
+    Window.P2: funiform(5e-9, 9e-7),
+    Window.P3: funiform(5e-9, 9e-7),
+    Window.P4: funiform(5e-9, 9e-7),
+    Window.I1: funiform(5e-3, 9e-2),
+    Window.I2: funiform(5e-3, 9e-2),
+    Window.I3: funiform(5e-3, 9e-2),
+    Window.I4: funiform(5e-3, 9e-2),
+    Window.V1: iuniform(5, 68, 100),
+    Window.V2: iuniform(50, 68, 100),
+    Window.V3: iuniform(50, 68, 100),
+    Window.V4: iuniform(50, 68, 100),
+}
+
+# every window in the command table has a value
+DEFAULTS = {bool: "0", int: "000000", float: " 0.0E+00".rjust(10), str: " " * 10}
+for param in TABLE:
+    for wnd in param.codes.values():
+        state.setdefault(wnd, DEFAULTS[param.type])
+
+
+def handle(state, msg, codec):
+    """
+    Processes one message against state. Returns the answer or None
+    if the message is not addressed to this unit
+    """
+    if len(msg) > 1 and codec.address_of(msg) != codec.addr:
+        return None
+    try:
+        key, data = codec.split(msg)
+    except (ValueError, AssertionError):
+        return codec.error(None, NACK)
+    entry = TABLE.dispatch.get(key)
+    if entry is None:
+        return codec.error(key, UNKNOWN_WINDOW)
+    param, channel = entry
+    wnd = Window(key)
+    if data is None:
+        data = state[wnd]
+        if callable(data):
+            data = data()
+        return codec.reply(key, data)
+    if not param.writable:
+        return codec.error(key, WINDOW_DISABLED)
+    try:
+        value = param.decode(data)
+    except ValueError:
+        return codec.error(key, DATA_TYPE_ERROR)
+    try:
+        param.check(value)
+    except ValueError:
+        return codec.error(key, OUT_OF_RANGE)
+    state[wnd] = data
+    return codec.error(key, ACK)
+
+
+def create_state():
+    """New (independent) copy of the default state"""
+    return dict(state)
@@ -0,0 +1,87 @@
+"""
+MKS 937A simulated state machine (no sinstruments dependency)
+
+`handle(state, line, codec)` processes one command against a state
+dictionary ({mnemonic: value}) and returns the reply.
+"""
+
+import random
+
+from ...protocol.mks import TABLE, OK, NOT_A_COMMAND
+from ...protocol.table import EXEC
+
+
+def funiform(a, b):
+    return lambda: '{:7.1E}'.format(random.uniform(a, b))
+
+
+def iuniform(a, b):
+    return lambda: '{:05d}'.format(random.randint(a, b))
+
+
+state = {
+    'P1': funiform(5e-9, 9e-7),
+    'P2': funiform(5e-9, 9e-3),
+    'P3': funiform(5e-9, 9e-7),
+    'P4': funiform(5e-9, 9e-3),
+    'P5': funiform(5e-9, 9e-7),
+    'C1': funiform(5e-9, 9e-3),
+    'C2': funiform(5e-9, 9e-7),
+    'C3': funiform(5e-9, 9e-3),
+    'C4': funiform(5e-9, 9e-7),
+    'C5': funiform(5e-9, 9e-3),
+    'GAUGES': 'CvPrCv',
+    'PRO1': '4.1E-9',
+    'PRO2': '5.1E-9',
+    'PRO3': '6.1E-9',
+    'PRO4': '7.1E-9',
+    'PRO5': '8.1E-9',
+    'RELAYS': 'rly11011',
+    'RLY1': '4.7E-9',
+    'RLY2': '5.7E-9',
+    'RLY3': '6.7E-9',
+    'RLY4': '7.7E-9',
+    'RLY5': '8.7E-9',
+    'VER': '2.59,6.17',
+    'UNIT': 'mbar',
+    'ECC1': 'OK',
+    'ECC2': 'PROTECT!',
+    'ECC4': 'PS_FAULT!',
+    'XCC1': 'OK',
+    'XCC2': 'OK',
+    'XCC4': 'OK',
+}
+
+
+# every mnemonic in the command table has a value
+for param in TABLE:
+    for mnemonic in param.codes.values():
+        state.setdefault(mnemonic, OK if param.access == EXEC else "0.0E+00")
+
+
+def handle(state, line, codec):
+    """Processes one command against state. Returns the reply"""
+    key, data = codec.split(line)
+    entry = TABLE.dispatch.get(key)
+    if entry is None:
+        return codec.error(key, NOT_A_COMMAND)
+    param, channel = entry
+    mnemonic = key.decode()
+    if data is None:
+        data = state[mnemonic]
+        if callable(data):
+            data = data()
+        return codec.reply(key, data)
+    if not param.writable:
+        return codec.error(key, NOT_A_COMMAND)
+    try:
+        param.check(param.decode(data))
+    except ValueError:
+        return codec.error(key, mnemonic + "OUT!")
+    state[mnemonic] = data
+    return codec.reply(key, OK)
+
+
+def create_state():
+    """New (independent) copy of the default state"""
+    return dict(state)
@@ -0,0 +1,202 @@
+"""
+VarianDUAL simulated state machine (no sinstruments dependency)
+
+`handle(state, line)` processes one MultiGauge request against a state
+dictionary ({command: {channel: value}}) and returns the reply.
+"""
+
+import random
+
+from ...variandual import (
+    TABLE, Remote, HVDeviceNumber, GaugeDeviceNumber, SerialDeviceNumber,
+    SerialProperty,
+)
+from ...protocol.multigauge import Channel, Command, Codec, ACK
+
+
+def funiform(a, b):
+    return lambda: '{:7.1E}'.format(random.uniform(a, b))
+
+
+def iuniform(a, b):
+    return lambda: '{:05d}'.format(random.randint(a, b))
+
+
+state = {
+    Command.Remote: {
+        Channel.NoChannel: Remote.Local,
+    },
+    Command.RemoteError: {
+        Channel.NoChannel: '0',
+    },
+    Command.InterlockStatus: {
+        Channel.NoChannel: '\x00',
+    },
+    Command.MicroControllerFirmwareVersion: {
+        Channel.NoChannel: "VPo 1 0 24/04/98"
+    },
+    Command.DSPFirmwareVersion: {
+        Channel.NoChannel: "VPd 1 0 24/04/98"
+    },
+    Command.Voltage: {
+        Channel.HighVoltage1: iuniform(30, 50),
+        Channel.HighVoltage2: iuniform(90, 120),
+    },
+    Command.Current: {
+        Channel.HighVoltage1: funiform(5e-1, 9e2),
+        Channel.HighVoltage2: funiform(5e-1, 9e2),
+    },
+    Command.Pressure: {
+        Channel.HighVoltage1: funiform(5e-9, 9e-3),
+        Channel.HighVoltage2: funiform(5e-9, 9e-3),
+        Channel.Gauge1: funiform(5e-9, 9e-3),
+        Channel.Gauge2: funiform(5e-9, 9e-3),
+    },
+    Command.DeviceType: {
+        Channel.HighVoltage1: HVDeviceNumber.SCTr_300,
+        Channel.HighVoltage2: HVDeviceNumber.DiodeND_150,
+        Channel.Gauge1: GaugeDeviceNumber.MiniBA,
+        Channel.Gauge2: GaugeDeviceNumber.ColdCathode,
+        Channel.Serial: SerialDeviceNumber.RS232
+    },
+    Command.ErrorStatus: {
+        Channel.NoChannel: "0",
+        Channel.HighVoltage1: "0",
+        Channel.HighVoltage2: "0",
+        Channel.Gauge1: "0",
+        Channel.Gauge2: "0",
+        Channel.Serial: "0",
+    },
+    Command.HighVoltage: {
+        Channel.HighVoltage1: "0",  # 0-off, 1-start/step, 2-start/fixed, ...
+        Channel.HighVoltage2: "1"
+    },
+    Command.FixedStep: {
+        Channel.HighVoltage1: "0",  # 0-fixed, 1-step
+        Channel.HighVoltage2: "1"
+    },
+    Command.StartProtect: {
+        Channel.HighVoltage1: "0",  # 0-start, 1-protect
+        Channel.HighVoltage2: "1"
+    },
+    Command.CurrentProtect: {
+        Channel.HighVoltage1: "20",  # [10:100:10] (mA)
+        Channel.HighVoltage2: "50"
+    },
+    Command.SetPoint1: {
+        Channel.HighVoltage1: "2.3E-7",  # [1.0E-9:1.0E1] (Torr)
+        Channel.HighVoltage2: "5.1E-2"
+    },
+    Command.SetPoint2: {
+        Channel.HighVoltage1: "4.1E-8",  # [1.0E-9:1.0E1] (Torr)
+        Channel.HighVoltage2: "7.2E-3"
+    },
+    Command.Unit: {
+        Channel.NoChannel: "0",  # 0-torr, 1-mbar, 2-pascal
+    },
+    Command.SerialConfig: {
+        Channel.NoChannel: "0",
+    },
+    Command.SerialProperty: {
+        Channel.NoChannel: "00000000",  # no ACK: writes are not answered
+    },
+    Command.DeviceNumber: {
+        Channel.HighVoltage1: HVDeviceNumber.SCTr_300,
+        Channel.HighVoltage2: HVDeviceNumber.DiodeND_150,
+        Channel.Gauge1: GaugeDeviceNumber.MiniBA,
+        Channel.Gauge2: GaugeDeviceNumber.ColdCathode,
+        Channel.Serial: SerialDeviceNumber.RS232
+    },
+    Command.VoltageMax: {
+        Channel.HighVoltage1: "7000",  # [3000:7000:100] (V)
+        Channel.HighVoltage2: "5000"
+    },
+    Command.CurrentMax: {
+        Channel.HighVoltage1: "400",  # [100:400:10] (mA)
+        Channel.HighVoltage2: "400"
+    },
+    Command.PowerMax: {
+        Channel.HighVoltage1: "400",  # [100:400:10] (W)
+        Channel.HighVoltage2: "400"
+    },
+    Command.VoltageStep1: {
+        Channel.HighVoltage1: "7000",  # [3000:7000:100] (V)
+        Channel.HighVoltage2: "7000"
+    },
+    Command.CurrentStep1: {
+        Channel.HighVoltage1: "1.0E-5",  # [1.0E-9:1.0E1] (A)
+        Channel.HighVoltage2: "1.0E-5"
+    },
+    Command.VoltageStep2: {
+        Channel.HighVoltage1: "5000",  # [3000:7000:100] (V)
+        Channel.HighVoltage2: "5000"
+    },
+    Command.CurrentStep2: {
+        Channel.HighVoltage1: "1.0E-6",  # [1.0E-9:1.0E1] (A)
+        Channel.HighVoltage2: "1.0E-6"
+    },
+    Command.RemoteOutput: {
+        Channel.HighVoltage1: "\x00",
+        Channel.HighVoltage2: "\x01",
+    },
+    Command.RemoteInput: {
+        Channel.HighVoltage1: "\x00",
+        Channel.HighVoltage2: "\x20",
+    },
+}
+
+
+# every command/channel in the command table has a value
+for param in TABLE:
+    for channel, command in param.codes.items():
+        state.setdefault(command, {}).setdefault(channel, "0")
+
+
+# commands which can only be written while the HV channel is off
+CHANNEL_OFF_ONLY = {Command.FixedStep}
+
+
+def handle(state, line, codec=Codec):
+    """
+    Processes one request against state. Returns the reply (None for
+    writes when not in ACK or reply on write mode)
+    """
+    key, data = codec.split(line)
+    entry = TABLE.dispatch.get(key)
+    if entry is None:
+        try:
+            Command(key[1:].decode())
+        except ValueError:
+            return codec.error(key, "2")  # non existent command code
+        return codec.error(key, "3")  # channel not valid for command
+    param, channel = entry
+    command = param.codes[channel]
+    if data is None:
+        data = state[command][channel]
+        if callable(data):
+            data = data()
+        return codec.reply(key, getattr(data, "value", data))
+    if not param.writable:
+        return codec.error(key, "4")  # write not allowed
+    try:
+        param.check(param.decode(data))
+    except ValueError:
+        return codec.error(key, "6")  # value exceeding limits
+    if command == Command.SerialProperty:
+        if state[Command.SerialConfig][Channel.NoChannel] != "1":
+            return codec.error(key, ":")  # serial configuration mode only
+    if command in CHANNEL_OFF_ONLY:
+        if int(state[Command.HighVoltage][channel]) > 0:
+            return codec.error(key, "8")  # write not allowed to channel ON
+    state[command][channel] = data
+    prop = SerialProperty.decode(state[Command.SerialProperty][Channel.NoChannel])
+    if SerialProperty.AckNack in prop:
+        return (ACK + "\r").encode()
+    if SerialProperty.ReplyOnWrite in prop:
+        return codec.reply(key, data)
+    return None
+
+
+def create_state():
+    """New (independent) copy of the default state"""
+    return {command: dict(values) for command, values in state.items()}
@@ -0,0 +1,270 @@
+"""
+Virtual time simulation
+
+Runs hours of device evolution and polling in seconds, deterministically:
+
+* `VirtualClock` replaces time.time / time.monotonic / time.sleep. It is
+  given to the simulated line (`vazio.loopback.Loopback` clock and sleep
+  with realtime=True, so every transaction takes its line time in virtual
+  time) and to the client side (`Acquisition`, `AdaptiveAcquisition` and
+  `Prefetcher` clock: timestamps, schedules and TTLs)
+* `VacuumModel` replaces the random replies of the VarianDual simulator
+  state with pressures, currents and voltages which evolve in virtual time
+  (pump-down, daily cycle, outgassing bursts and noise), all derived from
+  a seed and the time only
+* `Scheduler` calls the acquisitions' poll() in virtual time order (no
+  threads) and measures the throughput and memory growth of a run
+
+    clock = VirtualClock()
+    state = create_state()
+    VacuumModel(clock, seed=1).install(state)
+    ctrl = VarianDual(variandual(state, baudrate=9600, realtime=True,
+                                 clock=clock.monotonic, sleep=clock.sleep))
+    acquisition = Acquisition({"dual": ctrl}, ["hv1.pressure"], clock=clock.time)
+    scheduler = Scheduler(clock)
+    scheduler.add(acquisition)
+    stats = scheduler.run(7 * 24 * 3600)
+"""
+
+import math
+import time
+import heapq
+import random
+import functools
+import itertools
+import tracemalloc
+import collections
+
+from ..protocol.multigauge import Channel, Command
+
+
+EPOCH = 1700000000.0
+
+
+class VirtualClock:
+    """
+    Virtual time. time() is the epoch time (start + elapsed) and
+    monotonic() the elapsed time. sleep() advances the time
+    """
+
+    def __init__(self, start=EPOCH):
+        self.start = start
+        self.elapsed = 0.0
+
+    def time(self):
+        return self.start + self.elapsed
+
+    def monotonic(self):
+        return self.elapsed
+
+    def sleep(self, duration):
+        self.advance(duration)
+
+    def advance(self, duration):
+        if duration > 0:
+            self.elapsed += duration
+
+    def advance_to(self, when):
+        """Advances to the epoch time when (never goes back)"""
+        self.advance(when - self.time())
+
+
+class RunStats(
+    collections.namedtuple("RunStats", "simulated wall events memory")
+):
+    """
+    simulated, wall: virtual and real duration (s) of a run
+    events: scheduled calls done
+    memory: traced memory growth (bytes) or None
+    """
+
+    __slots__ = ()
+
+    @property
+    def speedup(self):
+        return self.simulated / self.wall if self.wall else math.inf
+
+    @property
+    def rate(self):
+        """Scheduled calls per real second"""
+        return self.events / self.wall if self.wall else math.inf
+
+
+class Scheduler:
+    """Calls functions at virtual (epoch) times, in order"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.events = []
+        self._counter = itertools.count()
+
+    def at(self, when, func):
+        heapq.heappush(self.events, (when, next(self._counter), func))
+
+    def every(self, period, func, start=None):
+        """Calls func every period (s), the first time at start (default: now)"""
+
+        def call():
+            func()
+            # overrun: skip the missed calls
+            when[0] = max(when[0] + period, self.clock.time())
+            self.at(when[0], call)
+
+        when = [self.clock.time() if start is None else start]
+        self.at(when[0], call)
+
+    def add(self, acquisition):
+        """
+        Polls an acquisition: at its period or, for an
+        `vazio.refresh.AdaptiveAcquisition`, whenever a quantity is due
+        """
+        if hasattr(acquisition, "next_due"):
+
+            def call():
+                acquisition.poll()
+                self.at(acquisition.next_due, call)
+
+            self.at(self.clock.time(), call)
+        else:
+            self.every(acquisition.period, acquisition.poll)
+
+    def run(self, duration, memory=False):
+        """Runs `duration` seconds of virtual time. Returns RunStats"""
+        clock = self.clock
+        until = clock.time() + duration
+        if memory:
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+        start, elapsed = time.perf_counter(), clock.elapsed
+        count = 0
+        events = self.events
+        while events and events[0][0] <= until:
+            when, _, func = heapq.heappop(events)
+            clock.advance_to(when)
+            func()
+            count += 1
+        clock.advance_to(until)
+        wall = time.perf_counter() - start
+        growth = None
+        if memory:
+            growth = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+        return RunStats(clock.elapsed - elapsed, wall, count, growth)
+
+
+HVS = Channel.HighVoltage1, Channel.HighVoltage2
+GAUGES = Channel.Gauge1, Channel.Gauge2
+MASK = (1 << 64) - 1
+
+
+def mix(*values):
+    """Deterministic 64 bit hash of integers (splitmix64 steps)"""
+    x = 0
+    for value in values:
+        x = (x + value + 0x9E3779B97F4A7C15) & MASK
+        x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK
+        x ^= x >> 31
+    return x
+
+
+def gauss(*key):
+    """Standard normal value determined by key (Box-Muller)"""
+    x = mix(*key)
+    u1 = ((x >> 32) + 1) / 4294967297
+    u2 = (x & 0xFFFFFFFF) / 4294967296
+    return math.sqrt(-2 * math.log(u1)) * math.cos(2 * math.pi * u2)
+
+
+class VacuumModel:
+    """
+    Deterministic vacuum evolution of a VarianDual (torr, A, V)
+
+    Pressure: base * (1 + daily cycle) + pump-down from start_pressure
+    (time constant tau) + outgassing bursts (Poisson, bursts_per_hour, of
+    log uniform amplitude in burst_size, decaying in burst_decay s), times
+    a gaussian noise which changes every `resolution` s. Ion pump current
+    is proportional to the pressure (sensitivity A/torr) and the voltage
+    drops with it. Off channels have neither current nor voltage.
+    """
+
+    def __init__(self, clock, seed=0, base=2e-9, start_pressure=1e-5, tau=3600.0,
+                 bursts_per_hour=0.5, burst_size=(1e-9, 1e-7), burst_decay=300.0,
+                 noise=0.02, resolution=1.0, sensitivity=5.0, voltage=7000):
+        self.clock = clock
+        self.seed = seed
+        self.start_pressure = start_pressure
+        self.tau = tau
+        self.bursts_per_hour = bursts_per_hour
+        self.burst_size = burst_size
+        self.burst_decay = burst_decay
+        self.noise = noise
+        self.resolution = resolution
+        self.sensitivity = sensitivity
+        self.voltage_max = voltage
+        rng = random.Random(mix(seed))
+        # every channel has its own base pressure
+        self.base = {ch: base * rng.uniform(0.5, 2) for ch in HVS + GAUGES}
+        self._bursts = collections.OrderedDict()
+
+    def bursts(self, channel, hour):
+        """[(time, amplitude)] of the bursts starting in an hour"""
+        key = int(channel.value), hour
+        events = self._bursts.get(key)
+        if events is not None:
+            return events
+        rng = random.Random(mix(self.seed, 1, *key))
+        lo, hi = (math.log(x) for x in self.burst_size)
+        events, t = [], hour * 3600.0
+        while True:
+            t += rng.expovariate(self.bursts_per_hour / 3600)
+            if t >= (hour + 1) * 3600:
+                break
+            events.append((t, math.exp(rng.uniform(lo, hi))))
+        self._bursts[key] = events
+        if len(self._bursts) > 64:
+            self._bursts.popitem(last=False)
+        return events
+
+    def pressure(self, channel, t=None):
+        t = self.clock.monotonic() if t is None else t
+        base = self.base[channel]
+        p = base * (1 + 0.1 * math.sin(2 * math.pi * t / 86400))
+        p += (self.start_pressure - base) * math.exp(-t / self.tau)
+        if self.bursts_per_hour:
+            first = int((t - 10 * self.burst_decay) // 3600)
+            for hour in range(max(first, 0), int(t // 3600) + 1):
+                for start, size in self.bursts(channel, hour):
+                    if start <= t:
+                        p += size * math.exp(-(t - start) / self.burst_decay)
+        step = int(t // self.resolution)
+        noise = gauss(self.seed, 2, int(channel.value), step)
+        return max(p * (1 + self.noise * noise), 0)
+
+    def current(self, channel, on=True):
+        return self.sensitivity * self.pressure(channel) if on else 0.0
+
+    def voltage(self, channel, on=True):
+        if not on:
+            return 0
+        # the supply sags with the current (1 V per 10 uA)
+        return max(int(self.voltage_max - 1e5 * self.current(channel)), 3000)
+
+    def install(self, state):
+        """Makes a VarianDual simulator state reply with the model values"""
+
+        def on(channel):
+            return int(state[Command.HighVoltage][channel]) > 0
+
+        for channel in HVS + GAUGES:
+            state[Command.Pressure][channel] = functools.partial(
+                lambda ch: "{:7.1E}".format(self.pressure(ch)), channel
+            )
+        for channel in HVS:
+            state[Command.Current][channel] = functools.partial(
+                lambda ch: "{:7.1E}".format(self.current(ch, on(ch))), channel
+            )
+            state[Command.Voltage][channel] = functools.partial(
+                lambda ch: "{:05d}".format(self.voltage(ch, on(ch))), channel
+            )
+        return state
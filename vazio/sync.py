@@ -0,0 +1,180 @@
+"""
+Synchronized acquisition
+
+`SyncAcquisition` reads the same quantities from many controllers
+(one line each) in cycles. Every cycle launches the reads of all
+controllers at the same time on a thread pool of bounded size (each
+controller occupies one worker while its quantities are read in
+sequence) and builds one aligned `Frame` with the send and receive
+timestamp of every sample plus the skew between controllers.
+
+Requires numpy.
+"""
+
+import time
+import logging
+import operator
+import threading
+import collections
+import concurrent.futures
+
+import numpy
+
+
+class Frame(
+    collections.namedtuple(
+        "Frame", "cycle time controllers quantities values sent received valid"
+    )
+):
+    """
+    Aligned samples of a cycle. Arrays have one row per controller and one
+    column per quantity:
+
+    values: float values (NaN for errors or non numeric values)
+    sent, received: timestamps of request and reply
+    valid: False where the read failed
+    """
+
+    __slots__ = ()
+
+    @property
+    def timestamps(self):
+        """Sample timestamps (middle of each transaction)"""
+        return (self.sent + self.received) / 2
+
+    @property
+    def skew(self):
+        """Per quantity spread (s) of the sample timestamps across controllers"""
+        t = self.timestamps
+        return t.max(axis=0) - t.min(axis=0)
+
+    @property
+    def max_skew(self):
+        return float(self.skew.max()) if self.skew.size else 0.0
+
+    @property
+    def latency(self):
+        return self.received - self.sent
+
+    def column(self, quantity):
+        return self.values[:, self.quantities.index(quantity)]
+
+
+def _number(value):
+    value = getattr(value, "value", value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return numpy.nan
+
+
+def precise_clock():
+    """Epoch time with perf_counter resolution"""
+    offset = time.time() - time.perf_counter()
+    return lambda: offset + time.perf_counter()
+
+
+class SyncAcquisition:
+    """
+    controllers: {name: controller}
+    quantities: sequence of attribute paths read on every controller
+    period: time (s) between cycle starts when running in the background
+    workers: maximum number of lines read in parallel
+    clock: time source of the timestamps and of the cycle schedule (default:
+           epoch time with perf_counter resolution)
+    sleep: callable(duration) waiting between cycles in run() (default: a
+           wait interrupted by stop). Both can be virtual (see
+           `vazio.simulator.virtual.VirtualClock`)
+    """
+
+    def __init__(self, controllers, quantities, period=1.0, workers=8, clock=None,
+                 sleep=None):
+        self.controllers = dict(controllers)
+        self.names = tuple(self.controllers)
+        self.quantities = tuple(quantities)
+        self.period = period
+        self.workers = workers
+        self.clock = precise_clock() if clock is None else clock
+        self.cycle = 0
+        self.latest = None
+        self.listeners = []
+        self._getters = [operator.attrgetter(path) for path in self.quantities]
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="SyncAcquisition"
+        )
+        self._thread = None
+        self._stop = threading.Event()
+        self._sleep = self._stop.wait if sleep is None else sleep
+        self._log = logging.getLogger(type(self).__name__)
+
+    def subscribe(self, callback):
+        """callback(frame) is called with every new frame"""
+        self.listeners.append(callback)
+
+    def _read(self, row, frame):
+        ctrl = self.controllers[self.names[row]]
+        clock = self.clock
+        values, sent, received, valid = (
+            frame.values[row], frame.sent[row], frame.received[row], frame.valid[row]
+        )
+        for col, getter in enumerate(self._getters):
+            sent[col] = clock()
+            try:
+                values[col] = _number(getter(ctrl))
+            except Exception:
+                valid[col] = False
+            received[col] = clock()
+
+    def poll(self):
+        """Reads every quantity of every controller once. Returns the Frame"""
+        shape = len(self.names), len(self.quantities)
+        frame = Frame(
+            self.cycle,
+            self.clock(),
+            self.names,
+            self.quantities,
+            numpy.full(shape, numpy.nan),
+            numpy.full(shape, numpy.nan),
+            numpy.full(shape, numpy.nan),
+            numpy.ones(shape, dtype=bool),
+        )
+        self.cycle += 1
+        futures = [
+            self._pool.submit(self._read, row, frame) for row in range(len(self.names))
+        ]
+        concurrent.futures.wait(futures)
+        self.latest = frame
+        for listener in self.listeners:
+            try:
+                listener(frame)
+            except Exception:
+                self._log.exception("error in frame listener %r", listener)
+        return frame
+
+    def run(self):
+        clock = self.clock
+        next_cycle = clock()
+        while not self._stop.is_set():
+            self.poll()
+            next_cycle += self.period
+            now = clock()
+            if next_cycle < now and self.period > 0:
+                # overrun: skip the missed cycles
+                next_cycle += (now - next_cycle) // self.period * self.period
+                next_cycle += self.period
+            self._sleep(max(next_cycle - now, 0))
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        self._pool.shutdown()
@@ -1,28 +1,78 @@
-import serial
-from tango.server import Device, attribute, command, device_property
+import functools
 
-from vazio.variandual import VarianDual as _VarianDual
+from tango.server import Device, attribute, command, device_property
 
+from vazio.acquisition import Acquisition
+from vazio.connection import Supervisor, connect_codec
+from vazio.prefetch import Prefetcher
+from vazio.rolling import RollingStatistics
+from vazio.variandual import VarianDual as _VarianDual, Codec, Unit
 
-def serial_for_url(url, *args, **kwargs):
-    conn = serial.serial_for_url(url, *args, **kwargs)
 
-    def write_readline(data):
-        conn.write(data)
-        return conn.readline()
+# attribute prefix: acquired quantity
+STATS_QUANTITIES = {
+    "p1": "hv1.pressure",
+    "p2": "hv2.pressure",
+    "i1": "hv1.current",
+    "i2": "hv2.current",
+}
 
-    conn.write_readline = write_readline
-    return conn
+# attribute suffix: window (s)
+STATS_WINDOWS = {"1s": 1, "1m": 60, "1h": 3600}
 
 
 class VarianDual(Device):
 
     address = device_property(dtype=str)
+    acquisition_period = device_property(dtype=float, default_value=1.0)
+    timeout = device_property(dtype=float, default_value=0.5)
+    unit = device_property(dtype=str, default_value="mbar")
+    prefetch = device_property(dtype=bool, default_value=False)
 
     def init_device(self):
         super().init_device()
-        conn = serial_for_url(self.address)
-        self.ctrl = _VarianDual(conn)
+        self.conn = Supervisor(
+            functools.partial(connect_codec, self.address, Codec, timeout=self.timeout)
+        )
+        self.ctrl = _VarianDual(self.conn)
+        self.ctrl.config["unit"] = Unit[self.unit]
+        self.conn.on_connect = self.ctrl.restore
+        if self.prefetch:
+            Prefetcher(self.ctrl)
+        self.conn.start()
+        self.acquisition = Acquisition(
+            {self.get_name(): self.ctrl},
+            STATS_QUANTITIES.values(),
+            period=self.acquisition_period,
+        )
+        self.statistics = RollingStatistics(
+            self.acquisition, windows=STATS_WINDOWS.values()
+        )
+        self.acquisition.start()
+
+    def delete_device(self):
+        self.acquisition.stop()
+        self.conn.close()
+        super().delete_device()
+
+    def initialize_dynamic_attributes(self):
+        for prefix in STATS_QUANTITIES:
+            for suffix in STATS_WINDOWS:
+                attr = attribute(
+                    name="{}_stats_{}".format(prefix, suffix),
+                    dtype=(float,),
+                    max_dim_x=6,
+                    fget=self.read_stats,
+                    description="count, min, max, mean, std, rate",
+                )
+                self.add_attribute(attr)
+
+    def read_stats(self, attr):
+        prefix, _, suffix = attr.get_name().split("_")
+        stats = self.statistics.stats(
+            self.get_name(), STATS_QUANTITIES[prefix], STATS_WINDOWS[suffix]
+        )
+        return list(stats)
 
     @attribute(dtype=int, unit="V", format="%05d", description="Channel 1 voltage")
     def v1(self):
@@ -58,7 +108,7 @@ class VarianDual(Device):
 
     @command
     def on(self):
-        pass
+        self.ctrl.on()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,70 @@
+"""
+asyncio green mode VarianDual Tango device
+
+Attribute reads are coroutines doing non-blocking I/O, so requests to
+different devices of the same server overlap on the event loop instead of
+each one holding a Tango thread.
+
+The address device property accepts tcp://host:port or a serial port.
+"""
+
+from tango import GreenMode
+from tango.server import Device, attribute, command, device_property
+
+from vazio.aio import AsyncVarianDual as _AsyncVarianDual, open_connection
+
+
+class AsyncVarianDual(Device):
+
+    green_mode = GreenMode.Asyncio
+
+    address = device_property(dtype=str)
+    timeout = device_property(dtype=float, default_value=1.0)
+
+    async def init_device(self):
+        await super().init_device()
+        conn = await open_connection(self.address, timeout=self.timeout)
+        self.ctrl = _AsyncVarianDual(conn)
+
+    async def delete_device(self):
+        self.ctrl.conn.close()
+
+    @attribute(dtype=int, unit="V", format="%05d", description="Channel 1 voltage")
+    async def v1(self):
+        return await self.ctrl.hv1.voltage
+
+    @attribute(dtype=int, unit="V", format="%05d", description="Channel 2 voltage")
+    async def v2(self):
+        return await self.ctrl.hv2.voltage
+
+    @attribute(dtype=float, unit="mA", format="%5.2e", description="Channel 1 current")
+    async def i1(self):
+        return await self.ctrl.hv1.current
+
+    @attribute(dtype=float, unit="mA", format="%5.2e", description="Channel 2 current")
+    async def i2(self):
+        return await self.ctrl.hv2.current
+
+    @attribute(dtype=float, format="%5.2e", description="Channel 1 pressure")
+    async def p1(self):
+        return await self.ctrl.hv1.pressure
+
+    @attribute(dtype=float, format="%5.2e", description="Channel 2 pressure")
+    async def p2(self):
+        return await self.ctrl.hv2.pressure
+
+    @attribute(dtype=[str])
+    async def ionpumpsconfig(self):
+        return await self.ctrl.hv1.device_type, await self.ctrl.hv2.device_type
+
+    @attribute(dtype=bool)
+    async def interlock(self):
+        return bool(await self.ctrl.interlock_status)
+
+    @command
+    async def on(self):
+        await self.ctrl.on()
+
+
+if __name__ == "__main__":
+    AsyncVarianDual.run_server()
@@ -1,7 +1,9 @@
 import enum
-import functools
+import time
 
-from vazio.protocol.multigauge import encode_request, decode_reply, Command, Channel
+from vazio.controller import BaseChannel, Controller
+from vazio.protocol.table import Param, Table, RW
+from vazio.protocol.multigauge import Command, Channel, Codec, ProtocolErrors  # noqa
 
 
 class Enum(enum.Enum):
@@ -76,6 +78,22 @@ class InterlockStatus(IntFlag):
     HV2Cable = 128
 
 
+class SerialProperty(enum.IntFlag):
+    MultiVac = 0x01
+    ReplyOnWrite = 0x02
+    AckNack = 0x04
+    MultipleCommands = 0x08
+    AutoSerial = 0x10
+
+    @classmethod
+    def decode(cls, data):
+        return cls(int(data, 2))
+
+    @classmethod
+    def encode(cls, value):
+        return "{:08b}".format(cls(value))
+
+
 class FixedStep(Enum):
     Fixed = "0"
     Step = "1"
@@ -110,25 +128,6 @@ class RemoteInput(IntFlag):
     RemoteInterlock = 128
 
 
-ProtocolErrors = {
-    # If incongruencies are detected in the composition of the
-    # data packet sent to the Dual controller (in other words a
-    # correct reception but an incorrect data format), the Dual
-    # controller will reply with an error code identified by the
-    # .!. (21h) command according to the following table.
-    "1": "Reserved (checksum error)",
-    "2": "Non existent command code",
-    "3": "Channel not valid for the selected command",
-    "4": "Write mode not allowed for the selected command",
-    "5": "Unvalid or non-congruent data transmitted",
-    "6": "Write value exceeding the allowed limits or step not allowed",
-    "7": "Data format not recognized on the protocols implemented",
-    "8": "Write not allowed to channel ON",
-    "9": "Write not allowed to channel OFF",
-    ":": "Write allowed in Serial Configuration Mode only",
-}
-
-
 ControllerErrors = {
     # Value  Error type  Error reference
     # High Voltage errors
@@ -167,128 +166,139 @@ ControllerErrors = {
 }
 
 
-def nop(v):
-    return v
-
-
-class Value:
-    def __init__(self, command, decode=nop, encode=None):
-        self.command = command
-        self.decode = decode
-        self.encode = encode
-
-    def _read(self, ctrl, channel):
-        request = encode_request(channel, self.command, "?")
-        reply = ctrl.conn.write_readline(request)
-        *_, value = decode_reply(reply)
-        return self.decode(value)
-
-    def _write(self, ctrl, channel, value):
-        if self.encode is None:
-            raise AttributeError(
-                "can't set: {.name} on {.name}".format(self.command, channel)
-            )
-        request = encode_request(channel, self.command, self.encode(value))
-        ctrl.conn.write_readline(request)
-
-    def __get__(self, ctrl, owner=None):
-        return self._read(ctrl, Channel.NoChannel)
-
-    def __set__(self, ctrl, value):
-        self._write(ctrl, Channel.NoChannel, value)
-
-
-class ChannelValue(Value):
-    def __get__(self, channel, owner=None):
-        return self._read(channel.ctrl, channel.channel)
-
-    def __set__(self, channel, value):
-        self._write(channel.ctrl, channel.channel, value)
-
-
-class BaseChannel:
-
-    device_type = ChannelValue(Command.DeviceType)
-    error_status = ChannelValue(Command.ErrorStatus, decode=ControllerErrors.get)
-
-    def __init__(self, channel, ctrl=None):
-        self.channel = channel
-        self.ctrl = ctrl
-
-    def __get__(self, ctrl, owner=None):
-        ch = ctrl._channels.get(self.channel)
-        if ch is None:
-            ch = type(self)(self.channel, ctrl)
-            ctrl._channels[self.channel] = ch
-        return ch
-
-
-def EnumCV(cmd, enu, **kwargs):
-    kwargs.setdefault("decode", enu)
-    if hasattr(enu, "encode"):
-        kwargs.setdefault("encode", enu.encode)
-    return ChannelValue(cmd, **kwargs)
-
-
-IntCV = functools.partial(ChannelValue, encode=int, decode=str)
-IntCVRO = functools.partial(ChannelValue, decode=int)
-FloatCV = functools.partial(ChannelValue, decode=float, encode=str)
-FloatCVRO = functools.partial(ChannelValue, decode=float)
+def error_message(channel, code):
+    """Description of an error_status code (None if there is no error)"""
+    if not int(code):
+        return None
+    errors = ControllerErrors[ERROR_KIND[Channel.decode(channel)]]
+    return errors.get(str(int(code)), "Unknown error {}".format(code))
+
+
+NO_CHANNEL = (Channel.NoChannel,)
+HVS = (Channel.HighVoltage1, Channel.HighVoltage2)
+GAUGES = (Channel.Gauge1, Channel.Gauge2)
+SERIAL = (Channel.Serial,)
+CHANNELS = HVS + GAUGES + SERIAL
+
+ANY_PRESSURE = (1e-9, 1e1)  # (torr)
+ANY_CURRENT = (1e-9, 1e1)  # (A)
+
+ERROR_KIND = {Channel.NoChannel: "SW", Channel.Serial: "SW"}
+ERROR_KIND.update({channel: "HV" for channel in HVS})
+ERROR_KIND.update({channel: "MG" for channel in GAUGES})
+
+
+TABLE = Table(
+    [
+        # controller
+        Param("remote", Command.Remote, NO_CHANNEL, Remote, access=RW),
+        Param("unit", Command.Unit, NO_CHANNEL, Unit, access=RW),
+        Param(
+            "interlock_status", Command.InterlockStatus, NO_CHANNEL, InterlockStatus
+        ),
+        Param(
+            "ctrl_firmware_version", Command.MicroControllerFirmwareVersion, NO_CHANNEL
+        ),
+        Param("dsp_firmware_version", Command.DSPFirmwareVersion, NO_CHANNEL),
+        Param("serial_config", Command.SerialConfig, NO_CHANNEL, bool, access=RW),
+        Param(
+            "serial_property", Command.SerialProperty, NO_CHANNEL, SerialProperty,
+            access=RW,
+        ),
+        # all channels
+        Param("device_type", Command.DeviceType, CHANNELS),
+        Param("error_status", Command.ErrorStatus, NO_CHANNEL + CHANNELS, int),
+        # ion pump (HV) channels
+        Param("high_voltage", Command.HighVoltage, HVS, HighVoltage, access=RW),
+        Param("device_number", Command.DeviceNumber, HVS, HVDeviceNumber, access=RW),
+        Param("voltage", Command.Voltage, HVS, int),
+        Param("current", Command.Current, HVS, float),
+        Param("pressure", Command.Pressure, HVS + GAUGES, float),
+        Param("fixed_step", Command.FixedStep, HVS, FixedStep, access=RW),
+        Param("start_protect", Command.StartProtect, HVS, StartProtect, access=RW),
+        Param("polarity", Command.Polarity, HVS, Polarity, access=RW),
+        Param(
+            "voltage_max", Command.VoltageMax, HVS, int, (3000, 7000, 100), RW,
+            doc="Maximum voltage (V)",
+        ),
+        Param(
+            "current_max", Command.CurrentMax, HVS, int, (100, 400, 10), RW,
+            doc="Maximum current (mA)",
+        ),
+        Param(
+            "power_max", Command.PowerMax, HVS, int, (100, 400, 10), RW,
+            doc="Maximum power (W)",
+        ),
+        Param(
+            "current_protect", Command.CurrentProtect, HVS, int, (10, 100, 10), RW,
+            doc="Protect current (mA)",
+        ),
+        Param(
+            "voltage_step1", Command.VoltageStep1, HVS, int, (3000, 7000, 100), RW,
+            doc="Step 1 voltage (V)",
+        ),
+        Param(
+            "current_step1", Command.CurrentStep1, HVS, float, ANY_CURRENT, RW,
+            doc="Step 1 current (A)",
+        ),
+        Param(
+            "voltage_step2", Command.VoltageStep2, HVS, int, (3000, 7000, 100), RW,
+            doc="Step 2 voltage (V)",
+        ),
+        Param(
+            "current_step2", Command.CurrentStep2, HVS, float, ANY_CURRENT, RW,
+            doc="Step 2 current (A)",
+        ),
+        Param(
+            "set_point1", Command.SetPoint1, HVS, float, ANY_PRESSURE, RW,
+            doc="Set point 1 (torr). Must be > set point 2",
+        ),
+        Param(
+            "set_point2", Command.SetPoint2, HVS, float, ANY_PRESSURE, RW,
+            doc="Set point 2 (torr)",
+        ),
+        Param("remote_output", Command.RemoteOutput, HVS, RemoteOutput),
+        Param("remote_input", Command.RemoteInput, HVS, RemoteInput),
+        # gauge channels
+        Param("device_number", Command.DeviceNumber, GAUGES, GaugeDeviceNumber),
+        # serial channel
+        Param("device_number", Command.DeviceNumber, SERIAL, SerialDeviceNumber),
+    ],
+    Codec,
+)
 
 
 class HV(BaseChannel):
 
-    high_voltage = EnumCV(Command.HighVoltage, HighVoltage)
-    device_number = EnumCV(Command.DeviceNumber, HVDeviceNumber)
-
-    voltage = IntCVRO(Command.Voltage)
-    current = FloatCVRO(Command.Current)
-    pressure = FloatCVRO(Command.Pressure)
-
-    fixed_step = EnumCV(Command.FixedStep, FixedStep)
-    start_protect = EnumCV(Command.StartProtect, StartProtect)
-    polarity = EnumCV(Command.Polarity, Polarity)
-
-    voltage_max = IntCV(Command.VoltageMax)  # [3000, 7000] step 100 (V)
-    current_max = IntCV(Command.CurrentMax)  # [100, 400] step 10 (mA)
-    power_max = IntCV(Command.PowerMax)  # [100, 400] step 10 (W)
-    current_protect = IntCV(Command.CurrentProtect)  # [10, 100] step 10 (mA)
-    voltage_step1 = IntCV(Command.VoltageStep1)  # [3000, 7000] step 100 (V)
-    current_step1 = FloatCV(Command.CurrentStep1)  # [1e-9, 1e1] (A)
-    voltage_step2 = IntCV(Command.VoltageStep2)  # [3000, 7000] step 100 (V)
-    current_step2 = FloatCV(Command.CurrentStep2)  # [1e-9, 1e1] (A)
-    set_point1 = FloatCV(Command.SetPoint1)  # [1e-9, 1e1] (torr) (> sp2)
-    set_point2 = FloatCV(Command.SetPoint2)  # [1e-9, 1e1] (torr)
-    remote_output = ChannelValue(Command.RemoteOutput, decode=RemoteOutput.decode)
-    remote_input = ChannelValue(Command.RemoteInput, decode=RemoteInput.decode)
+    table = TABLE
+    channels = HVS
 
 
 class Gauge(BaseChannel):
 
-    device_number = ChannelValue(Command.DeviceNumber, decode=GaugeDeviceNumber)
-    pressure = ChannelValue(Command.Pressure, decode=float)
+    table = TABLE
+    channels = GAUGES
 
 
 class Serial(BaseChannel):
 
-    device_number = ChannelValue(Command.DeviceNumber, decode=SerialDeviceNumber)
+    table = TABLE
+    channels = SERIAL
 
 
-class VarianDual:
+class VarianDual(Controller):
     """
     VarianDual controller based on MultiGauge protocol
 
     conn: any object with write_readline (should be configured
           with eol='\r')
+    ack: switch the controller to ACK reply mode (see enable_ack) before
+         the first write. Writes expect that mode: with ack=False it must
+         be set up by other means (restore also enables it)
     """
 
-    remote = Value(Command.Remote, decode=Remote, encode=Remote.encode)
-    unit = Value(Command.Unit, decode=Unit, encode=Unit.encode)
-
-    error_status = Value(Command.ErrorStatus, decode=ControllerErrors.get)
-    interlock_status = Value(Command.InterlockStatus, decode=InterlockStatus.decode)
-    ctrl_firmware_version = Value(Command.MicroControllerFirmwareVersion)
-    dsp_firmware_version = Value(Command.DSPFirmwareVersion)
+    table = TABLE
+    channel = Channel.NoChannel
 
     hv1 = HV(Channel.HighVoltage1)
     hv2 = HV(Channel.HighVoltage2)
@@ -296,17 +306,64 @@ class VarianDual:
     gauge2 = Gauge(Channel.Gauge2)
     serial = Serial(Channel.Serial)
 
-    serial_config = Value(
-        Command.SerialConfig,
-        decode=lambda v: v == "1",
-        encode=lambda v: "1" if v else "0",
-    )
-
-    def __init__(self, conn):
-        self.conn = conn
-        self._channels = {}
-
-        # TODO:
-        # on connect:
-        # - set ACK reply mode
-        # - set unit to mbar
+    def __init__(self, conn, ack=True):
+        super().__init__(conn)
+        self.ack_pending = ack
+
+    def _prepare_write(self):
+        if self.ack_pending:
+            try:
+                self.enable_ack()
+            except BaseException:
+                self.ack_pending = True
+                raise
+
+    def enable_ack(self, settle=0.05):
+        """
+        Switches the controller to ACK reply mode (serial property AckNack
+        bit) so every write is acknowledged. Until then writes are not
+        answered, so the connection must provide write and flush (see
+        `vazio.connection.Connection`). Returns the serial property
+        """
+        # cleared first: the writes below go through _prepare_write too
+        self.ack_pending = False
+        prop = self.serial_property
+        if SerialProperty.AckNack in prop:
+            return prop
+        # serial property can only be written in serial configuration mode
+        request = self.table.request
+        self.conn.write(request("serial_config", self.channel, True, self.codec))
+        prop |= SerialProperty.AckNack
+        self.conn.write(request("serial_property", self.channel, prop, self.codec))
+        time.sleep(settle)
+        self.conn.flush()
+        self.serial_config = False
+        return self.serial_property
+
+    def restore(self):
+        """Enables ACK reply mode and writes the remembered configuration"""
+        self.enable_ack()
+        super().restore()
+
+    def on(self, names=("hv1", "hv2"), timeout=10.0, period=0.1):
+        """
+        Switches on the high voltage of the given channels (attribute names)
+        and waits until all of them report it is on. Raises TimeoutError
+        """
+        for name in names:
+            getattr(self, name).high_voltage = HighVoltage.On
+        deadline = time.monotonic() + timeout
+        pending = list(names)
+        while True:
+            pending = [
+                name
+                for name in pending
+                if int(getattr(self, name).high_voltage.value) <= 0
+            ]
+            if not pending:
+                return
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    "{} still off after {}s".format(", ".join(pending), timeout)
+                )
+            time.sleep(period)